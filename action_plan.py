@@ -0,0 +1,376 @@
+"""
+Action plans: a patient record as a flat list of input actions.
+
+compile_patient() runs the same steps the GUI runs (tool.patient_steps) on a
+Tool whose input is a RecordingInput around input_backend.DryInput, so a plan
+is exactly what Tool would send, as plain JSON-serializable actions:
+
+    {"kind": "click", "coords": [x, y]}              also "double_click"
+    {"kind": "keys", "keys": "^a", "pause": null}
+    {"kind": "paste", "text": "..."}
+    {"kind": "grab", "region": [left, top, width, height]}
+    {"kind": "wait", "key": "type", "timeout": 0.1}
+    {"kind": "wait_for", "key": "suggestions", "timeout": 0.1}
+    {"kind": "copy", "text": "..."}
+    {"kind": "services", "mode": true, "arrow_mode": false, "procedures": [...],
+     "rows": {"<procedure>": [actions...]}}
+
+Coordinates are relative to the window (the dry window sits at 0, 0) and are
+taken from config when the plan is compiled. "wait" is Waiter.settle,
+"wait_for" waits until the region of the last "grab" changes (the suggestion
+list), and "copy" is the date read-back (Tool._read_back_date) with the text
+expected in the field. "services" is the one part that depends on the screen:
+when the plan runs, Tool reads the rows and fills them itself (with its UIA
+backend if enabled); "rows" holds what it sends for each procedure, recorded
+at the first row, for the dry run. Every action also carries the "step" it
+belongs to.
+
+optimize() drops zero waits and merges back-to-back waits. dry_run() checks
+and times a plan without touching the screen. PlanExecutor replays a plan
+through a Tool's input backend and waiter.
+"""
+
+import json
+import re
+import time
+from contextlib import contextmanager
+from itertools import groupby
+
+import config
+from input_backend import DryInput, RecordingInput
+from tool import Tool, patient_steps
+from tracing import tracer
+from waits import region_changed
+
+PLAN_VERSION = 2
+# Rough cost of each input on the real HIS, for dry-run estimates (seconds)
+ACTION_COST = {
+    "click": 0.03,
+    "double_click": 0.03,
+    "keys": 0.005,
+    "paste": 0.03,
+    "grab": 0.01,
+    "copy": 0.03,
+}
+# Key names accepted in {...} by pywinauto send_keys (the ones Tool uses)
+KNOWN_KEYS = {"SPACE", "RIGHT", "LEFT", "UP", "DOWN", "TAB", "ENTER", "BACKSPACE", "DELETE",
+              "HOME", "END", "ESC"}
+
+_BRACES = re.compile(r"\{([^}]*)\}")
+
+
+# ===== Compiling =====
+
+class _RecordingWaiter:
+    """Waiter stand-in that logs each wait into a RecordingInput instead of waiting."""
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def settle(self, key, wait, condition=None):
+        self.recorder._record("wait", key=key, timeout=wait)
+        return True
+
+    def wait_for(self, key, condition, timeout):
+        self.recorder._record("wait_for", key=key, timeout=timeout)
+        return True
+
+
+@contextmanager
+def _tracing_off():
+    """Tool primitives are traced; compiling should not show up in the run's trace."""
+    enabled = tracer.enabled
+    tracer.enabled = False
+    try:
+        yield
+    finally:
+        tracer.enabled = enabled
+
+
+def _take(recorder, step):
+    """The recorded actions as plan actions tagged with step; clears the recorder."""
+    actions = []
+    for action in recorder.actions:
+        if action["kind"] == "element_rect":
+            continue
+        action = {k: v for k, v in action.items() if k != "t"}
+        for name in ("coords", "region"):
+            if name in action:
+                action[name] = list(action[name])
+        action["step"] = step
+        actions.append(action)
+    recorder.clear()
+    return actions
+
+
+def compile_patient(data, arrow_mode=False):
+    """Record what Tool sends for one patient record (read_data format) as a plan dict."""
+    recorder = RecordingInput(DryInput())
+    waiter = _RecordingWaiter(recorder)
+    tool = Tool(app=None, dlg=None, waiter=waiter, input=recorder)
+    # Window at the origin: recorded screen coordinates stay window-relative
+    tool.window_rect = (0, 0, 0, 0)
+
+    actions = []
+    with _tracing_off():
+        for step, _, func in patient_steps(tool, data, waiter, arrow_mode):
+            if step != "fill":
+                func()
+                actions += _take(recorder, step)
+                continue
+            mode = bool(data["isFirst"])
+            x, y = config.DICH_VU_THU_THUAT[0]
+            # Like Tool, the last entry for a procedure name wins
+            rows = {}
+            for info in data["thu_thuats"]:
+                tool.fill_row(x, y, info, mode, arrow_mode)
+                rows[info["Ten"]] = _take(recorder, step)
+            actions.append({"kind": "services", "mode": mode, "arrow_mode": arrow_mode,
+                            "procedures": data["thu_thuats"], "rows": rows, "step": step})
+    return {"version": PLAN_VERSION, "id": str(data["id"]), "actions": actions}
+
+
+# ===== Optimizing =====
+
+def optimize_actions(actions):
+    """Drop zero waits and merge consecutive waits (the longest wins)."""
+    result = []
+    for action in actions:
+        kind = action["kind"]
+        if kind == "services":
+            action = dict(action, rows={name: optimize_actions(sub) for name, sub in action["rows"].items()})
+        elif kind == "wait" and action["timeout"] <= 0:
+            continue
+        previous = result[-1] if result else None
+        if previous is not None and previous["kind"] == kind == "wait":
+            # Both wait for the window to be ready; the longer bound covers the shorter
+            if action["timeout"] >= previous["timeout"]:
+                result[-1] = action
+            continue
+        result.append(action)
+    return result
+
+
+def optimize(plan):
+    return dict(plan, actions=optimize_actions(plan["actions"]))
+
+
+# ===== Dry run =====
+
+def _check_numbers(values, size, problems, where, what):
+    if (not isinstance(values, (list, tuple)) or len(values) != size
+            or not all(isinstance(v, (int, float)) and v >= 0 for v in values)):
+        problems.append(f"{where}: bad {what} {values!r}")
+
+
+def _check_keys(keys, problems, where):
+    if keys.count("{") != keys.count("}"):
+        problems.append(f"{where}: unbalanced braces in {keys!r}")
+        return
+    for name in _BRACES.findall(keys):
+        words = name.split()
+        if not words or (words[0].upper() not in KNOWN_KEYS and len(name) != 1):
+            problems.append(f"{where}: unknown key {{{name}}}")
+
+
+def _dry_run_actions(actions, problems, prefix):
+    """Validate actions; returns the estimated (minimum, maximum) seconds."""
+    fastest = slowest = 0.0
+    grabbed = False
+    for index, action in enumerate(actions):
+        where = f"{prefix}#{index}"
+        kind = action.get("kind")
+        if kind in ("click", "double_click"):
+            _check_numbers(action.get("coords"), 2, problems, where, "coordinates")
+        elif kind == "keys":
+            keys = action.get("keys")
+            if not isinstance(keys, str) or not keys:
+                problems.append(f"{where}: empty key sequence")
+                continue
+            _check_keys(keys, problems, where)
+            slowest += ACTION_COST["keys"] * (len(keys) - 1)
+        elif kind in ("paste", "copy"):
+            if not action.get("text"):
+                problems.append(f"{where}: no text to {kind}")
+        elif kind == "grab":
+            _check_numbers(action.get("region"), 4, problems, where, "region")
+            grabbed = True
+        elif kind in ("wait", "wait_for"):
+            timeout = action.get("timeout")
+            if not isinstance(timeout, (int, float)) or timeout < 0:
+                problems.append(f"{where}: bad wait timeout {timeout!r}")
+                continue
+            if kind == "wait_for" and not grabbed:
+                problems.append(f"{where}: wait_for without a grabbed region")
+            slowest += timeout
+        elif kind == "services":
+            rows = action.get("rows") or {}
+            if not rows:
+                problems.append(f"{where}: no procedures to fill")
+            for name, sub in rows.items():
+                if name not in config.thu_thuat_dur_mapper:
+                    problems.append(f"{where}: unknown procedure '{name}'")
+                low, high = _dry_run_actions(sub, problems, f"{where}[{name}]")
+                fastest += low
+                slowest += high
+            continue
+        else:
+            problems.append(f"{where}: unknown action {kind!r}")
+            continue
+        fastest += ACTION_COST.get(kind, 0.0)
+        slowest += ACTION_COST.get(kind, 0.0)
+    return fastest, slowest
+
+
+def dry_run(plan):
+    """
+    Validate a plan without touching the screen.
+    Returns {"actions", "problems", "min_seconds", "max_seconds"}; the estimate
+    assumes every row is filled, max_seconds counts every wait in full.
+    """
+    problems = []
+    if plan.get("version") != PLAN_VERSION:
+        problems.append(f"unsupported plan version {plan.get('version')!r}")
+    prefix = f"{plan.get('id', '?')}"
+    fastest, slowest = _dry_run_actions(plan.get("actions", []), problems, prefix)
+    return {
+        "actions": count_actions(plan["actions"]),
+        "problems": problems,
+        "min_seconds": fastest,
+        "max_seconds": slowest,
+    }
+
+
+def count_actions(actions):
+    total = 0
+    for action in actions:
+        if action["kind"] == "services":
+            total += sum(count_actions(sub) for sub in action["rows"].values())
+        else:
+            total += 1
+    return total
+
+
+def validate_batch(patients, arrow_mode=False):
+    """
+    Compile, optimize and dry-run every patient.
+    Returns (plans, summary) where summary has the problems per patient id,
+    the totals and how long the whole check took.
+    """
+    start = time.perf_counter()
+    plans, problems = [], {}
+    total_actions, fastest, slowest = 0, 0.0, 0.0
+    for data in patients:
+        try:
+            plan = optimize(compile_patient(data, arrow_mode))
+        except (KeyError, TypeError) as e:
+            problems[str(data.get("id", "?"))] = [f"cannot compile: missing {e}"]
+            plans.append(None)
+            continue
+        result = dry_run(plan)
+        if result["problems"]:
+            problems[plan["id"]] = result["problems"]
+        total_actions += result["actions"]
+        fastest += result["min_seconds"]
+        slowest += result["max_seconds"]
+        plans.append(plan)
+    return plans, {
+        "patients": len(patients),
+        "actions": total_actions,
+        "problems": problems,
+        "min_seconds": fastest,
+        "max_seconds": slowest,
+        "check_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def save_plans(plans, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plans, f, ensure_ascii=False, indent=1, default=str)
+
+
+def load_plans(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ===== Executing =====
+
+class PlanExecutor:
+    """Replays plans through a Tool's input backend, waiter and row filling."""
+
+    def __init__(self, tool, should_stop=None):
+        """
+        Args:
+            tool: Tool whose window position, input, waiter and fill_thu_thuat_data() are used
+            should_stop: Optional function; the plan stops when it returns True
+        """
+        self.tool = tool
+        self.should_stop = should_stop or (lambda: False)
+
+    def run(self, plan):
+        """Execute a plan, timing each step. Returns False if it was stopped part way."""
+        for step, actions in groupby(plan["actions"], key=lambda a: a.get("step")):
+            with tracer.span(f"step:{step}"):
+                if not self._run(actions):
+                    return False
+        return True
+
+    def _run(self, actions):
+        tool = self.tool
+        region = baseline = None
+        for action in actions:
+            if self.should_stop():
+                return False
+            kind = action["kind"]
+            if kind in ("click", "double_click"):
+                screen = tool._to_screen(action["coords"])
+                tool.input.click(tool.dlg, screen, double=kind == "double_click")
+            elif kind == "keys":
+                tool.input.send_keys(action["keys"], action.get("pause"))
+            elif kind == "paste":
+                tool.input.paste(action["text"])
+            elif kind == "grab":
+                left, top, width, height = action["region"]
+                region = tool._to_screen((left, top)) + (width, height)
+                baseline = tool.input.grab(region)
+            elif kind == "wait":
+                tool.waiter.settle(action["key"], action["timeout"])
+            elif kind == "wait_for":
+                tool.waiter.wait_for(action["key"], region_changed(region, baseline, tool.input.grab),
+                                     action["timeout"])
+            elif kind == "copy":
+                tool._read_back_date(action["text"])
+            elif kind == "services":
+                tool.fill_thu_thuat_data(action["procedures"], mode=action["mode"],
+                                         arrow_mode=action["arrow_mode"])
+            else:
+                raise ValueError(f"Unknown plan action: {kind}")
+        return True
+
+
+def main():
+    import argparse
+    from handle_data import read_data
+
+    parser = argparse.ArgumentParser(description="Compile patient data into action plans and dry-run them.")
+    parser.add_argument("csv", help="Patient data file (same format as the GUI loads)")
+    parser.add_argument("--arrow", action="store_true", help="Type dates part by part with arrow keys")
+    parser.add_argument("--output", help="Write the optimized plans to this JSON file")
+    args = parser.parse_args()
+
+    plans, summary = validate_batch(read_data(args.csv), arrow_mode=args.arrow)
+    print(f"{summary['patients']} patients, {summary['actions']} actions, "
+          f"checked in {summary['check_ms']:.1f} ms")
+    print(f"estimated run time {summary['min_seconds']:.0f}-{summary['max_seconds']:.0f} s")
+    for patient_id, problems in summary["problems"].items():
+        for problem in problems:
+            print(f"ERROR {patient_id}: {problem}")
+    if args.output:
+        save_plans([p for p in plans if p is not None], args.output)
+    return 1 if summary["problems"] else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
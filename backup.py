@@ -0,0 +1,142 @@
+"""
+Online backups of app_data.db.
+
+Snapshots are taken with sqlite3.Connection.backup, a few pages at a time with a
+short sleep between steps, so the app can keep reading and writing while a
+backup runs. Snapshots are written to BACKUP_DIR, rotated, and can be opened
+read-only or copied back over the live database with restore_from_snapshot().
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import database
+from db_executor import PeriodicJob, run_background
+
+# Where snapshots are stored and how many are kept
+BACKUP_DIR = "backups"
+KEEP_SNAPSHOTS = 10
+# Pages copied per step and pause between steps (seconds)
+BACKUP_PAGES = 64
+BACKUP_SLEEP = 0.005
+# First backup a few minutes after startup, then every 6 hours
+FIRST_RUN_DELAY_MS = 5 * 60 * 1000
+RUN_INTERVAL_MS = 6 * 60 * 60 * 1000
+
+SNAPSHOT_PREFIX = "app_data-"
+SNAPSHOT_SUFFIX = ".db"
+
+
+def _snapshot_name():
+    return f"{SNAPSHOT_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{SNAPSHOT_SUFFIX}"
+
+
+def create_snapshot(backup_dir=BACKUP_DIR, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """
+    Copy the live database to a new snapshot file in backup_dir.
+    Returns the path of the snapshot.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, _snapshot_name())
+    # Write to a temporary name so a half-written file never looks like a snapshot
+    tmp_path = path + ".tmp"
+
+    def pause(status, remaining, total):
+        # Give writers a chance between steps
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    src = sqlite3.connect(database.DATABASE_FILE)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        src.backup(dst, pages=pages, progress=pause)
+    finally:
+        dst.close()
+        src.close()
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """Return snapshot paths, newest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [
+        name for name in os.listdir(backup_dir)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+    ]
+    # Timestamped names sort chronologically
+    names.sort(reverse=True)
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def rotate_snapshots(keep=KEEP_SNAPSHOTS, backup_dir=BACKUP_DIR):
+    """Delete all but the newest `keep` snapshots. Returns the removed paths."""
+    removed = []
+    for path in list_snapshots(backup_dir)[keep:]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError as e:
+            print(f"Không thể xóa bản sao lưu {path}: {e}")
+    return removed
+
+
+def backup_now(keep=KEEP_SNAPSHOTS, backup_dir=BACKUP_DIR):
+    """Create a snapshot and rotate old ones. Returns the new snapshot path."""
+    path = create_snapshot(backup_dir)
+    rotate_snapshots(keep, backup_dir)
+    return path
+
+
+def open_snapshot(path):
+    """Open a snapshot read-only, e.g. to inspect old data without touching the live database."""
+    uri = "file:" + os.path.abspath(path).replace("\\", "/") + "?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
+def restore_from_snapshot(path):
+    """
+    Replace the contents of the live database with a snapshot.
+    The copy is done in a single backup step. Cached settings, coordinates and
+    staff are reloaded afterwards.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    src = open_snapshot(path)
+    dst = sqlite3.connect(database.DATABASE_FILE)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+    database.settings.invalidate()
+
+    import config
+    import coordinate_profiles
+    coordinate_profiles.profiles.invalidate()
+    config.reload_coordinates()
+    config.reload_staff()
+
+
+class BackupScheduler(PeriodicJob):
+    """Takes a snapshot periodically on the database background thread."""
+
+    name = "Backup"
+
+    def __init__(self, root, keep=KEEP_SNAPSHOTS, interval_ms=RUN_INTERVAL_MS,
+                 first_delay_ms=FIRST_RUN_DELAY_MS, log=print):
+        super().__init__(root, interval_ms, first_delay_ms, log)
+        self.keep = keep
+
+    def submit(self, callback, errback):
+        # A paged backup takes a while; on the reader thread it would hold up GUI queries
+        run_background(backup_now, self.keep, callback=callback, errback=errback)
+
+    def report(self, path):
+        self.log(f"✓ Đã sao lưu dữ liệu: {path}")
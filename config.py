@@ -36,6 +36,15 @@ thu_thuat_ability_mapper = {
     "giác": "ys",
     "cứu": "ys",
 }
+# Service names as the HIS grid writes them; OCR typos are corrected against these
+thu_thuat_label_mapper = {
+    "điện": "điện châm",
+    "thủy": "thủy châm",
+    "xoa": "xoa bóp bấm huyệt",
+    "kéo": "kéo giãn cột sống",
+    "giác": "giác hơi",
+    "cứu": "cứu ngải",
+}
 
 # Auto-scheduling time slots.
 # Provide times as "HH:MM". By default these are "Ngay CD" times.
@@ -52,8 +61,81 @@ DICH_VU_THU_THUAT = [
     (700,215)
 ]
 
+# Save every captured service row to '<dir>/<recognized procedure>/' (e.g. "saved_images")
+# to build a corpus for ocr_benchmark.py. None disables saving.
+OCR_SAVE_ROWS_DIR = None
+
+# Arrow-mode date entry: "keys" sends the whole date as one key sequence
+# ('16{RIGHT}12{RIGHT}2025...'), "paste" pastes it if the date fields accept that.
+DATE_ENTRY = "keys"
+# Pause between keystrokes inside one key sequence (pywinauto send_keys pause)
+KEY_PAUSE = 0.01
+# Copy the date back out of the field after entry and retype it part by part if it differs
+DATE_READBACK = False
+
+# Scale coordinates with the HIS window size (from the size at connect time).
+# Off by default: coordinates are only moved with the window's position.
+SCALE_COORDINATES = False
+
 # ===== Coordinate Configuration =====
-# Load coordinates from database, with hardcoded defaults as fallback
+# Coordinates and staff are loaded from the database on first access, not at
+# import time. Read them as attributes of the module (config.ID_BOX,
+# config.map_ys_bs, ...) so reloads are always visible; `from config import ID_BOX`
+# keeps a copy that reload_coordinates() cannot update.
+
+import json
+import os
+import threading
+
+# Hardcoded fallback used when the database cannot be read
+DEFAULT_COORDINATES = {
+    'ID_BOX': (78, 191),
+    'LUU': (537, 966),
+    'TIEP': (464, 964),
+    'SUA': (670, 966),
+    'PATIENT_ROW': (181, 249),
+    'BSCD_NGUOI_DAU_TIEN': (1595, 348),
+    'CCHN_NGUOI_DAU_TIEN': (1624, 444),
+    'CCHN': (1820, 344),
+    'NGAY_KQ': (1820, 322),
+    'NGAY_BDTH': (1820, 299),
+    'NGAY_CD': (1820, 278),
+    'BSCD': (1820, 256),
+    'NGAY_KET_THUC': (275, 151),
+    'NGAY_BAT_DAU': (153, 151),
+    'CHO_THUC_HIEN': (126, 133),
+    'DA_THUC_HIEN': (250, 133),
+    'RELOAD': (390, 141),
+}
+
+# IMPORTANT: Keep groups SEPARATE to avoid duplication in UI
+DEFAULT_STAFF_P1_P3 = {
+    "duy": "Nguyễn Văn Duy",
+    "lya": "H' Lya Niê",
+    "quân": "Lê Văn Quân",
+    "khoái": "Nguyễn Công Khoái",
+    "thịnh": "Nguyễn Văn Thịnh",
+    "hạnh": "Nguyễn Hữu Hạnh",
+    "diệu": "Nguyễn Thị Diệu",
+    "lực": "Lê Đức Lực",
+    "thơ": "Lê Thị Ngọc Thơ",
+    "nhẹ": "H' Nhẹ Niê",
+    "trúc": "Lê Ngọc Trúc",
+}
+
+DEFAULT_STAFF_P2 = {
+    "hiền": "Trần Thị Thu Hiền",
+    "hoà": "Trần Thị Diệu Hoà",
+    "anh": "Nguyễn Duy Anh",
+    "trị": "Bùi Tá Việt Trị",
+}
+
+STAFF_NAMES = ('staff_p1_p3', 'staff_p2', 'map_ys_bs')
+
+# Events published by reload_coordinates() / reload_staff()
+COORDINATES_CHANGED = "coordinates"
+STAFF_CHANGED = "staff"
+
 
 def load_coordinates_from_db():
     """Load coordinates from database. Returns dict with coordinate names as keys and (x, y) tuples as values."""
@@ -73,78 +155,8 @@ def load_coordinates_from_db():
     except Exception as e:
         print(f"Error loading coordinates from database: {e}")
         # Fallback to hardcoded defaults
-        return {
-            'ID_BOX': (78, 191),
-            'LUU': (537, 966),
-            'TIEP': (464, 964),
-            'SUA': (670, 966),
-            'PATIENT_ROW': (181, 249),
-            'BSCD_NGUOI_DAU_TIEN': (1595, 348),
-            'CCHN_NGUOI_DAU_TIEN': (1624, 444),
-            'CCHN': (1820, 344),
-            'NGAY_KQ': (1820, 322),
-            'NGAY_BDTH': (1820, 299),
-            'NGAY_CD': (1820, 278),
-            'BSCD': (1820, 256),
-            'NGAY_KET_THUC': (275, 151),
-            'NGAY_BAT_DAU': (153, 151),
-            'CHO_THUC_HIEN': (126, 133),
-            'DA_THUC_HIEN': (250, 133),
-            'RELOAD': (390, 141),
-        }
+        return dict(DEFAULT_COORDINATES)
 
-# Load coordinates
-_coords = load_coordinates_from_db()
-
-# Export as module-level constants for backward compatibility
-ID_BOX = _coords.get('ID_BOX', (78, 191))
-LUU = _coords.get('LUU', (537, 966))
-TIEP = _coords.get('TIEP', (464, 964))
-SUA = _coords.get('SUA', (670, 966))
-PATIENT_ROW = _coords.get('PATIENT_ROW', (181, 249))
-BSCD_NGUOI_DAU_TIEN = _coords.get('BSCD_NGUOI_DAU_TIEN', (1595, 348))
-CCHN_NGUOI_DAU_TIEN = _coords.get('CCHN_NGUOI_DAU_TIEN', (1624, 444))
-CCHN = _coords.get('CCHN', (1820, 344))
-NGAY_KQ = _coords.get('NGAY_KQ', (1820, 322))
-NGAY_BDTH = _coords.get('NGAY_BDTH', (1820, 299))
-NGAY_CD = _coords.get('NGAY_CD', (1820, 278))
-BSCD = _coords.get('BSCD', (1820, 256))
-NGAY_KET_THUC = _coords.get('NGAY_KET_THUC', (275, 151))
-NGAY_BAT_DAU = _coords.get('NGAY_BAT_DAU', (153, 151))
-CHO_THUC_HIEN = _coords.get('CHO_THUC_HIEN', (126, 133))
-DA_THUC_HIEN = _coords.get('DA_THUC_HIEN', (250, 133))
-RELOAD = _coords.get('RELOAD', (390, 141))
-
-def reload_coordinates():
-    """Reload coordinates from database. Call this after coordinates are updated."""
-    global ID_BOX, LUU, TIEP, SUA, PATIENT_ROW, BSCD_NGUOI_DAU_TIEN, CCHN_NGUOI_DAU_TIEN
-    global CCHN, NGAY_KQ, NGAY_BDTH, NGAY_CD, BSCD, NGAY_KET_THUC, NGAY_BAT_DAU
-    global CHO_THUC_HIEN, DA_THUC_HIEN, RELOAD, _coords
-    
-    _coords = load_coordinates_from_db()
-    
-    ID_BOX = _coords.get('ID_BOX', (78, 191))
-    LUU = _coords.get('LUU', (537, 966))
-    TIEP = _coords.get('TIEP', (464, 964))
-    SUA = _coords.get('SUA', (670, 966))
-    PATIENT_ROW = _coords.get('PATIENT_ROW', (181, 249))
-    BSCD_NGUOI_DAU_TIEN = _coords.get('BSCD_NGUOI_DAU_TIEN', (1595, 348))
-    CCHN_NGUOI_DAU_TIEN = _coords.get('CCHN_NGUOI_DAU_TIEN', (1624, 444))
-    CCHN = _coords.get('CCHN', (1820, 344))
-    NGAY_KQ = _coords.get('NGAY_KQ', (1820, 322))
-    NGAY_BDTH = _coords.get('NGAY_BDTH', (1820, 299))
-    NGAY_CD = _coords.get('NGAY_CD', (1820, 278))
-    BSCD = _coords.get('BSCD', (1820, 256))
-    NGAY_KET_THUC = _coords.get('NGAY_KET_THUC', (275, 151))
-    NGAY_BAT_DAU = _coords.get('NGAY_BAT_DAU', (153, 151))
-    CHO_THUC_HIEN = _coords.get('CHO_THUC_HIEN', (126, 133))
-    DA_THUC_HIEN = _coords.get('DA_THUC_HIEN', (250, 133))
-    RELOAD = _coords.get('RELOAD', (390, 141))
-
-
-
-import json
-import os
 
 def load_staff_config(filename):
     """Load staff configuration from JSON file (deprecated - kept for fallback)."""
@@ -193,49 +205,136 @@ def load_staff_from_database():
         staff_p2 = load_staff_config("staff_group_2.json")
         return staff_p1_p3, staff_p2
 
-# Load staff groups from database
-staff_p1_p3, staff_p2 = load_staff_from_database()
 
-# Create merged map for backward compatibility
-map_ys_bs = {**staff_p1_p3, **staff_p2}
+class ConfigCache:
+    """Coordinates and staff, loaded from the database on first use and cached.
+    
+    reload_coordinates() / reload_staff() refresh the cache and notify
+    subscribers. Callbacks run on the thread that triggered the reload (often
+    the database writer thread), so GUI subscribers must hop to the Tk thread.
+    """
+    
+    def __init__(self):
+        self._coords = None
+        self._staff = None
+        # Name of the coordinate profile in use, None for the coordinates table
+        self.active_profile = None
+        self._lock = threading.RLock()
+        self._subscribers = {COORDINATES_CHANGED: [], STAFF_CHANGED: []}
+    
+    @property
+    def coords(self):
+        with self._lock:
+            if self._coords is None:
+                self._coords = load_coordinates_from_db()
+            return self._coords
+    
+    @property
+    def staff(self):
+        """Return {'staff_p1_p3': ..., 'staff_p2': ..., 'map_ys_bs': ...}."""
+        with self._lock:
+            if self._staff is None:
+                self._staff = self._load_staff()
+            return self._staff
+    
+    def _load_staff(self):
+        staff_p1_p3, staff_p2 = load_staff_from_database()
+        
+        # If loading failed completely, use hardcoded defaults (fail-safe)
+        if not staff_p1_p3:
+            staff_p1_p3 = dict(DEFAULT_STAFF_P1_P3)
+        if not staff_p2:
+            staff_p2 = dict(DEFAULT_STAFF_P2)
+        
+        return {
+            'staff_p1_p3': staff_p1_p3,
+            'staff_p2': staff_p2,
+            # Merged map for backward compatibility
+            'map_ys_bs': {**staff_p1_p3, **staff_p2},
+        }
+    
+    def get_coordinate(self, name):
+        return self.coords.get(name, DEFAULT_COORDINATES[name])
+    
+    def reload_coordinates(self):
+        with self._lock:
+            self._coords = load_coordinates_from_db()
+            self.active_profile = None
+            coords = self._coords
+        self._publish(COORDINATES_CHANGED, coords)
+        return coords
+    
+    def use_coordinates(self, coords, profile_name=None):
+        """Switch to another coordinate set (e.g. a screen profile) without touching the database."""
+        with self._lock:
+            # Points missing from the profile keep their current value
+            merged = dict(self.coords)
+            merged.update(coords)
+            self._coords = merged
+            self.active_profile = profile_name
+        self._publish(COORDINATES_CHANGED, merged)
+        return merged
+    
+    def reload_staff(self):
+        with self._lock:
+            self._staff = self._load_staff()
+            staff = self._staff
+        self._publish(STAFF_CHANGED, staff)
+        return staff
+    
+    def subscribe(self, event, callback):
+        """Call callback(new_values) whenever event is published."""
+        with self._lock:
+            self._subscribers[event].append(callback)
+    
+    def unsubscribe(self, event, callback):
+        with self._lock:
+            if callback in self._subscribers[event]:
+                self._subscribers[event].remove(callback)
+    
+    def _publish(self, event, values):
+        with self._lock:
+            callbacks = list(self._subscribers[event])
+        for callback in callbacks:
+            try:
+                callback(values)
+            except Exception as e:
+                print(f"Config subscriber failed on {event}: {e}")
+
+
+# Shared cache behind the module attributes below
+cache = ConfigCache()
+
+
+def __getattr__(name):
+    """Serve coordinate and staff attributes (config.ID_BOX, config.map_ys_bs, ...) lazily."""
+    if name in DEFAULT_COORDINATES:
+        return cache.get_coordinate(name)
+    if name in STAFF_NAMES:
+        return cache.staff[name]
+    if name == '_coords':
+        return cache.coords
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def reload_coordinates():
+    """Reload coordinates from database. Call this after coordinates are updated."""
+    return cache.reload_coordinates()
 
-# If loading failed completely, use hardcoded defaults (fail-safe)
-# IMPORTANT: Keep groups SEPARATE to avoid duplication in UI
-if not staff_p1_p3:
-    staff_p1_p3 = {
-        "duy": "Nguyễn Văn Duy",
-        "lya": "H' Lya Niê",
-        "quân": "Lê Văn Quân",
-        "khoái": "Nguyễn Công Khoái",
-        "thịnh": "Nguyễn Văn Thịnh",
-        "hạnh": "Nguyễn Hữu Hạnh",
-        "diệu": "Nguyễn Thị Diệu",
-        "lực": "Lê Đức Lực",
-        "thơ": "Lê Thị Ngọc Thơ",
-        "nhẹ": "H' Nhẹ Niê",
-        "trúc": "Lê Ngọc Trúc",
-    }
-
-if not staff_p2:
-    staff_p2 = {
-        "hiền": "Trần Thị Thu Hiền",
-        "hoà": "Trần Thị Diệu Hoà",
-        "anh": "Nguyễn Duy Anh",
-        "trị": "Bùi Tá Việt Trị",
-    }
-
-# Rebuild merged map if fallback was used
-if not map_ys_bs:
-    map_ys_bs = {**staff_p1_p3, **staff_p2}
 
 def reload_staff():
     """Reload staff from database. Call this after staff changes."""
-    global staff_p1_p3, staff_p2, map_ys_bs
-    
-    staff_p1_p3, staff_p2 = load_staff_from_database()
-    map_ys_bs = {**staff_p1_p3, **staff_p2}
-    
-    return staff_p1_p3, staff_p2, map_ys_bs
+    staff = cache.reload_staff()
+    return staff['staff_p1_p3'], staff['staff_p2'], staff['map_ys_bs']
+
+
+def subscribe(event, callback):
+    """Subscribe to COORDINATES_CHANGED or STAFF_CHANGED."""
+    cache.subscribe(event, callback)
+
+
+def unsubscribe(event, callback):
+    cache.unsubscribe(event, callback)
 
 # # List of disabled/excluded staff members (lowercase short names as keys in map_ys_bs)
 # # Staff in this list will not appear in manual entry and will cause errors during automation
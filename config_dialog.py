@@ -1,11 +1,14 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 import config
 from database import (get_disabled_staff, set_disabled_staff, add_doctor_leave, 
                       get_all_doctor_leaves, delete_doctor_leave, get_all_staff,
                       add_staff, delete_staff, add_weekly_leave, 
-                      get_all_weekly_leaves, delete_weekly_leave)
+                      get_all_weekly_leaves, delete_weekly_leave,
+                      add_doctor_leaves_bulk, add_weekly_leaves_bulk)
+from handle_data import read_leave_roster
+from db_executor import run_read, run_write
 
 class ConfigDialog:
     def __init__(self, parent):
@@ -97,12 +100,13 @@ class ConfigDialog:
         lists_container = ttk.Frame(staff_frame)
         lists_container.pack(fill="both", expand=True)
         
-        # Initialize vars for all potential staff
-        disabled_staff = get_disabled_staff()
+        # Initialize vars for all potential staff (enabled until the saved state arrives)
         all_keys = set(config.staff_p1_p3.keys()) | set(config.staff_p2.keys())
         
         for key in all_keys:
-            self.checkbox_vars[key] = tk.BooleanVar(value=key not in disabled_staff)
+            self.checkbox_vars[key] = tk.BooleanVar(value=True)
+        
+        run_read(get_disabled_staff, callback=self.apply_disabled_staff)
             
         def create_staff_list(parent, title, staff_dict):
             frame = ttk.LabelFrame(parent, text=title, padding="10")
@@ -154,6 +158,13 @@ class ConfigDialog:
                              style="Accent.TButton")
         save_btn.pack(pady=(15, 0))
     
+    def apply_disabled_staff(self, disabled_staff):
+        """Untick the staff that are disabled in the database."""
+        if not self.dialog.winfo_exists():
+            return
+        for key, var in self.checkbox_vars.items():
+            var.set(key not in disabled_staff)
+    
     def setup_leave_tab(self, notebook):
         """Setup the leave schedule tab with sub-notebook for date and weekly leaves."""
         leave_frame = ttk.Frame(notebook, padding="10")
@@ -215,6 +226,8 @@ class ConfigDialog:
         # Add button
         add_btn = ttk.Button(add_frame, text="➕ Thêm Lịch Nghỉ", command=self.add_leave)
         add_btn.grid(row=4, column=1, pady=(10, 0))
+        import_btn = ttk.Button(add_frame, text="📥 Nhập Từ CSV", command=self.import_leaves)
+        import_btn.grid(row=4, column=2, pady=(10, 0), padx=(5, 0))
         
         add_frame.columnconfigure(1, weight=1)
         
@@ -360,20 +373,55 @@ class ConfigDialog:
             session = self.leave_session_var.get()
             reason = self.leave_reason_var.get().strip()
             
-            # Add to database
-            add_doctor_leave(short_name, db_date, session, reason)
-            
-            # Refresh list
-            self.refresh_leaves()
-            
-            # Clear form
-            self.leave_reason_var.set("")
+            def on_added(_leave_id):
+                # Refresh list
+                self.refresh_leaves()
+                
+                # Clear form
+                self.leave_reason_var.set("")
+                
+                messagebox.showinfo("Thành Công", "Thêm lịch nghỉ thành công")
             
-            messagebox.showinfo("Thành Công", "Thêm lịch nghỉ thành công")
+            # Add to database
+            run_write(add_doctor_leave, short_name, db_date, session, reason,
+                      callback=on_added,
+                      errback=lambda e: messagebox.showerror("Lỗi", f"Không thể thêm lịch nghỉ:\n{str(e)}"))
             
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể thêm lịch nghỉ:\n{str(e)}")
     
+    def import_leaves(self):
+        """Import a leave roster CSV (staff;day;session;reason), all rows in one transaction per table."""
+        filename = filedialog.askopenfilename(
+            parent=self.dialog,
+            title="Chọn file lịch nghỉ",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+        )
+        if not filename:
+            return
+        
+        def on_saved(result):
+            leave_ids, weekly_ids = result
+            self.refresh_leaves()
+            self.refresh_weekly_leaves()
+            messagebox.showinfo("Thành Công", f"Đã nhập {len(leave_ids)} lịch nghỉ theo ngày "
+                                f"và {len(weekly_ids)} lịch nghỉ hằng tuần")
+        
+        def on_read(result):
+            leaves, weekly_leaves, errors = result
+            if errors:
+                messagebox.showerror("Lỗi", "File lịch nghỉ có lỗi, chưa nhập dòng nào:\n" + "\n".join(errors[:10]))
+                return
+            if not leaves and not weekly_leaves:
+                messagebox.showinfo("Thông báo", "File không có lịch nghỉ nào")
+                return
+            run_write(lambda: (add_doctor_leaves_bulk(leaves), add_weekly_leaves_bulk(weekly_leaves)),
+                      callback=on_saved,
+                      errback=lambda e: messagebox.showerror("Lỗi", f"Không thể nhập lịch nghỉ:\n{str(e)}"))
+        
+        run_read(read_leave_roster, filename, callback=on_read,
+                 errback=lambda e: messagebox.showerror("Lỗi", f"Không thể đọc file:\n{str(e)}"))
+    
     def delete_leave(self):
         """Delete selected leave."""
         selection = self.leave_tree.selection()
@@ -385,18 +433,25 @@ class ConfigDialog:
         leave_id = self.leave_tree.item(item, "values")[4]  # Hidden column
         
         if messagebox.askyesno("Xác Nhận", "Xóa bản ghi lịch nghỉ này?"):
-            delete_doctor_leave(int(leave_id))
-            self.refresh_leaves()
-            messagebox.showinfo("Thành Công", "Lịch nghỉ đã xóa")
+            def on_deleted(_result):
+                self.refresh_leaves()
+                messagebox.showinfo("Thành Công", "Lịch nghỉ đã xóa")
+            
+            run_write(delete_doctor_leave, int(leave_id), callback=on_deleted)
     
     def refresh_leaves(self):
-        """Refresh the leave tree with current data."""
+        """Reload the leave tree from the database in the background."""
+        run_read(get_all_doctor_leaves, callback=self.render_leaves)
+    
+    def render_leaves(self, leaves):
+        """Fill the leave tree with the given leave records."""
+        if not self.dialog.winfo_exists():
+            return
+        
         # Clear existing
         for item in self.leave_tree.get_children():
             self.leave_tree.delete(item)
         
-        # Load from database
-        leaves = get_all_doctor_leaves()
         for leave in leaves:
             # Get full name from short name
             full_name = config.map_ys_bs.get(leave['staff_short_name'], leave['staff_short_name'])
@@ -449,16 +504,19 @@ class ConfigDialog:
             session = self.weekly_session_var.get()
             reason = self.weekly_reason_var.get().strip()
             
-            # Add to database
-            add_weekly_leave(short_name, day_of_week, session, reason)
-            
-            # Refresh list
-            self.refresh_weekly_leaves()
-            
-            # Clear form
-            self.weekly_reason_var.set("")
+            def on_added(_leave_id):
+                # Refresh list
+                self.refresh_weekly_leaves()
+                
+                # Clear form
+                self.weekly_reason_var.set("")
+                
+                messagebox.showinfo("Thành Công", f"Thêm lịch nghỉ hằng tuần: {day_str}")
             
-            messagebox.showinfo("Thành Công", f"Thêm lịch nghỉ hằng tuần: {day_str}")
+            # Add to database
+            run_write(add_weekly_leave, short_name, day_of_week, session, reason,
+                      callback=on_added,
+                      errback=lambda e: messagebox.showerror("Lỗi", f"Không thể thêm lịch nghỉ hằng tuần:\n{str(e)}"))
             
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể thêm lịch nghỉ hằng tuần:\n{str(e)}")
@@ -474,19 +532,25 @@ class ConfigDialog:
         leave_id = self.weekly_tree.item(item, "values")[4]  # Hidden column
         
         if messagebox.askyesno("Xác Nhận", "Xóa bản ghi lịch nghỉ hằng tuần này?"):
-            delete_weekly_leave(int(leave_id))
-            self.refresh_weekly_leaves()
-            messagebox.showinfo("Thành Công", "Đã xóa lịch nghỉ hằng tuần")
+            def on_deleted(_result):
+                self.refresh_weekly_leaves()
+                messagebox.showinfo("Thành Công", "Đã xóa lịch nghỉ hằng tuần")
+            
+            run_write(delete_weekly_leave, int(leave_id), callback=on_deleted)
     
     def refresh_weekly_leaves(self):
-        """Refresh the weekly leave tree with current data."""
+        """Reload the weekly leave tree from the database in the background."""
+        run_read(get_all_weekly_leaves, callback=self.render_weekly_leaves)
+    
+    def render_weekly_leaves(self, leaves):
+        """Fill the weekly leave tree with the given leave records."""
+        if not self.dialog.winfo_exists():
+            return
+        
         # Clear existing
         for item in self.weekly_tree.get_children():
             self.weekly_tree.delete(item)
         
-        # Load from database
-        leaves = get_all_weekly_leaves()
-        
         day_names = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "CN"]
         session_map = {
             "morning": "Sáng",
@@ -519,9 +583,9 @@ class ConfigDialog:
         disabled = [name for name, var in self.checkbox_vars.items() if not var.get()]
         
         # Save to database
-        set_disabled_staff(disabled)
-        
-        messagebox.showinfo("Thành Công", f"Cấu hình đã lưu!\n{len(disabled)} nhân viên đã vô hiệu hóa.")
+        run_write(set_disabled_staff, disabled,
+                  callback=lambda _: messagebox.showinfo("Thành Công", f"Cấu hình đã lưu!\n{len(disabled)} nhân viên đã vô hiệu hóa."),
+                  errback=lambda e: messagebox.showerror("Lỗi", f"Không thể lưu cấu hình:\n{str(e)}"))
     
     def setup_staff_management_tab(self, notebook):
         """Setup the staff management tab."""
@@ -622,16 +686,20 @@ class ConfigDialog:
         self.refresh_staff_lists()
     
     def refresh_staff_lists(self):
-        """Refresh both staff lists from database."""
+        """Reload both staff lists from the database in the background."""
+        run_read(get_all_staff, callback=self.render_staff_lists)
+    
+    def render_staff_lists(self, all_staff):
+        """Fill both staff trees with the given staff records."""
+        if not self.dialog.winfo_exists():
+            return
+        
         # Clear existing
         for item in self.g1_tree.get_children():
             self.g1_tree.delete(item)
         for item in self.g2_tree.get_children():
             self.g2_tree.delete(item)
         
-        # Load from database
-        all_staff = get_all_staff()
-        
         for staff in all_staff:
             if staff['group_id'] == 1:
                 self.g1_tree.insert("", "end", values=(staff['short_name'], staff['full_name']))
@@ -652,24 +720,32 @@ class ConfigDialog:
                 messagebox.showerror("Lỗi", "Vui lòng nhập đầy đủ tên ngắn và tên đầy đủ")
                 return
             
-            # Add to database
-            add_staff(short_name, full_name, group_id)
-            
-            # Reload config
-            config.reload_staff()
+            def add_and_reload():
+                # Add to database, then reload config
+                add_staff(short_name, full_name, group_id)
+                config.reload_staff()
             
-            # Refresh list
-            self.refresh_staff_lists()
+            def on_added(_result):
+                # Refresh list
+                self.refresh_staff_lists()
+                
+                # Clear form
+                if group_id == 1:
+                    self.g1_short_var.set("")
+                    self.g1_full_var.set("")
+                else:
+                    self.g2_short_var.set("")
+                    self.g2_full_var.set("")
+                
+                messagebox.showinfo("Thành Công", f"Đã thêm {full_name} ({short_name}) vào Nhóm {group_id}")
             
-            # Clear form
-            if group_id == 1:
-                self.g1_short_var.set("")
-                self.g1_full_var.set("")
-            else:
-                self.g2_short_var.set("")
-                self.g2_full_var.set("")
+            def on_error(e):
+                if isinstance(e, ValueError):
+                    messagebox.showerror("Lỗi", str(e))
+                else:
+                    messagebox.showerror("Lỗi", f"Không thể thêm nhân viên:\n{str(e)}")
             
-            messagebox.showinfo("Thành Công", f"Đã thêm {full_name} ({short_name}) vào Nhóm {group_id}")
+            run_write(add_and_reload, callback=on_added, errback=on_error)
             
         except ValueError as e:
             messagebox.showerror("Lỗi", str(e))
@@ -693,20 +769,19 @@ class ConfigDialog:
         if messagebox.askyesno("Xác Nhận", 
                                f"Xóa nhân viên {full_name} ({short_name})?\n\n"
                                "Lưu ý: Nhân viên này sẽ không còn xuất hiện trong danh sách nhập liệu."):
-            try:
-                # Delete from database
+            def delete_and_reload():
+                # Delete from database, then reload config
                 delete_staff(short_name)
-                
-                # Reload config
                 config.reload_staff()
-                
+            
+            def on_deleted(_result):
                 # Refresh list
                 self.refresh_staff_lists()
                 
                 messagebox.showinfo("Thành Công", f"Đã xóa {full_name}")
-                
-            except Exception as e:
-                messagebox.showerror("Lỗi", f"Không thể xóa nhân viên:\n{str(e)}")
+            
+            run_write(delete_and_reload, callback=on_deleted,
+                      errback=lambda e: messagebox.showerror("Lỗi", f"Không thể xóa nhân viên:\n{str(e)}"))
     
     def setup_coordinates_tab(self, notebook):
         """Setup the coordinates configuration tab."""
@@ -741,10 +816,6 @@ class ConfigDialog:
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Load coordinates
-        coords = get_all_coordinates()
-        sorted_coords = sorted(coords.items())
-        
         # Store entry widgets
         self.coord_entry_widgets = {}
         
@@ -761,8 +832,29 @@ class ConfigDialog:
         # Separator
         ttk.Separator(scrollable_frame, orient='horizontal').pack(fill='x', padx=5, pady=(0, 5))
         
+        # Rows are created once the coordinates arrive from the database
+        run_read(get_all_coordinates,
+                 callback=lambda coords: self.render_coordinate_rows(scrollable_frame, coords))
+        
+        # Buttons frame
+        buttons_frame = ttk.Frame(coords_frame)
+        buttons_frame.pack(fill="x", pady=(10, 0))
+        
+        save_coords_btn = ttk.Button(buttons_frame, text="💾 Lưu Tọa Độ",
+                                     command=self.save_coordinates)
+        save_coords_btn.pack(side="left", padx=(0, 5))
+        
+        restore_btn = ttk.Button(buttons_frame, text="🔄 Khôi Phục Mặc Định",
+                                command=self.restore_default_coords)
+        restore_btn.pack(side="left")
+    
+    def render_coordinate_rows(self, scrollable_frame, coords):
+        """Create one editable row per coordinate."""
+        if not scrollable_frame.winfo_exists():
+            return
+        
         # Create rows for each coordinate
-        for name, (x, y, description) in sorted_coords:
+        for name, (x, y, description) in sorted(coords.items()):
             row_frame = ttk.Frame(scrollable_frame)
             row_frame.pack(fill="x", padx=5, pady=2)
             
@@ -796,18 +888,6 @@ class ConfigDialog:
                 'y_var': y_var,
                 'description': description
             }
-        
-        # Buttons frame
-        buttons_frame = ttk.Frame(coords_frame)
-        buttons_frame.pack(fill="x", pady=(10, 0))
-        
-        save_coords_btn = ttk.Button(buttons_frame, text="💾 Lưu Tọa Độ",
-                                     command=self.save_coordinates)
-        save_coords_btn.pack(side="left", padx=(0, 5))
-        
-        restore_btn = ttk.Button(buttons_frame, text="🔄 Khôi Phục Mặc Định",
-                                command=self.restore_default_coords)
-        restore_btn.pack(side="left")
     
     def show_position_tracker(self, coord_name, x_var, y_var):
         """Show cursor position tracker window."""
@@ -870,12 +950,16 @@ class ConfigDialog:
                 description = widgets['description']
                 coords_to_save[name] = (x, y, description)
             
-            save_all_coordinates(coords_to_save)
-            config.reload_coordinates()
+            def save_and_reload():
+                save_all_coordinates(coords_to_save)
+                config.reload_coordinates()
             
-            messagebox.showinfo("Thành Công",
-                              f"Đã lưu {len(coords_to_save)} tọa độ vào database.",
-                              parent=self.dialog)
+            run_write(save_and_reload,
+                      callback=lambda _: messagebox.showinfo("Thành Công",
+                                                             f"Đã lưu {len(coords_to_save)} tọa độ vào database.",
+                                                             parent=self.dialog),
+                      errback=lambda e: messagebox.showerror("Lỗi", f"Không thể lưu tọa độ:\n{str(e)}",
+                                                             parent=self.dialog))
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể lưu tọa độ:\n{str(e)}",
                                parent=self.dialog)
@@ -889,12 +973,16 @@ class ConfigDialog:
                 from database import restore_default_coordinates
                 import config
                 
-                restore_default_coordinates()
-                config.reload_coordinates()
+                def restore_and_reload():
+                    restore_default_coordinates()
+                    config.reload_coordinates()
                 
-                messagebox.showinfo("Thành Công",
-                                  "Đã khôi phục tất cả tọa độ về giá trị mặc định.\nVui lòng đóng và mở lại dialog để xem thay đổi.",
-                                  parent=self.dialog)
+                run_write(restore_and_reload,
+                          callback=lambda _: messagebox.showinfo("Thành Công",
+                                                                 "Đã khôi phục tất cả tọa độ về giá trị mặc định.\nVui lòng đóng và mở lại dialog để xem thay đổi.",
+                                                                 parent=self.dialog),
+                          errback=lambda e: messagebox.showerror("Lỗi", f"Không thể khôi phục tọa độ:\n{str(e)}",
+                                                                 parent=self.dialog))
             except Exception as e:
                 messagebox.showerror("Lỗi", f"Không thể khôi phục tọa độ:\n{str(e)}",
                                    parent=self.dialog)
@@ -0,0 +1,141 @@
+"""
+Coordinate profiles per screen resolution and DPI.
+
+Each workstation can save the coordinates it was calibrated with as a named
+profile. When the app connects to the HIS window, the profile matching the
+current screen is applied automatically, so moving to another terminal does not
+need a new capture session. Screens without a profile keep the coordinates from
+the database. Profiles in 'relative' mode are scaled from the reference window
+size they were captured with to the current window size; like Tool, this only
+happens when config.SCALE_COORDINATES is on.
+"""
+
+import threading
+
+import config
+from database import get_all_coordinate_profiles, save_coordinate_profile, delete_coordinate_profile
+
+MODE_ABSOLUTE = "absolute"
+MODE_RELATIVE = "relative"
+
+
+def get_screen_metrics(root):
+    """Return (width, height, dpi) of the screen the Tk root is on."""
+    width = root.winfo_screenwidth()
+    height = root.winfo_screenheight()
+    dpi = int(round(root.winfo_fpixels('1i')))
+    return width, height, dpi
+
+
+def profile_name_for(width, height, dpi):
+    """Default profile name for a screen, e.g. '1920x1080@96'."""
+    return f"{width}x{height}@{dpi}"
+
+
+def scale_coordinates(coords, ref_size, window_size):
+    """Scale {name: (x, y)} captured in a ref_size window to window_size."""
+    ref_width, ref_height = ref_size
+    width, height = window_size
+    if not ref_width or not ref_height:
+        return dict(coords)
+    sx = width / ref_width
+    sy = height / ref_height
+    return {name: (int(round(x * sx)), int(round(y * sy))) for name, (x, y) in coords.items()}
+
+
+class ProfileStore:
+    """In-memory copy of all coordinate profiles, loaded once and written through."""
+    
+    def __init__(self):
+        self._profiles = None
+        self._lock = threading.Lock()
+    
+    def _load(self):
+        if self._profiles is None:
+            self._profiles = get_all_coordinate_profiles()
+    
+    def all(self):
+        with self._lock:
+            self._load()
+            return dict(self._profiles)
+    
+    def get(self, name):
+        with self._lock:
+            self._load()
+            return self._profiles.get(name)
+    
+    def save(self, name, screen, coords, mode=MODE_ABSOLUTE, ref_size=None):
+        """Save coords as profile `name` for screen (width, height, dpi)."""
+        width, height, dpi = screen
+        ref_width, ref_height = ref_size if ref_size else (None, None)
+        with self._lock:
+            profile_id = save_coordinate_profile(name, width, height, dpi, coords,
+                                                 mode, ref_width, ref_height)
+            if self._profiles is not None:
+                self._profiles[name] = {
+                    'id': profile_id,
+                    'name': name,
+                    'screen_width': width,
+                    'screen_height': height,
+                    'dpi': dpi,
+                    'mode': mode,
+                    'ref_width': ref_width,
+                    'ref_height': ref_height,
+                    'coords': dict(coords),
+                }
+        return profile_id
+    
+    def delete(self, name):
+        with self._lock:
+            delete_coordinate_profile(name)
+            if self._profiles is not None:
+                self._profiles.pop(name, None)
+    
+    def invalidate(self):
+        with self._lock:
+            self._profiles = None
+    
+    def select(self, width, height, dpi):
+        """The profile saved for this screen size and DPI, or None."""
+        for profile in self.all().values():
+            if (profile['screen_width'], profile['screen_height'], profile['dpi']) == (width, height, dpi):
+                return profile
+        return None
+
+
+# Shared profile cache
+profiles = ProfileStore()
+
+
+def resolve_profile(profile, window_size=None):
+    """Return the profile's coordinates for the current window size."""
+    if profile['mode'] == MODE_RELATIVE and window_size and config.SCALE_COORDINATES:
+        return scale_coordinates(profile['coords'],
+                                 (profile['ref_width'], profile['ref_height']),
+                                 window_size)
+    return dict(profile['coords'])
+
+
+def apply_profile_for_screen(screen, window_size=None):
+    """
+    Select the profile for screen (width, height, dpi) and make config use it.
+    Returns the applied profile, or None (config keeps its current coordinates).
+    """
+    profile = profiles.select(*screen)
+    if profile is None:
+        return None
+    config.cache.use_coordinates(resolve_profile(profile, window_size), profile['name'])
+    return profile
+
+
+def save_current_as_profile(screen, window_size=None, name=None):
+    """
+    Save the coordinates config is using now as the profile for screen.
+    With window_size and config.SCALE_COORDINATES the profile is stored in
+    relative mode. Returns the profile name.
+    """
+    name = name or profile_name_for(*screen)
+    mode = MODE_RELATIVE if window_size and config.SCALE_COORDINATES else MODE_ABSOLUTE
+    coords = {key: config.cache.get_coordinate(key) for key in config.DEFAULT_COORDINATES}
+    profiles.save(name, screen, coords, mode, window_size)
+    return name
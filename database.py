@@ -1,13 +1,23 @@
 import sqlite3
 import os
+import copy
+import json
+import threading
 
 DATABASE_FILE = "app_data.db"
 
+# Whether this SQLite build has FTS5; None until the first attempt to use it
+_fts5_available = None
+
 def initialize_database():
     """Initializes the database and creates all required tables."""
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
     
+    # Free pages are returned to the OS by incremental vacuum. This only takes
+    # effect on a new database; existing files are converted by enable_incremental_vacuum()
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    
     # Manual entries table for user-entered data
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS manual_entries (
@@ -62,6 +72,21 @@ def initialize_database():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    
+    # Generated schedules with typed date/time columns
+    create_appointment_tables(cursor)
+    
+    # Keyset pagination of manual entries walks this index newest-first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_manual_entries_created
+        ON manual_entries (created_at, id)
+    """)
+    
+    # Full-text index over manual entries
+    create_manual_entries_fts(cursor)
+    
+    # Named coordinate sets per screen size / DPI
+    create_coordinate_profile_tables(cursor)
 
     conn.commit()
     conn.close()
@@ -91,32 +116,135 @@ def save_manual_entry_to_db(patient_id, procedures, staff, appointment_date, app
     return entry_id
 
 
+def _insert_many(sql, rows):
+    """
+    Run an INSERT for many rows inside a single transaction.
+    Returns the list of new row ids in insertion order.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    try:
+        # BEGIN IMMEDIATE takes the write lock up front so the AUTOINCREMENT ids
+        # handed out by this batch are contiguous
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.executemany(sql, rows)
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    first_id = last_id - len(rows) + 1
+    return list(range(first_id, last_id + 1))
+
+
+def save_manual_entries_bulk(entries):
+    """Saves many manual entries in one transaction.
+    
+    Args:
+        entries: Iterable of dicts with keys patient_id, procedures, staff,
+                 appointment_date, appointment_time and optional notes
+    
+    Returns:
+        List of new entry ids, in the same order as entries
+    """
+    ensure_tables_exist()
+    rows = [
+        (e['patient_id'], e['procedures'], e['staff'],
+         e['appointment_date'], e['appointment_time'], e.get('notes', ""))
+        for e in entries
+    ]
+    return _insert_many("""
+        INSERT INTO manual_entries (patient_id, procedures, staff, appointment_date, appointment_time, notes)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def _manual_entry_from_row(row):
+    """Convert a manual_entries row (selected in table column order) to a dict."""
+    return {
+        'id': row[0],
+        'patient_id': row[1],
+        'procedures': row[2],
+        'staff': row[3],
+        'appointment_date': row[4],
+        'appointment_time': row[5],
+        'created_at': row[6],
+        'notes': row[7]
+    }
+
+
 def load_manual_entries_from_db():
-    """Loads all manual entries from the database."""
+    """Loads all manual entries from the database.
+    
+    Prefer load_manual_entries_page() in the GUI; this reads the whole table.
+    """
     ensure_tables_exist()
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT id, patient_id, procedures, staff, appointment_date, appointment_time, created_at, notes
         FROM manual_entries
-        ORDER BY created_at DESC
+        ORDER BY created_at DESC, id DESC
     """)
     rows = cursor.fetchall()
     conn.close()
     
-    entries = []
-    for row in rows:
-        entries.append({
-            'id': row[0],
-            'patient_id': row[1],
-            'procedures': row[2],
-            'staff': row[3],
-            'appointment_date': row[4],
-            'appointment_time': row[5],
-            'created_at': row[6],
-            'notes': row[7]
-        })
-    return entries
+    return [_manual_entry_from_row(row) for row in rows]
+
+
+def load_manual_entries_page(before=None, limit=200, since=None):
+    """
+    Loads one page of manual entries, newest first.
+    
+    Args:
+        before: Cursor (created_at, id) returned by the previous page, or None
+                for the newest entries
+        limit: Maximum number of entries in the page
+        since: Optional datetime or "YYYY-MM-DD HH:MM:SS" string; older entries
+               are not returned
+    
+    Returns:
+        (entries, next_cursor). next_cursor is None when there are no more entries.
+    """
+    conditions = []
+    params = []
+    if before is not None:
+        created_at, entry_id = before
+        conditions.append("(created_at < ? OR (created_at = ? AND id < ?))")
+        params.extend([created_at, created_at, entry_id])
+    if since is not None:
+        if not isinstance(since, str):
+            since = since.strftime("%Y-%m-%d %H:%M:%S")
+        conditions.append("created_at >= ?")
+        params.append(since)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    ensure_tables_exist()
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT id, patient_id, procedures, staff, appointment_date, appointment_time, created_at, notes
+        FROM manual_entries
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, params + [limit])
+    rows = cursor.fetchall()
+    conn.close()
+    
+    entries = [_manual_entry_from_row(row) for row in rows]
+    next_cursor = None
+    if len(entries) == limit:
+        last = entries[-1]
+        next_cursor = (last['created_at'], last['id'])
+    return entries, next_cursor
 
 
 def delete_manual_entry_from_db(entry_id):
@@ -128,35 +256,183 @@ def delete_manual_entry_from_db(entry_id):
     conn.close()
 
 
-def delete_old_manual_entries(days=30):
+def create_manual_entries_fts(cursor):
     """
-    Deletes manual entries older than the specified number of days based on created_at timestamp.
-    Default is 30 days.
-    Returns the number of deleted entries.
+    Create the FTS5 index over manual_entries and the triggers that keep it in sync.
+    The index is filled from existing rows the first time it is created.
+    Returns False if this SQLite build has no FTS5 (search then falls back to LIKE);
+    that is found out once per process and later calls return at once.
     """
-    from datetime import datetime, timedelta
+    global _fts5_available
+    if _fts5_available is False:
+        return False
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'manual_entries_fts'")
+    if cursor.fetchone():
+        _fts5_available = True
+        return True
+    
+    try:
+        # External-content table: the text lives in manual_entries only.
+        # remove_diacritics lets "hien" match "Hiền"
+        cursor.execute("""
+            CREATE VIRTUAL TABLE manual_entries_fts USING fts5(
+                patient_id, procedures, staff, notes,
+                content='manual_entries', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"FTS5 không khả dụng, tìm kiếm sẽ dùng LIKE: {e}")
+        _fts5_available = False
+        return False
+    _fts5_available = True
+    
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS manual_entries_fts_ai AFTER INSERT ON manual_entries BEGIN
+            INSERT INTO manual_entries_fts (rowid, patient_id, procedures, staff, notes)
+            VALUES (new.id, new.patient_id, new.procedures, new.staff, new.notes);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS manual_entries_fts_ad AFTER DELETE ON manual_entries BEGIN
+            INSERT INTO manual_entries_fts (manual_entries_fts, rowid, patient_id, procedures, staff, notes)
+            VALUES ('delete', old.id, old.patient_id, old.procedures, old.staff, old.notes);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS manual_entries_fts_au AFTER UPDATE ON manual_entries BEGIN
+            INSERT INTO manual_entries_fts (manual_entries_fts, rowid, patient_id, procedures, staff, notes)
+            VALUES ('delete', old.id, old.patient_id, old.procedures, old.staff, old.notes);
+            INSERT INTO manual_entries_fts (rowid, patient_id, procedures, staff, notes)
+            VALUES (new.id, new.patient_id, new.procedures, new.staff, new.notes);
+        END
+    """)
     
+    # Index the rows that existed before the FTS table
+    cursor.execute("INSERT INTO manual_entries_fts (manual_entries_fts) VALUES ('rebuild')")
+    return True
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    terms = []
+    for word in text.split():
+        word = word.replace('"', '""')
+        terms.append(f'"{word}"*')
+    return " ".join(terms)
+
+
+def search_entries(query, limit=50):
+    """
+    Search manual entries by patient id, procedures, staff and notes.
+    Every word in query must match (prefix match, accents ignored).
+    Returns entry dicts like load_manual_entries_from_db(), newest first.
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+    
+    ensure_tables_exist()
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT m.id, m.patient_id, m.procedures, m.staff, m.appointment_date,
+                   m.appointment_time, m.created_at, m.notes
+            FROM manual_entries_fts f
+            JOIN manual_entries m ON m.id = f.rowid
+            WHERE manual_entries_fts MATCH ?
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT ?
+        """, (_fts_query(query), limit))
+    except sqlite3.OperationalError:
+        # No FTS5 in this SQLite build: scan with LIKE instead
+        pattern = f"%{query}%"
+        cursor.execute("""
+            SELECT id, patient_id, procedures, staff, appointment_date,
+                   appointment_time, created_at, notes
+            FROM manual_entries
+            WHERE patient_id LIKE ? OR procedures LIKE ? OR staff LIKE ? OR notes LIKE ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (pattern, pattern, pattern, pattern, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [_manual_entry_from_row(row) for row in rows]
+
+
+def delete_old_manual_entries(days=30, batch_size=500):
+    """
+    Deletes manual entries older than the specified number of days based on created_at timestamp.
+    Default is 30 days. Rows are deleted in batches of batch_size, each in its own
+    short transaction, so other connections are never locked out for long.
+    Returns the number of deleted entries.
+    """
+    from datetime import datetime, timedelta
     
     # Calculate the cutoff datetime
     cutoff_datetime = datetime.now() - timedelta(days=days)
     cutoff_str = cutoff_datetime.strftime("%Y-%m-%d %H:%M:%S")
     
-    # Delete entries older than cutoff based on created_at
-    cursor.execute("""
-        DELETE FROM manual_entries 
-        WHERE created_at < ?
-    """, (cutoff_str,))
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
     
-    deleted_count = cursor.rowcount
+    deleted_count = 0
+    while True:
+        # Delete entries older than cutoff based on created_at
+        cursor.execute("""
+            DELETE FROM manual_entries
+            WHERE id IN (
+                SELECT id FROM manual_entries
+                WHERE created_at < ?
+                LIMIT ?
+            )
+        """, (cutoff_str, batch_size))
+        batch_deleted = cursor.rowcount
+        conn.commit()
+        
+        deleted_count += batch_deleted
+        if batch_deleted < batch_size:
+            break
     
-    conn.commit()
     conn.close()
     
     return deleted_count
 
 
+def enable_incremental_vacuum():
+    """
+    Switch the database file to auto_vacuum=INCREMENTAL if it is not already.
+    Converting an existing file needs a one-time full VACUUM.
+    Returns True if the file was converted.
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    try:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode == 2:  # 2 = INCREMENTAL
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+def incremental_vacuum(max_pages=200):
+    """
+    Return up to max_pages free pages to the OS.
+    Returns the number of free pages left in the file.
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    try:
+        # The pragma frees one page per step, so fetch to run it to completion
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+
+
 # ===== Staff Management Functions =====
 
 def initialize_default_staff():
@@ -395,112 +671,147 @@ def ensure_tables_exist():
         )
     """)
     
+    # Create appointments / appointment_steps tables if not exists
+    create_appointment_tables(cursor)
+    
+    # Create manual_entries indexes if not exists
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_manual_entries_created
+        ON manual_entries (created_at, id)
+    """)
+    create_manual_entries_fts(cursor)
+    
+    # Create coordinate profile tables if not exists
+    create_coordinate_profile_tables(cursor)
+    
     conn.commit()
     conn.close()
 
 
-def get_disabled_staff():
-    """Get list of disabled staff from database."""
-    ensure_tables_exist()
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT value FROM app_settings WHERE key = 'disabled_staff'")
-    row = cursor.fetchone()
-    conn.close()
+class SettingsStore:
+    """In-memory copy of the app_settings table.
     
-    if row:
-        import json
-        return json.loads(row[0])
-    return []
+    The whole table is read once on first use. Reads are served from memory and
+    writes go to the database and the cache together (write-through).
+    """
+    
+    def __init__(self):
+        self._values = None
+        self._decoded = {}
+        self._lock = threading.Lock()
+    
+    def _load(self):
+        """Load every setting from the database. Caller holds the lock."""
+        if self._values is not None:
+            return
+        ensure_tables_exist()
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        cursor.execute("SELECT key, value FROM app_settings")
+        self._values = dict(cursor.fetchall())
+        conn.close()
+        self._decoded = {}
+    
+    def get(self, key, default=None):
+        """Return the raw text value of a setting."""
+        with self._lock:
+            self._load()
+            return self._values.get(key, default)
+    
+    def get_bool(self, key, default=False):
+        """Return a setting stored as '1' / '0'."""
+        value = self.get(key)
+        if value is None:
+            return default
+        return value == '1'
+    
+    def get_json(self, key, default=None):
+        """Return a JSON setting. The value is decoded once and cached."""
+        with self._lock:
+            self._load()
+            if key not in self._values:
+                return copy.deepcopy(default)
+            if key not in self._decoded:
+                self._decoded[key] = json.loads(self._values[key])
+            # Callers may mutate the result, so never hand out the cached object
+            return copy.deepcopy(self._decoded[key])
+    
+    def set(self, key, value):
+        """Save a raw text value to the database and the cache."""
+        with self._lock:
+            conn = sqlite3.connect(DATABASE_FILE)
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO app_settings (key, value)
+                VALUES (?, ?)
+            """, (key, value))
+            conn.commit()
+            conn.close()
+            
+            if self._values is not None:
+                self._values[key] = value
+                self._decoded.pop(key, None)
+    
+    def set_bool(self, key, enabled):
+        self.set(key, '1' if enabled else '0')
+    
+    def set_json(self, key, value, ensure_ascii=True):
+        self.set(key, json.dumps(value, ensure_ascii=ensure_ascii))
+    
+    def invalidate(self):
+        """Drop the cache so the next read reloads the table (e.g. after a restore)."""
+        with self._lock:
+            self._values = None
+            self._decoded = {}
+
 
+# Shared settings cache used by the getters/setters below
+settings = SettingsStore()
+
+
+def get_disabled_staff():
+    """Get list of disabled staff from database."""
+    return settings.get_json('disabled_staff', [])
 
 
 def set_disabled_staff(disabled_list):
     """Save list of disabled staff to database."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    import json
-    value = json.dumps(disabled_list)
-    
-    cursor.execute("""
-        INSERT OR REPLACE INTO app_settings (key, value)
-        VALUES ('disabled_staff', ?)
-    """, (value,))
-    
-    conn.commit()
-    conn.close()
+    settings.set_json('disabled_staff', disabled_list)
 
 
 def get_window_title():
     """Get the target application window title."""
-    ensure_tables_exist()
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT value FROM app_settings WHERE key = 'window_title'")
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return row[0]
-    return "User: Trần Thị Thu Hiền"  # Default value
+    return settings.get('window_title', "User: Trần Thị Thu Hiền")  # Default value
 
 
 def set_window_title(title):
     """Save the target application window title."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT OR REPLACE INTO app_settings (key, value)
-        VALUES ('window_title', ?)
-    """, (title,))
-    
-    conn.commit()
-    conn.close()
+    settings.set('window_title', title)
 
 
 def get_arrow_mode_setting():
     """Get arrow mode setting (True/False)."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT value FROM app_settings WHERE key = 'arrow_mode'")
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return row[0] == '1'
-    return True
+    return settings.get_bool('arrow_mode', True)
+
 
 def set_arrow_mode_setting(enabled):
     """Save arrow mode setting."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    value = '1' if enabled else '0'
-    
-    cursor.execute("""
-        INSERT OR REPLACE INTO app_settings (key, value)
-        VALUES ('arrow_mode', ?)
-    """, (value,))
-    
-    conn.commit()
-    conn.close()
+    settings.set_bool('arrow_mode', enabled)
 
 
+def get_fill_backend_setting():
+    """Get how procedure fields are filled: 'pixel' (click and type) or 'uia'."""
+    return settings.get('fill_backend', 'pixel')
+
+
+def set_fill_backend_setting(backend):
+    """Save fill backend setting."""
+    settings.set('fill_backend', backend)
+
 
 def get_last_used_procedures():
     """Get the last used procedures from database."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT value FROM app_settings WHERE key = 'last_used_procedures'")
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        import json
-        return json.loads(row[0])
-    return []  # Return empty list if no previous procedures
+    return settings.get_json('last_used_procedures', [])  # Empty list if no previous procedures
 
 
 def set_last_used_procedures(procedures_list):
@@ -509,19 +820,7 @@ def set_last_used_procedures(procedures_list):
     Args:
         procedures_list: List of procedure names (e.g., ["điện", "thuỷ", "laser", "kim"])
     """
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    import json
-    value = json.dumps(procedures_list, ensure_ascii=False)
-    
-    cursor.execute("""
-        INSERT OR REPLACE INTO app_settings (key, value)
-        VALUES ('last_used_procedures', ?)
-    """, (value,))
-    
-    conn.commit()
-    conn.close()
+    settings.set_json('last_used_procedures', procedures_list, ensure_ascii=False)
 
 
 # ===== Doctor Leave Functions =====
@@ -542,6 +841,27 @@ def add_doctor_leave(staff_short_name, leave_date, session, reason=""):
     return leave_id
 
 
+def add_doctor_leaves_bulk(leaves):
+    """Add many doctor leave records in one transaction.
+    
+    Args:
+        leaves: Iterable of dicts with keys staff_short_name, leave_date,
+                session and optional reason
+    
+    Returns:
+        List of new leave ids, in the same order as leaves
+    """
+    ensure_tables_exist()
+    rows = [
+        (l['staff_short_name'], l['leave_date'], l['session'], l.get('reason', ""))
+        for l in leaves
+    ]
+    return _insert_many("""
+        INSERT INTO doctor_leaves (staff_short_name, leave_date, session, reason)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+
+
 def get_all_doctor_leaves():
     """Get all doctor leave records."""
     ensure_tables_exist()
@@ -680,6 +1000,27 @@ def add_weekly_leave(staff_short_name, day_of_week, session, reason=""):
     return leave_id
 
 
+def add_weekly_leaves_bulk(leaves):
+    """Add many weekly recurring leave records in one transaction.
+    
+    Args:
+        leaves: Iterable of dicts with keys staff_short_name, day_of_week,
+                session and optional reason
+    
+    Returns:
+        List of new leave ids, in the same order as leaves
+    """
+    ensure_tables_exist()
+    rows = [
+        (l['staff_short_name'], l['day_of_week'], l['session'], l.get('reason', ""))
+        for l in leaves
+    ]
+    return _insert_many("""
+        INSERT INTO weekly_leaves (staff_short_name, day_of_week, session, reason)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+
+
 def get_all_weekly_leaves():
     """Get all weekly leave records."""
     ensure_tables_exist()
@@ -728,6 +1069,239 @@ def get_weekly_leaves_for_staff(staff_short_name):
     return rows  # List of (day_of_week, session) tuples
 
 
+# ===== Appointments Functions =====
+# Generated schedules are stored normalized: one appointments row per visit and
+# one appointment_steps row per procedure. Dates are ISO (YYYY-MM-DD) and times
+# are integer minutes since midnight so ranges and ordering happen in SQL.
+
+def create_appointment_tables(cursor):
+    """Create the appointments / appointment_steps tables and their indexes."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id TEXT NOT NULL,
+            appointment_date TEXT NOT NULL,
+            start_minute INTEGER NOT NULL,
+            is_first INTEGER NOT NULL DEFAULT 0,
+            source TEXT NOT NULL DEFAULT 'auto_schedule',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS appointment_steps (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id INTEGER NOT NULL REFERENCES appointments(id) ON DELETE CASCADE,
+            step_index INTEGER NOT NULL,
+            procedure TEXT NOT NULL,
+            doctor TEXT NOT NULL,
+            staff TEXT NOT NULL,
+            appointment_date TEXT NOT NULL,
+            cd_minute INTEGER NOT NULL,
+            start_minute INTEGER NOT NULL,
+            end_minute INTEGER NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_appointments_date
+        ON appointments (appointment_date, start_minute)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_appointment_steps_date_staff
+        ON appointment_steps (appointment_date, staff)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_appointment_steps_appointment
+        ON appointment_steps (appointment_id, step_index)
+    """)
+
+
+def _to_iso_date(date_str):
+    """Convert DD-MM-YYYY (or an already ISO date) to YYYY-MM-DD."""
+    from datetime import datetime
+    
+    date_str = date_str.strip()
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%y", "%d/%m/%y"):
+        try:
+            return datetime.strptime(date_str, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {date_str}")
+
+
+def _from_iso_date(iso_date):
+    """Convert YYYY-MM-DD to the DD-MM-YYYY format used by the automation data."""
+    year, month, day = iso_date.split('-')
+    return f"{day}-{month}-{year}"
+
+
+def _split_datetime_field(value):
+    """Split 'DD-MM-YYYY{SPACE}HH:MM' into (iso_date, minutes)."""
+    date_part, time_part = value.replace('{SPACE}', ' ').strip().split(' ', 1)
+    hour, minute = time_part.strip().split(':')
+    return _to_iso_date(date_part), int(hour) * 60 + int(minute)
+
+
+def _format_datetime_field(iso_date, minutes):
+    """Build the 'DD-MM-YYYY{SPACE}HH:MM' string used by Tool from typed columns."""
+    return f"{_from_iso_date(iso_date)}{{SPACE}}{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def save_appointments(records, source="auto_schedule", replace_range=None):
+    """Persist automation records (read_data() format) in one transaction.
+    
+    Args:
+        records: List of records with id, isFirst, ngay and thu_thuats
+        source: Where the records came from (e.g. 'auto_schedule', 'csv')
+        replace_range: Optional (start_date, end_date); appointments from the same
+                       source in this range are deleted first, so saving a
+                       regenerated schedule replaces the old one
+    
+    Returns:
+        List of new appointment ids, in the same order as records
+    """
+    ensure_tables_exist()
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    appointment_ids = []
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        if replace_range:
+            start_date, end_date = replace_range
+            where = "WHERE source = ? AND appointment_date >= ? AND appointment_date <= ?"
+            params = (source, _to_iso_date(start_date), _to_iso_date(end_date))
+            cursor.execute(f"DELETE FROM appointment_steps WHERE appointment_id IN (SELECT id FROM appointments {where})", params)
+            cursor.execute(f"DELETE FROM appointments {where}", params)
+        step_rows = []
+        for record in records:
+            steps = []
+            for idx, tt in enumerate(record.get('thu_thuats', [])):
+                _cd_date, cd_minute = _split_datetime_field(tt['Ngay CD'])
+                step_date, start_minute = _split_datetime_field(tt['Ngay BD TH'])
+                _kq_date, end_minute = _split_datetime_field(tt['Ngay KQ'])
+                steps.append((idx, tt['Ten'], tt['BS CD'], tt['Nguoi Thuc Hien'],
+                              step_date, cd_minute, start_minute, end_minute))
+            
+            appointment_date = _to_iso_date(record['ngay'])
+            first_start = steps[0][6] if steps else 0
+            cursor.execute("""
+                INSERT INTO appointments (patient_id, appointment_date, start_minute, is_first, source)
+                VALUES (?, ?, ?, ?, ?)
+            """, (str(record['id']), appointment_date, first_start,
+                  1 if record.get('isFirst') else 0, source))
+            appointment_id = cursor.lastrowid
+            appointment_ids.append(appointment_id)
+            step_rows.extend((appointment_id,) + step for step in steps)
+        
+        cursor.executemany("""
+            INSERT INTO appointment_steps (appointment_id, step_index, procedure, doctor, staff,
+                                           appointment_date, cd_minute, start_minute, end_minute)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, step_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return appointment_ids
+
+
+def load_appointments(start_date=None, end_date=None, staff=None):
+    """Load stored appointments as automation records, in chronological order.
+    
+    Args:
+        start_date: Optional first date (DD-MM-YYYY or YYYY-MM-DD), inclusive
+        end_date: Optional last date (DD-MM-YYYY or YYYY-MM-DD), inclusive
+        staff: Optional full staff name; only appointments with a step done by
+               this person are returned
+    
+    Returns:
+        List of records in the same format as read_data()
+    """
+    ensure_tables_exist()
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append("a.appointment_date >= ?")
+        params.append(_to_iso_date(start_date))
+    if end_date:
+        conditions.append("a.appointment_date <= ?")
+        params.append(_to_iso_date(end_date))
+    if staff:
+        # Filter on the steps table too so the (appointment_date, staff) index is used
+        step_conditions = ["staff = ?"] + [c.replace("a.", "") for c in conditions]
+        conditions.append(
+            "a.id IN (SELECT appointment_id FROM appointment_steps WHERE "
+            + " AND ".join(step_conditions) + ")"
+        )
+        params = params + [staff] + params
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT a.id, a.patient_id, a.appointment_date, a.is_first,
+               s.procedure, s.doctor, s.staff, s.appointment_date,
+               s.cd_minute, s.start_minute, s.end_minute
+        FROM appointments a
+        JOIN appointment_steps s ON s.appointment_id = a.id
+        {where}
+        ORDER BY a.appointment_date, a.start_minute, a.id, s.step_index
+    """, params)
+    rows = cursor.fetchall()
+    conn.close()
+    
+    records = []
+    current_id = None
+    for row in rows:
+        (appointment_id, patient_id, appointment_date, is_first,
+         procedure, doctor, staff_name, step_date, cd_minute, start_minute, end_minute) = row
+        if appointment_id != current_id:
+            current_id = appointment_id
+            records.append({
+                'id': patient_id,
+                'isFirst': bool(is_first),
+                'ngay': _from_iso_date(appointment_date),
+                'thu_thuats': []
+            })
+        records[-1]['thu_thuats'].append({
+            'Ten': procedure,
+            'BS CD': doctor,
+            'Ngay CD': _format_datetime_field(step_date, cd_minute),
+            'Ngay BD TH': _format_datetime_field(step_date, start_minute),
+            'Ngay KQ': _format_datetime_field(step_date, end_minute),
+            'Nguoi Thuc Hien': staff_name
+        })
+    return records
+
+
+def delete_appointments(start_date=None, end_date=None):
+    """Delete stored appointments (and their steps) in a date range.
+    Returns the number of deleted appointments."""
+    ensure_tables_exist()
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append("appointment_date >= ?")
+        params.append(_to_iso_date(start_date))
+    if end_date:
+        conditions.append("appointment_date <= ?")
+        params.append(_to_iso_date(end_date))
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM appointment_steps WHERE appointment_id IN (SELECT id FROM appointments {where})", params)
+    cursor.execute(f"DELETE FROM appointments {where}", params)
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
 # ===== Coordinates Management Functions =====
 
 def get_default_coordinates():
@@ -851,6 +1425,135 @@ def restore_default_coordinates():
     conn.close()
 
 
+
+# ===== Coordinate Profiles =====
+
+def create_coordinate_profile_tables(cursor):
+    """Create coordinate_profiles / coordinate_profile_points tables.
+    
+    A profile is a named set of coordinates captured on a given screen size and
+    DPI. In 'relative' mode the points are offsets inside a reference window of
+    ref_width x ref_height and are scaled to the current window size.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS coordinate_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            screen_width INTEGER NOT NULL,
+            screen_height INTEGER NOT NULL,
+            dpi INTEGER NOT NULL,
+            mode TEXT NOT NULL DEFAULT 'absolute',
+            ref_width INTEGER,
+            ref_height INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS coordinate_profile_points (
+            profile_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            x INTEGER NOT NULL,
+            y INTEGER NOT NULL,
+            PRIMARY KEY (profile_id, name),
+            FOREIGN KEY (profile_id) REFERENCES coordinate_profiles(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def get_all_coordinate_profiles():
+    """
+    Get every coordinate profile with its points.
+    Returns dict: name -> {'id', 'name', 'screen_width', 'screen_height', 'dpi',
+    'mode', 'ref_width', 'ref_height', 'coords': {point_name: (x, y)}}
+    """
+    ensure_tables_exist()
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, name, screen_width, screen_height, dpi, mode, ref_width, ref_height
+        FROM coordinate_profiles
+        ORDER BY name
+    """)
+    profiles = {}
+    by_id = {}
+    for row in cursor.fetchall():
+        profile = {
+            'id': row[0],
+            'name': row[1],
+            'screen_width': row[2],
+            'screen_height': row[3],
+            'dpi': row[4],
+            'mode': row[5],
+            'ref_width': row[6],
+            'ref_height': row[7],
+            'coords': {}
+        }
+        profiles[profile['name']] = profile
+        by_id[profile['id']] = profile
+    
+    cursor.execute("SELECT profile_id, name, x, y FROM coordinate_profile_points")
+    for profile_id, name, x, y in cursor.fetchall():
+        if profile_id in by_id:
+            by_id[profile_id]['coords'][name] = (x, y)
+    
+    conn.close()
+    return profiles
+
+
+def save_coordinate_profile(name, screen_width, screen_height, dpi, coords,
+                            mode="absolute", ref_width=None, ref_height=None):
+    """
+    Create or replace a coordinate profile.
+    coords format: {point_name: (x, y)}. Returns the profile id.
+    """
+    ensure_tables_exist()
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT id FROM coordinate_profiles WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        if row:
+            profile_id = row[0]
+            cursor.execute("""
+                UPDATE coordinate_profiles
+                SET screen_width = ?, screen_height = ?, dpi = ?, mode = ?, ref_width = ?, ref_height = ?
+                WHERE id = ?
+            """, (screen_width, screen_height, dpi, mode, ref_width, ref_height, profile_id))
+            cursor.execute("DELETE FROM coordinate_profile_points WHERE profile_id = ?", (profile_id,))
+        else:
+            cursor.execute("""
+                INSERT INTO coordinate_profiles (name, screen_width, screen_height, dpi, mode, ref_width, ref_height)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (name, screen_width, screen_height, dpi, mode, ref_width, ref_height))
+            profile_id = cursor.lastrowid
+        
+        cursor.executemany("""
+            INSERT INTO coordinate_profile_points (profile_id, name, x, y)
+            VALUES (?, ?, ?, ?)
+        """, [(profile_id, point, x, y) for point, (x, y) in coords.items()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return profile_id
+
+
+def delete_coordinate_profile(name):
+    """Delete a coordinate profile and its points."""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM coordinate_profiles WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    if row:
+        cursor.execute("DELETE FROM coordinate_profile_points WHERE profile_id = ?", (row[0],))
+        cursor.execute("DELETE FROM coordinate_profiles WHERE id = ?", (row[0],))
+        conn.commit()
+    conn.close()
+
+
 if __name__ == "__main__":
     # Initialize database
     initialize_database()
@@ -0,0 +1,191 @@
+"""
+Background database executor for the Tk GUI.
+
+Database calls run off the Tk main thread: a single writer thread keeps all
+writes serialized, and a separate reader thread serves queries. Long jobs that
+open their own connections (backups) get a third thread so they never hold up
+the queries the GUI waits for. Results (or
+errors) are handed back to the main thread through root.after so callbacks can
+touch widgets safely.
+"""
+
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DatabaseExecutor:
+    """Runs database functions on a writer thread, a reader thread and a background thread."""
+
+    def __init__(self, root):
+        self.root = root
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-reader")
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-background")
+        self._closed = False
+
+    def submit_read(self, func, *args, callback=None, errback=None, **kwargs):
+        """Run func(*args, **kwargs) on the reader thread. Returns a Future."""
+        return self._submit(self._reader, func, args, kwargs, callback, errback)
+
+    def submit_write(self, func, *args, callback=None, errback=None, **kwargs):
+        """Run func(*args, **kwargs) on the writer thread. Returns a Future."""
+        return self._submit(self._writer, func, args, kwargs, callback, errback)
+
+    def submit_background(self, func, *args, callback=None, errback=None, **kwargs):
+        """Run func(*args, **kwargs) on the background thread. Returns a Future."""
+        return self._submit(self._background, func, args, kwargs, callback, errback)
+
+    def _submit(self, pool, func, args, kwargs, callback, errback):
+        future = pool.submit(func, *args, **kwargs)
+        future.add_done_callback(lambda f: self._dispatch(f, func, callback, errback))
+        return future
+
+    def _dispatch(self, future, func, callback, errback):
+        """Forward the outcome of a finished job to the Tk main thread."""
+        error = future.exception()
+        if error is not None:
+            if errback:
+                self._call_on_main(errback, error)
+            else:
+                print(f"Database job {getattr(func, '__name__', func)} failed: {error}")
+            return
+        if callback:
+            self._call_on_main(callback, future.result())
+
+    def _call_on_main(self, func, arg):
+        if self._closed:
+            return
+        try:
+            self.root.after(0, lambda: func(arg))
+        except (RuntimeError, tk.TclError):
+            # Root window already destroyed
+            pass
+
+    def shutdown(self, wait=False):
+        """Stop accepting jobs. Pending writes still finish when wait is True."""
+        self._closed = True
+        self._reader.shutdown(wait=wait)
+        self._background.shutdown(wait=wait)
+        self._writer.shutdown(wait=wait)
+
+
+# Shared executor, created by the main window at startup
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def start_executor(root):
+    """Create the shared executor bound to the Tk root window."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = DatabaseExecutor(root)
+        return _executor
+
+
+def get_executor():
+    """Return the shared executor, or None if it has not been started."""
+    return _executor
+
+
+def stop_executor(wait=True):
+    """Shut down the shared executor (call on application exit)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def _run_now(func, args, kwargs, callback, errback):
+    """Fallback used when no executor is running: call func synchronously."""
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        if errback:
+            errback(e)
+            return None
+        raise
+    if callback:
+        callback(result)
+    return result
+
+
+def run_read(func, *args, callback=None, errback=None, **kwargs):
+    """Run a read-only database call in the background when possible."""
+    if _executor is None:
+        return _run_now(func, args, kwargs, callback, errback)
+    return _executor.submit_read(func, *args, callback=callback, errback=errback, **kwargs)
+
+
+def run_write(func, *args, callback=None, errback=None, **kwargs):
+    """Run a database write on the writer thread when possible."""
+    if _executor is None:
+        return _run_now(func, args, kwargs, callback, errback)
+    return _executor.submit_write(func, *args, callback=callback, errback=errback, **kwargs)
+
+
+def run_background(func, *args, callback=None, errback=None, **kwargs):
+    """Run a long job with its own connection (e.g. a backup) on the background thread."""
+    if _executor is None:
+        return _run_now(func, args, kwargs, callback, errback)
+    return _executor.submit_background(func, *args, callback=callback, errback=errback, **kwargs)
+
+
+class PeriodicJob:
+    """Runs a database job on a Tk timer: first after first_delay_ms, then
+    interval_ms after each run finishes. Runs never overlap.
+
+    Subclasses implement submit(callback, errback), which hands the job to
+    run_read, run_write or run_background, and report(result) to log what it did.
+    """
+
+    name = "Periodic job"
+
+    def __init__(self, root, interval_ms, first_delay_ms, log=print):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.first_delay_ms = first_delay_ms
+        self.log = log
+        self._after_id = None
+        self._running = False
+
+    def start(self):
+        """Schedule the first run once the GUI has settled."""
+        self._schedule(self.first_delay_ms)
+
+    def stop(self):
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def _schedule(self, delay_ms):
+        # after_idle so the job is only queued when Tk has nothing else to do
+        self._after_id = self.root.after(delay_ms, lambda: self.root.after_idle(self._run))
+
+    def _run(self):
+        self._after_id = None
+        if self._running:
+            return
+        self._running = True
+        self.submit(callback=self._on_done, errback=self._on_error)
+
+    def submit(self, callback, errback):
+        raise NotImplementedError
+
+    def report(self, result):
+        pass
+
+    def _on_done(self, result):
+        self._running = False
+        self.report(result)
+        self._schedule(self.interval_ms)
+
+    def _on_error(self, error):
+        self._running = False
+        self.log(f"✗ {self.name} failed: {error}")
+        self._schedule(self.interval_ms)
@@ -1,14 +1,17 @@
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from config import bs_mapper, bs_mapper_new, thu_thuat_ability_mapper, thu_thuat_dur_mapper, map_ys_bs, staff_p1_p3, staff_p2
+import config
+from config import bs_mapper, bs_mapper_new, thu_thuat_ability_mapper, thu_thuat_dur_mapper, thu_thuat_label_mapper
 try:
     from pywinauto.uia_element_info import UIAElementInfo
 except:
     pass
-import pytesseract
+import ocr_service
+from ocr_preprocess import preprocess_for_ocr
 import cv2
 import re
+import unicodedata
 
 # -----------------------------
 # Helpers chung
@@ -67,7 +70,8 @@ def extract_text(x, y):
     screenshot = pyautogui.screenshot(region=region)
     img = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
 
-    text = pytesseract.image_to_string(img, lang='vie')
+    processed = preprocess_for_ocr(img)
+    text = ocr_service.image_to_string(processed) if processed is not None else ""
 
     if text:
         return remove_special_chars(text.strip().replace("thuỷ", "thủy"))
@@ -215,7 +219,7 @@ def read_data(source='data.csv') -> list:
 
                 # Validate staff names globally first
                 for n in nguoi:
-                    if n.lower() not in map_ys_bs:
+                    if n.lower() not in config.map_ys_bs:
                          raise ValueError(f"Lỗi ID {final_data['id']}: Tên nhân viên '{n}' sai hoặc thiếu dấu gạch ngang (-).")
 
                 if thu_thuat_ability_mapper[tt] == "bs":
@@ -227,11 +231,11 @@ def read_data(source='data.csv') -> list:
                 # Strict validation based on position
                 staff_key = nguoi[idx_ng].lower()
                 if idx_ng == 1:
-                    if staff_key not in staff_p2:
-                        raise ValueError(f"Lỗi ID {final_data['id']}: Nhân viên '{map_ys_bs[staff_key]}' (vị trí 2) không có trong danh sách Group 2.")
+                    if staff_key not in config.staff_p2:
+                        raise ValueError(f"Lỗi ID {final_data['id']}: Nhân viên '{config.map_ys_bs[staff_key]}' (vị trí 2) không có trong danh sách Group 2.")
                 else:
-                    if staff_key not in staff_p1_p3:
-                        raise ValueError(f"Lỗi ID {final_data['id']}: Nhân viên '{map_ys_bs[staff_key]}' (vị trí {idx_ng+1}) không có trong danh sách Group 1.")
+                    if staff_key not in config.staff_p1_p3:
+                        raise ValueError(f"Lỗi ID {final_data['id']}: Nhân viên '{config.map_ys_bs[staff_key]}' (vị trí {idx_ng+1}) không có trong danh sách Group 1.")
 
                 # Select bs_mapper based on appointment year
                 current_bs_mapper = get_bs_mapper_by_year(ngay_CĐ)
@@ -244,7 +248,7 @@ def read_data(source='data.csv') -> list:
                 except ValueError as e:
                      raise ValueError(f"Lỗi ID {final_data['id']}: {e}")
 
-                obj["Nguoi Thuc Hien"] = map_ys_bs[staff_key]
+                obj["Nguoi Thuc Hien"] = config.map_ys_bs[staff_key]
 
                 final_data["thu_thuats"].append(obj)
 
@@ -252,12 +256,124 @@ def read_data(source='data.csv') -> list:
 
     return list_data
 
+def fold_text(text: str):
+    """
+    Lowercase and drop Vietnamese diacritics ('Thuỷ' -> 'thuy').
+    Text is composed (NFC) first, so decomposed input folds the same way, and the
+    result has the same length as the composed text: match positions carry over.
+    """
+    folded = []
+    for ch in unicodedata.normalize('NFC', text):
+        base = ''.join(c for c in unicodedata.normalize('NFD', ch.lower())
+                       if not unicodedata.combining(c))
+        folded.append('d' if base == 'đ' else base)
+    return ''.join(folded)
+
+
+def edit_distance(a: str, b: str, limit: int):
+    """Levenshtein distance of a and b, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class ProcedureMatcher:
+    """
+    Finds the procedure named in an OCR'd service row.
+
+    All names are folded (no case, no diacritics) and compiled into one regex
+    alternation, longest first, so a single search finds the leftmost name.
+    Rows where no name appears are compared, a few words at a time, with the
+    full service labels ('dien cham'), allowing one typo per CHARS_PER_TYPO
+    characters. A name alone is too short for that: one typo away from it is
+    usually another Vietnamese word ('điều', 'giảm', 'cấu').
+    """
+
+    # Label characters per tolerated OCR typo
+    CHARS_PER_TYPO = 8
+    EXACT_SCORE = 1.0
+    FOLDED_SCORE = 0.9
+    FUZZY_SCORE = 0.7
+    # Matches scoring below this are not trusted
+    MIN_SCORE = 0.6
+
+    def __init__(self, names, labels=None):
+        """labels maps a name to its full service label, for the typo-tolerant match."""
+        self.names = list(names)
+        # folded spelling -> procedure name ('thuy' covers both 'thủy' and 'thuỷ')
+        self.by_folded = {}
+        for name in self.names:
+            self.by_folded.setdefault(fold_text(name), name)
+        alternatives = sorted(self.by_folded, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(a) for a in alternatives))
+        self.word_pattern = re.compile(r'\w+')
+        # (folded label words, typos allowed, procedure name)
+        self.labels = []
+        for name, label in (labels or {}).items():
+            folded = fold_text(label)
+            self.labels.append((folded.split(), len(folded) // self.CHARS_PER_TYPO, name))
+
+    def match(self, text: str):
+        """Return (procedure name, score in 0..1), or (None, 0.0)."""
+        if not text:
+            return None, 0.0
+        if text in self.names:
+            return text, self.EXACT_SCORE
+
+        lowered = unicodedata.normalize('NFC', text).lower()
+        found = self.pattern.search(fold_text(lowered))
+        if found is not None:
+            name = self.by_folded[found.group()]
+            if lowered[found.start():found.end()] == name:
+                return name, self.EXACT_SCORE
+            return name, self.FOLDED_SCORE
+        return self._fuzzy_match(lowered)
+
+    def _fuzzy_match(self, lowered: str):
+        """Closest label within its typo allowance, compared with runs of as many words."""
+        words = self.word_pattern.findall(fold_text(lowered))
+        best_name, best_distance = None, None
+        ambiguous = False
+        for label_words, max_typos, name in self.labels:
+            if max_typos == 0:
+                continue
+            label = ' '.join(label_words)
+            size = len(label_words)
+            for start in range(len(words) - size + 1):
+                distance = edit_distance(' '.join(words[start:start + size]), label, max_typos)
+                if distance > max_typos:
+                    continue
+                if best_distance is None or distance < best_distance:
+                    best_name, best_distance, ambiguous = name, distance, False
+                elif distance == best_distance and name != best_name:
+                    ambiguous = True
+        # Two names equally close: better to report nothing than guess
+        if best_name is None or ambiguous:
+            return None, 0.0
+        return best_name, self.FUZZY_SCORE
+
+
+procedure_matcher = ProcedureMatcher(thu_thuat_dur_mapper, thu_thuat_label_mapper)
+
+
+def match_procedure(text: str):
+    """(procedure name, score) for a service row text, (None, 0.0) if none."""
+    return procedure_matcher.match(text)
+
+
 def convert_info_from_text(text:str):
-    for i in thu_thuat_dur_mapper.keys():
-        if i.lower() in text.strip().lower():
-            return i, thu_thuat_dur_mapper[i], thu_thuat_ability_mapper[i]
-    
-    return None, None, None
+    name, score = procedure_matcher.match(text)
+    if name is None or score < procedure_matcher.MIN_SCORE:
+        return None, None, None
+    return name, thu_thuat_dur_mapper[name], thu_thuat_ability_mapper[name]
 
 
 # -----------------------------
@@ -287,7 +403,7 @@ def create_data_from_manual_input(patient_id, procedures_list, staff_list, appoi
     
     # Validate staff
     for staff in staff_list:
-        if staff.lower() not in map_ys_bs:
+        if staff.lower() not in config.map_ys_bs:
             raise ValueError(f"Unknown staff member: {staff}")
     
     # Parse date and time
@@ -339,7 +455,7 @@ def create_data_from_manual_input(patient_id, procedures_list, staff_list, appoi
         obj["Ngay CD"] = format_datetime_data(appointment_date, gio_CD.strftime("%H:%M")).replace(" ", "{SPACE}")
         obj["Ngay BD TH"] = format_datetime_data(appointment_date, gio_dau.strftime("%H:%M")).replace(" ", "{SPACE}")
         obj["Ngay KQ"] = format_datetime_data(appointment_date, gio_cuoi.strftime("%H:%M")).replace(" ", "{SPACE}")
-        obj["Nguoi Thuc Hien"] = map_ys_bs[staff_list[idx_ng].lower()]
+        obj["Nguoi Thuc Hien"] = config.map_ys_bs[staff_list[idx_ng].lower()]
         
         thu_thuats.append(obj)
     
@@ -377,6 +493,126 @@ def load_manual_data_from_json(filename="manual_data.json"):
         raise Exception(f"Failed to load manual data: {e}")
 
 
+def manual_data_from_entries(entries):
+    """
+    Rebuild automation data from manual_entries rows (load_manual_entries_from_db).
+    Entries that no longer convert (unknown procedure or staff) are skipped.
+    """
+    manual_data = []
+    for entry in reversed(entries):
+        try:
+            manual_data.append(create_data_from_manual_input(
+                entry['patient_id'],
+                [p for p in (entry['procedures'] or "").split("-") if p],
+                [s for s in (entry['staff'] or "").split("-") if s],
+                entry['appointment_date'],
+                entry['appointment_time'],
+            ))
+        except (ValueError, KeyError, IndexError) as e:
+            print(f"Bỏ qua bản ghi nhập tay {entry['id']}: {e}")
+    return manual_data
+
+
+def read_manual_entries_csv(filename):
+    """
+    Read manual entries from a CSV written by export_manual_entries.py:
+    'PatientID;proc1-proc2;' followed by one 'HH:MM;staff1-staff2;DD-MM-YY' line
+    per appointment. Returns (entries for save_manual_entries_bulk, errors).
+    """
+    import csv
+
+    entries = []
+    errors = []
+    patient_id = procedures = None
+    with open(filename, 'r', encoding='utf-8-sig', newline='') as f:
+        for line_no, row in enumerate(csv.reader(f, delimiter=';'), start=1):
+            row = [cell.strip() for cell in row]
+            if not any(row):
+                continue
+            if not re.fullmatch(r"\d{1,2}:\d{2}", row[0]):
+                # Block header: patient ID and procedures
+                patient_id = row[0]
+                procedures = row[1] if len(row) > 1 else ""
+                continue
+            if patient_id is None or len(row) < 3:
+                errors.append(f"Dòng {line_no}: thiếu Patient ID hoặc ngày")
+                continue
+            try:
+                appointment_date = datetime.strptime(row[2], "%d-%m-%y")
+            except ValueError:
+                try:
+                    appointment_date = datetime.strptime(row[2], "%d-%m-%Y")
+                except ValueError:
+                    errors.append(f"Dòng {line_no}: ngày không hợp lệ '{row[2]}'")
+                    continue
+            hour, minute = row[0].split(":")
+            entries.append({
+                'patient_id': patient_id,
+                'procedures': procedures,
+                'staff': row[1].lower(),
+                'appointment_date': appointment_date.strftime("%d-%m-%Y"),
+                'appointment_time': f"{int(hour):02d}:{minute}",
+            })
+    return entries, errors
+
+
+# Leave roster sessions (database value for each accepted spelling)
+LEAVE_SESSIONS = {
+    "morning": "morning", "sáng": "morning",
+    "afternoon": "afternoon", "chiều": "afternoon",
+    "full_day": "full_day", "cả ngày": "full_day",
+}
+WEEKDAY_NAMES = ["thứ 2", "thứ 3", "thứ 4", "thứ 5", "thứ 6", "thứ 7", "chủ nhật"]
+
+
+def read_leave_roster(filename):
+    """
+    Read a leave roster CSV, one 'staff;day;session;reason' line per leave.
+    staff is the short name (or full name) from config.map_ys_bs; day is a date
+    DD-MM-YYYY, or a weekday 'Thứ 2'..'Chủ Nhật' for a weekly leave; session is
+    Sáng/Chiều/Cả ngày (or morning/afternoon/full_day).
+    Returns (leaves, weekly_leaves, errors) for add_doctor_leaves_bulk and
+    add_weekly_leaves_bulk.
+    """
+    import csv
+
+    by_full_name = {v.lower(): k for k, v in config.map_ys_bs.items()}
+    leaves = []
+    weekly_leaves = []
+    errors = []
+    with open(filename, 'r', encoding='utf-8-sig', newline='') as f:
+        for line_no, row in enumerate(csv.reader(f, delimiter=';'), start=1):
+            row = [cell.strip() for cell in row]
+            if not any(row) or row[0].startswith('#'):
+                continue
+            if len(row) < 3:
+                errors.append(f"Dòng {line_no}: cần nhân viên;ngày;buổi")
+                continue
+            staff = row[0].lower()
+            staff = staff if staff in config.map_ys_bs else by_full_name.get(staff)
+            if staff is None:
+                errors.append(f"Dòng {line_no}: không rõ nhân viên '{row[0]}'")
+                continue
+            session = LEAVE_SESSIONS.get(row[2].lower())
+            if session is None:
+                errors.append(f"Dòng {line_no}: không rõ buổi '{row[2]}'")
+                continue
+            reason = row[3] if len(row) > 3 else ""
+            day = row[1].lower()
+            if day in WEEKDAY_NAMES:
+                weekly_leaves.append({'staff_short_name': staff, 'day_of_week': WEEKDAY_NAMES.index(day),
+                                      'session': session, 'reason': reason})
+                continue
+            try:
+                leave_date = datetime.strptime(row[1], "%d-%m-%Y").strftime("%Y-%m-%d")
+            except ValueError:
+                errors.append(f"Dòng {line_no}: ngày không hợp lệ '{row[1]}'")
+                continue
+            leaves.append({'staff_short_name': staff, 'leave_date': leave_date,
+                           'session': session, 'reason': reason})
+    return leaves, weekly_leaves, errors
+
+
 def merge_csv_and_manual_data(csv_data, manual_data):
     """
     Merge CSV and manual data into a single list.
@@ -469,7 +705,7 @@ def export_data_to_csv(data_list, filename):
                             
                             # Full to short
                             staff_short = None
-                            for short, full in map_ys_bs.items():
+                            for short, full in config.map_ys_bs.items():
                                 if full == staff_name:
                                     staff_short = short
                                     break
@@ -527,7 +763,7 @@ def validate_all_data(all_data):
     schedules = defaultdict(list)
     
     # Reverse map for full name -> short name lookup
-    full_to_short = {v: k for k, v in map_ys_bs.items()}
+    full_to_short = {v: k for k, v in config.map_ys_bs.items()}
     
     for record in all_data:
         patient_id = record.get('id', 'Unknown')
@@ -555,7 +791,7 @@ def validate_all_data(all_data):
             # Most staff are mutually exclusive. If a doctor does a nurse job, they probably shouldn't overlap either?
             # Let's stick to: If name in staff_p1_p3, check conflict.
             
-            if staff_short in staff_p1_p3:
+            if staff_short in config.staff_p1_p3:
                 try:
                     start_dt = datetime.strptime(start_str, "%d-%m-%Y %H:%M")
                     end_dt = datetime.strptime(end_str, "%d-%m-%Y %H:%M")
@@ -574,7 +810,7 @@ def validate_all_data(all_data):
         # Sort by start time
         slots.sort(key=lambda x: x[0])
         
-        staff_full = map_ys_bs.get(staff_short, staff_short)
+        staff_full = config.map_ys_bs.get(staff_short, staff_short)
         
         for i in range(len(slots) - 1):
             current_slot = slots[i]
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+Headless stand-in for the HIS window, for end-to-end automation benchmarks.
+
+SimulatedHIS keeps the state Tool works on: the text fields at the configured
+coordinates, the patient search, a service grid with one row per procedure,
+the BSCD/CCHN suggestion lists and the saved procedure records. It implements
+the input backend methods (see input_backend.py), so Tool runs against it
+unchanged, and draws the grid rows into the screenshots it returns, so the
+OCR path runs too. Optional latencies make reload and suggestions slow like
+the real server.
+
+After a run, check() compares the saved records with the input data.
+
+Runs use a temporary copy of app_data.db (see use_temp_database), so the
+database the GUI works with is never opened or migrated.
+
+Example:
+  python his_simulator.py --patients 50 --arrow
+  python his_simulator.py --csv data.csv --reload-latency 80 --min-ppm 20
+"""
+
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+import database
+from handle_data import create_data_from_manual_input, fold_text, read_data
+from action_plan import PlanExecutor, validate_batch
+from input_backend import RecordingInput
+from ocr_cache import get_cache
+from tool import Tool, digits, patient_steps
+from tracing import tracer
+from waits import Waiter
+
+# Simulated screen / window size (the default coordinates are for 1920x1080)
+WINDOW_SIZE = (1920, 1080)
+# Size of one service grid row
+ROW_WIDTH = 300
+ROW_HEIGHT = 18
+# A click within this many pixels of a configured point hits it
+HIT_RADIUS = 12
+# Size of the suggestion list entry drawn at *_NGUOI_DAU_TIEN
+SUGGESTION_SIZE = (220, 18)
+
+# Text shown in the service grid for each procedure (cv2 can only draw ASCII)
+DISPLAY_NAMES = {name: fold_text(label).capitalize()
+                 for name, label in config.thu_thuat_label_mapper.items()}
+
+TEXT_FIELDS = ('ID_BOX', 'NGAY_BAT_DAU', 'NGAY_KET_THUC', 'NGAY_CD', 'NGAY_BDTH', 'NGAY_KQ')
+LOOKUP_FIELDS = {'BSCD': 'BSCD_NGUOI_DAU_TIEN', 'CCHN': 'CCHN_NGUOI_DAU_TIEN'}
+BUTTONS = ('CHO_THUC_HIEN', 'DA_THUC_HIEN', 'RELOAD', 'PATIENT_ROW', 'SUA', 'LUU', 'TIEP')
+DETAIL_FIELDS = ('BSCD', 'NGAY_CD', 'NGAY_BDTH', 'NGAY_KQ', 'CCHN')
+
+# One send_keys token: optional modifiers, then {NAME} / {NAME n} or one character
+KEY_TOKEN = re.compile(r"([\^+%]*)(\{[^}]+\}|.)", re.S)
+
+
+def use_temp_database(source=None):
+    """
+    Point database.DATABASE_FILE at a temporary copy of source (default: the
+    current database file, if it exists) and return the new path. Call it before
+    anything reads config. The copy is removed when the process exits.
+    """
+    source = source or database.DATABASE_FILE
+    directory = tempfile.mkdtemp(prefix="his_simulator_")
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    path = os.path.join(directory, "app_data.db")
+    if os.path.exists(source):
+        shutil.copyfile(source, path)
+    database.DATABASE_FILE = path
+    return path
+
+
+class Rect:
+    """The parts of a pywinauto rectangle that Tool uses."""
+
+    def __init__(self, left, top, right, bottom):
+        self.left, self.top, self.right, self.bottom = left, top, right, bottom
+
+    def width(self):
+        return self.right - self.left
+
+    def height(self):
+        return self.bottom - self.top
+
+
+class SimulatedWindow:
+    """Stands in for the pywinauto dialog passed to Tool and Waiter."""
+
+    def __init__(self, his):
+        self.his = his
+
+    def rectangle(self):
+        left, top = self.his.origin
+        width, height = WINDOW_SIZE
+        return Rect(left, top, left + width, top + height)
+
+    def wrapper_object(self):
+        return self
+
+    def is_visible(self):
+        return True
+
+    def is_enabled(self):
+        return time.perf_counter() >= self.his.busy_until
+
+    def get_show_state(self):
+        return 1
+
+    def set_focus(self):
+        pass
+
+    def restore(self):
+        pass
+
+
+class SimulatedHIS:
+    """Fake HIS screen driven through the input backend interface."""
+
+    def __init__(self, patients, origin=(0, 0), input_latency=0.0, reload_latency=0.0,
+                 suggestion_latency=0.0):
+        """
+        Args:
+            patients: Patient records as produced by read_data()
+            origin: Screen position of the window's top-left corner
+            input_latency: Seconds each click / key sequence takes
+            reload_latency: Seconds the window is disabled after RELOAD and TIEP
+            suggestion_latency: Seconds before a suggestion list appears
+        """
+        self.origin = origin
+        self.input_latency = input_latency
+        self.reload_latency = reload_latency
+        self.suggestion_latency = suggestion_latency
+        self.window = SimulatedWindow(self)
+        self._lock = threading.Lock()
+        self._tiles = {}
+
+        # (patient id, date digits) -> procedures still listed in the grid
+        self.rows = {}
+        for data in patients:
+            key = (str(data["id"]), digits(data["ngay"]))
+            self.rows[key] = [tt["Ten"] for tt in data["thu_thuats"]]
+
+        self.text = {name: "" for name in TEXT_FIELDS + DETAIL_FIELDS}
+        self.focus = None
+        self.select_all = False
+        self.clipboard = ""
+        self.tab = None
+        self.found = None
+        self.grid = []
+        self.selected_row = None
+        self.editing = False
+        # (field, text, time the list appears)
+        self.suggestion = None
+        self.busy_until = 0.0
+
+        self.records = []
+        self.problems = []
+
+    # ===== Layout =====
+
+    def _point(self, name):
+        x, y = getattr(config, name)
+        return self.origin[0] + x, self.origin[1] + y
+
+    def _row_rect(self, index):
+        x, y = self._point_of_row(index)
+        return (x - ROW_WIDTH // 2, y - ROW_HEIGHT // 2, x + ROW_WIDTH // 2, y + ROW_HEIGHT // 2)
+
+    def _point_of_row(self, index):
+        x, y = config.DICH_VU_THU_THUAT[index]
+        return self.origin[0] + x, self.origin[1] + y
+
+    def _grid_rect(self):
+        first = self._row_rect(0)
+        last = self._row_rect(len(config.DICH_VU_THU_THUAT) - 1)
+        return first[0], first[1], last[2], last[3] + ROW_HEIGHT
+
+    def _row_at(self, x, y, rows=None):
+        """Index of the row slot under (x, y); only filled rows unless rows is given."""
+        if rows is None:
+            rows = len(self.grid)
+        for index in range(min(rows, len(config.DICH_VU_THU_THUAT))):
+            left, top, right, bottom = self._row_rect(index)
+            if left <= x < right and top <= y < bottom:
+                return index
+        return None
+
+    def _target_at(self, x, y):
+        """Name of the configured point nearest to (x, y) within HIT_RADIUS."""
+        best, best_distance = None, HIT_RADIUS ** 2 + 1
+        for name in TEXT_FIELDS + tuple(LOOKUP_FIELDS) + tuple(LOOKUP_FIELDS.values()) + BUTTONS:
+            px, py = self._point(name)
+            distance = (px - x) ** 2 + (py - y) ** 2
+            if distance < best_distance:
+                best, best_distance = name, distance
+        return best
+
+    # ===== Input backend =====
+
+    def _busy(self, what):
+        """True (and a problem is recorded) if input arrives while the window is busy."""
+        if time.perf_counter() < self.busy_until:
+            self.problems.append(f"{what} while the window was busy")
+            return True
+        return False
+
+    def click(self, dlg, screen_coords, double=False):
+        time.sleep(self.input_latency)
+        x, y = screen_coords
+        with self._lock:
+            # Input sent while the HIS reloads is lost
+            if self._busy(f"Click at {screen_coords}"):
+                return
+            row = self._row_at(x, y)
+            if row is not None:
+                self.selected_row = row
+                self.editing = self.tab == 'cho'
+                for name in DETAIL_FIELDS:
+                    self.text[name] = ""
+                return
+            left, top, right, bottom = self._grid_rect()
+            if left <= x < right and top <= y < bottom:
+                # Empty part of the grid (Tool probes row 0 after the last row left)
+                self.selected_row = None
+                return
+            target = self._target_at(x, y)
+            if target is None:
+                self.problems.append(f"Click at {screen_coords} hit nothing")
+            elif target in TEXT_FIELDS or target in LOOKUP_FIELDS:
+                self.focus = target
+                self.select_all = False
+            elif target in LOOKUP_FIELDS.values():
+                self._pick_suggestion(target)
+            else:
+                self._press(target)
+
+    def send_keys(self, keys, pause=None):
+        time.sleep(self.input_latency)
+        with self._lock:
+            if self._busy(f"Keys {keys!r}"):
+                return
+            for modifiers, key in KEY_TOKEN.findall(keys):
+                if '^' in modifiers:
+                    if key.lower() == 'a':
+                        self.select_all = True
+                    elif key.lower() == 'v':
+                        self._type(self.clipboard)
+                    continue
+                if key.startswith('{'):
+                    name = key[1:-1].split()[0].upper()
+                    if name == 'SPACE':
+                        self._type(' ')
+                    # {RIGHT} moves to the next part of a date; the digits carry on
+                    continue
+                self._type(key)
+
+    def paste(self, text):
+        self.clipboard = text
+        self.send_keys("^v")
+
+    def copy_selection(self):
+        with self._lock:
+            if self._busy("Copy") or self.focus is None:
+                return ""
+            self.select_all = True
+            self.clipboard = self.text.get(self.focus, "")
+            return self.clipboard
+
+    def element_rect(self, x, y):
+        with self._lock:
+            # Empty rows below the list are still grid cells the size of a row
+            row = self._row_at(x, y, rows=len(config.DICH_VU_THU_THUAT))
+            if row is not None:
+                return self._row_rect(row)
+            left, top, right, bottom = self._grid_rect()
+            if left <= x < right and top <= y < bottom:
+                return left, top, right, bottom
+        width, height = WINDOW_SIZE
+        return self.origin[0], self.origin[1], self.origin[0] + width, self.origin[1] + height
+
+    def grab(self, region):
+        left, top, width, height = region
+        canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+        with self._lock:
+            for index in range(len(config.DICH_VU_THU_THUAT)):
+                name = self.grid[index] if index < len(self.grid) else None
+                tile = self._row_tile(name, index == self.selected_row)
+                self._paste_tile(canvas, region, self._row_rect(index), tile)
+            if self.suggestion is not None and time.perf_counter() >= self.suggestion[2]:
+                field, text, _ = self.suggestion
+                x, y = self._point(LOOKUP_FIELDS[field])
+                w, h = SUGGESTION_SIZE
+                rect = (x - w // 2, y - h // 2, x - w // 2 + w, y - h // 2 + h)
+                self._paste_tile(canvas, region, rect, self._suggestion_tile(text))
+        return canvas
+
+    # ===== Behaviour =====
+
+    def _type(self, text):
+        if self.focus is None:
+            self.problems.append(f"Typed {text!r} with no field focused")
+            return
+        if self.focus in LOOKUP_FIELDS:
+            # Lookup fields search as you type; the value is set by picking a suggestion
+            shown_at = time.perf_counter() + self.suggestion_latency
+            self.suggestion = (self.focus, text, shown_at)
+            return
+        if self.select_all:
+            self.text[self.focus] = ""
+            self.select_all = False
+        self.text[self.focus] += text
+
+    def _pick_suggestion(self, target):
+        if self.suggestion is None or LOOKUP_FIELDS[self.suggestion[0]] != target \
+                or time.perf_counter() < self.suggestion[2]:
+            self.problems.append(f"Clicked {target} before its suggestion list was shown")
+            return
+        field, text, _ = self.suggestion
+        self.text[field] = text
+        self.suggestion = None
+
+    def _press(self, button):
+        now = time.perf_counter()
+        if button == 'CHO_THUC_HIEN':
+            self.tab = 'cho'
+        elif button == 'DA_THUC_HIEN':
+            self.tab = 'da'
+        elif button == 'RELOAD':
+            key = (self.text['ID_BOX'].strip(), digits(self.text['NGAY_BAT_DAU']))
+            self.found = key if key in self.rows else None
+            if self.found is None:
+                self.problems.append(f"Reload found no patient for {key}")
+            self.grid = []
+            self.selected_row = None
+            self.busy_until = now + self.reload_latency
+        elif button == 'PATIENT_ROW':
+            self.grid = self.rows.get(self.found, []) if self.found else []
+            self.selected_row = None
+        elif button == 'SUA':
+            self.editing = self.selected_row is not None
+        elif button == 'LUU':
+            self._save()
+        elif button == 'TIEP':
+            self.found = None
+            self.grid = []
+            self.selected_row = None
+            self.busy_until = now + self.reload_latency
+
+    def _save(self):
+        if self.selected_row is None or not self.editing:
+            self.problems.append("LUU clicked without a row being edited")
+            return
+        record = {"id": self.found[0], "ngay": self.found[1],
+                  "procedure": self.grid[self.selected_row]}
+        record.update({name: self.text[name] for name in DETAIL_FIELDS})
+        self.records.append(record)
+        if self.tab == 'cho':
+            # A done procedure leaves the waiting list; the rows below move up
+            del self.grid[self.selected_row]
+            self.selected_row = None
+        self.editing = False
+
+    # ===== Drawing =====
+
+    def _row_tile(self, name, selected):
+        """A grid row with its cell border; name None draws an empty row."""
+        key = ('row', name, selected)
+        tile = self._tiles.get(key)
+        if tile is None:
+            background = (255, 229, 204) if selected else (255, 255, 255)
+            tile = np.full((ROW_HEIGHT, ROW_WIDTH, 3), background, dtype=np.uint8)
+            cv2.rectangle(tile, (0, 0), (ROW_WIDTH - 1, ROW_HEIGHT - 1), (200, 200, 200), 1)
+            if name is not None:
+                text = DISPLAY_NAMES.get(name, fold_text(name))
+                cv2.putText(tile, text, (4, ROW_HEIGHT - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4,
+                            (0, 0, 0), 1, cv2.LINE_AA)
+            self._tiles[key] = tile
+        return tile
+
+    def _suggestion_tile(self, text):
+        w, h = SUGGESTION_SIZE
+        tile = np.full((h, w, 3), (250, 240, 230), dtype=np.uint8)
+        cv2.putText(tile, fold_text(text), (4, h - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4,
+                    (0, 0, 0), 1, cv2.LINE_AA)
+        return tile
+
+    @staticmethod
+    def _paste_tile(canvas, region, rect, tile):
+        """Copy the part of tile (placed at screen rect) that falls inside region."""
+        left, top, width, height = region
+        x0, y0 = max(rect[0], left), max(rect[1], top)
+        x1, y1 = min(rect[2], left + width), min(rect[3], top + height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        canvas[y0 - top:y1 - top, x0 - left:x1 - left] = tile[y0 - rect[1]:y1 - rect[1], x0 - rect[0]:x1 - rect[0]]
+
+    def seed_ocr_cache(self, cache):
+        """Teach the OCR cache every row bitmap, so runs measure automation, not Tesseract."""
+        for name in config.thu_thuat_dur_mapper:
+            for selected in (False, True):
+                cache.put(self._row_tile(name, selected), name)
+
+    # ===== Results =====
+
+    def check(self, patients):
+        """Problems seen during the run plus differences between saved records and patients."""
+        errors = list(self.problems)
+        saved = {(r["id"], r["ngay"], r["procedure"]): r for r in self.records}
+        for data in patients:
+            key = (str(data["id"]), digits(data["ngay"]))
+            for tt in data["thu_thuats"]:
+                record = saved.get(key + (tt["Ten"],))
+                if record is None:
+                    errors.append(f"{key[0]} {data['ngay']}: '{tt['Ten']}' was not saved")
+                    continue
+                expected = {"BSCD": tt["BS CD"], "CCHN": tt["Nguoi Thuc Hien"]}
+                for name, value in expected.items():
+                    if record[name] != value:
+                        errors.append(f"{key[0]} {tt['Ten']}: {name} = {record[name]!r}, expected {value!r}")
+                for name, field in (("NGAY_CD", "Ngay CD"), ("NGAY_BDTH", "Ngay BD TH"), ("NGAY_KQ", "Ngay KQ")):
+                    if digits(record[name]) != digits(tt[field]):
+                        errors.append(f"{key[0]} {tt['Ten']}: {name} = {record[name]!r}, expected {tt[field]!r}")
+        return errors
+
+
+def make_patients(count, seed=0, ngay="16-12-2025", gio="09:00"):
+    """Random patients with 1-4 procedures, alternating between the two grid modes."""
+    rng = random.Random(seed)
+    procedures = list(config.thu_thuat_dur_mapper)
+    staff = list(config.map_ys_bs)[:3]
+    patients = []
+    for i in range(count):
+        chosen = rng.sample(procedures, rng.randint(1, 4))
+        data = create_data_from_manual_input(f"SIM{i:04d}", chosen, staff, ngay, gio)
+        data["isFirst"] = i % 2 == 0
+        patients.append(data)
+    return patients
+
+
+def run_benchmark(patients, his, arrow_mode=False, fixed_waits=False, use_plans=False):
+    """
+    Run every patient through the automation steps against his. Returns the result dict.
+    With use_plans the patients are compiled into action plans first (action_plan.py).
+    """
+    recorder = RecordingInput(his)
+    waiter = Waiter(his.window, enabled=not fixed_waits)
+    tracer.clear()
+    plans = validate_batch(patients, arrow_mode)[0] if use_plans else None
+
+    start = time.perf_counter()
+    for i, data in enumerate(patients):
+        tool = Tool(app=None, dlg=his.window, waiter=waiter, input=recorder)
+        tracer.set_patient(data["id"])
+        if plans is not None:
+            PlanExecutor(tool).run(plans[i])
+            continue
+        for step_key, step_name, step_func in patient_steps(tool, data, waiter, arrow_mode):
+            with tracer.span(f"step:{step_key}", step_name):
+                step_func()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "patients": len(patients),
+        "procedures": sum(len(d["thu_thuats"]) for d in patients),
+        "seconds": elapsed,
+        "patients_per_minute": len(patients) * 60 / elapsed if elapsed > 0 else 0.0,
+        "actions": dict(recorder.counts()),
+        "errors": his.check(patients),
+        "waits": waiter.summary(),
+        "steps": tracer.summary_lines(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the automation against a simulated HIS and measure throughput."
+    )
+    parser.add_argument("--csv", help="Patient data file (same format as the GUI loads)")
+    parser.add_argument("--patients", type=int, default=20, help="Random patients when no --csv is given")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--arrow", action="store_true", help="Type dates part by part with arrow keys")
+    parser.add_argument("--ocr", action="store_true", help="Run Tesseract on the rows instead of a seeded cache")
+    parser.add_argument("--plan", action="store_true", help="Run compiled action plans instead of Tool steps")
+    parser.add_argument("--fixed-waits", action="store_true", help="Sleep the full wait after every input")
+    parser.add_argument("--input-latency", type=float, default=0, help="ms per click / key sequence")
+    parser.add_argument("--reload-latency", type=float, default=0, help="ms the window is busy after reload")
+    parser.add_argument("--suggestion-latency", type=float, default=0, help="ms before a suggestion list shows")
+    parser.add_argument("--min-ppm", type=float, help="Exit with status 1 below this many patients per minute")
+    parser.add_argument("--json", dest="json_path", help="Also write the result to this JSON file")
+    parser.add_argument("--db", help="Database to copy coordinates and staff from (default: app_data.db)")
+    parser.add_argument("--verbose", action="store_true", help="Show Tool's debug output")
+    args = parser.parse_args()
+
+    use_temp_database(args.db)
+
+    patients = read_data(args.csv) if args.csv else make_patients(args.patients, args.seed)
+    his = SimulatedHIS(patients,
+                       input_latency=args.input_latency / 1000,
+                       reload_latency=args.reload_latency / 1000,
+                       suggestion_latency=args.suggestion_latency / 1000)
+    if not args.ocr:
+        his.seed_ocr_cache(get_cache())
+
+    output = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = run_benchmark(patients, his, arrow_mode=args.arrow, fixed_waits=args.fixed_waits,
+                               use_plans=args.plan)
+
+    print(f"{result['patients']} patients, {result['procedures']} procedures in {result['seconds']:.2f} s")
+    print(f"throughput {result['patients_per_minute']:.1f} patients/min")
+    print("actions " + ", ".join(f"{k}={v}" for k, v in sorted(result["actions"].items())))
+    for line in result["steps"]:
+        print(f"  {line}")
+    for error in result["errors"][:20]:
+        print(f"ERROR {error}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failed = bool(result["errors"])
+    if args.min_ppm is not None and result["patients_per_minute"] < args.min_ppm:
+        print(f"FAIL: {result['patients_per_minute']:.1f} patients/min < {args.min_ppm}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Input and screen access used by Tool.
+
+Tool never calls pywinauto, pyperclip or the screen capture directly; it goes
+through an input backend with these methods:
+
+    click(dlg, screen_coords, double)   mouse click at screen coordinates
+    send_keys(keys, pause)              pywinauto send_keys syntax ('^a', '{RIGHT}', ...);
+                                        pause between keystrokes, None for the default
+    paste(text)                         put text on the clipboard and press Ctrl+V
+    element_rect(x, y)                  (left, top, right, bottom) of the control at a screen point
+    grab(region)                        BGR image of a screen region (left, top, width, height)
+    copy_selection()                    select all in the focused field, copy it and return the text
+
+DesktopInput drives the real Windows desktop. his_simulator.SimulatedHIS
+implements the same methods against a fake HIS, DryInput against nothing at
+all, and RecordingInput wraps any of them to log what Tool does.
+"""
+
+import time
+from collections import Counter
+
+import numpy as np
+
+from screen_capture import grab_region
+
+# How long copy_selection waits for the copied text to reach the clipboard
+COPY_TIMEOUT = 0.5
+COPY_POLL = 0.01
+
+
+class DesktopInput:
+    """pywinauto mouse and keyboard, the system clipboard and screen capture."""
+
+    def __init__(self):
+        # Imported here, not at module level: on Linux pywinauto.keyboard opens
+        # the X display on import and raises without one (headless test runs)
+        try:
+            from pywinauto.keyboard import send_keys
+            from pywinauto.uia_element_info import UIAElementInfo
+            import pyperclip
+        except Exception as e:
+            raise RuntimeError(f"pywinauto is not available ({e}); use his_simulator for headless runs")
+        self._send_keys = send_keys
+        self._element_info = UIAElementInfo
+        self._clipboard = pyperclip
+
+    def click(self, dlg, screen_coords, double=False):
+        dlg.click_input(coords=screen_coords, double=double, absolute=True)
+
+    def send_keys(self, keys, pause=None):
+        if pause is None:
+            self._send_keys(keys)
+        else:
+            self._send_keys(keys, pause=pause)
+
+    def paste(self, text):
+        self._clipboard.copy(text)
+        self._send_keys("^v")
+
+    def element_rect(self, x, y):
+        rect = self._element_info.from_point(x, y).rectangle
+        return rect.left, rect.top, rect.right, rect.bottom
+
+    def grab(self, region):
+        return grab_region(region)
+
+    def copy_selection(self):
+        """Copy the focused field; the clipboard is restored afterwards."""
+        previous = self._clipboard.paste()
+        # Empty it first, so the copy shows up as a change even if the text is the same
+        self._clipboard.copy("")
+        self._send_keys("^a^c")
+        deadline = time.perf_counter() + COPY_TIMEOUT
+        text = self._clipboard.paste()
+        while not text and time.perf_counter() < deadline:
+            time.sleep(COPY_POLL)
+            text = self._clipboard.paste()
+        self._clipboard.copy(previous)
+        return text
+
+
+class DryInput:
+    """Accepts every input and touches nothing, for recording what Tool would send.
+
+    copy_selection() returns what was typed since the last click or select-all
+    ({RIGHT} between date parts shows as '-'), so a date read-back passes.
+    """
+
+    def __init__(self):
+        self.typed = ""
+
+    def click(self, dlg, screen_coords, double=False):
+        self.typed = ""
+
+    def send_keys(self, keys, pause=None):
+        if keys.startswith("^a"):
+            self.typed = ""
+            keys = keys[2:]
+        self.typed += keys.replace("{RIGHT}", "-").replace("{SPACE}", " ")
+
+    def paste(self, text):
+        self.typed += text
+
+    def element_rect(self, x, y):
+        return x, y, x, y
+
+    def grab(self, region):
+        left, top, width, height = region
+        return np.zeros((height, width, 3), dtype=np.uint8)
+
+    def copy_selection(self):
+        return self.typed
+
+
+class RecordingInput:
+    """Passes every call on to target and keeps a log of the actions."""
+
+    def __init__(self, target):
+        self.target = target
+        self.actions = []
+        self.start = time.perf_counter()
+
+    def _record(self, kind, **details):
+        details["kind"] = kind
+        details["t"] = time.perf_counter() - self.start
+        self.actions.append(details)
+
+    def click(self, dlg, screen_coords, double=False):
+        self._record("double_click" if double else "click", coords=tuple(screen_coords))
+        return self.target.click(dlg, screen_coords, double)
+
+    def send_keys(self, keys, pause=None):
+        self._record("keys", keys=keys, pause=pause)
+        return self.target.send_keys(keys, pause)
+
+    def paste(self, text):
+        self._record("paste", text=text)
+        return self.target.paste(text)
+
+    def element_rect(self, x, y):
+        self._record("element_rect", coords=(x, y))
+        return self.target.element_rect(x, y)
+
+    def grab(self, region):
+        self._record("grab", region=tuple(region))
+        return self.target.grab(region)
+
+    def copy_selection(self):
+        text = self.target.copy_selection()
+        self._record("copy", text=text)
+        return text
+
+    def counts(self):
+        """Number of actions of each kind."""
+        return Counter(action["kind"] for action in self.actions)
+
+    def clear(self):
+        self.actions = []
+        self.start = time.perf_counter()
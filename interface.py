@@ -5,23 +5,36 @@ import queue
 import importlib.util
 import json
 from pywinauto import Application
-from handle_data import read_data, export_data_to_csv, merge_csv_and_manual_data, load_manual_data_from_json, create_data_from_manual_input, validate_all_data
-from tool import Tool
+from handle_data import read_data, export_data_to_csv, merge_csv_and_manual_data, create_data_from_manual_input, validate_all_data, manual_data_from_entries, read_manual_entries_csv
+from tool import Tool, patient_steps
+from action_plan import validate_batch
+from waits import Waiter
+from tracing import tracer
+import ocr_service
+from ocr_cache import save_cache
 import time
 import os
 import sys
 import webbrowser
 import ctypes
 import platform
+from datetime import datetime, timedelta
 from config_dialog import ConfigDialog
-from database import initialize_database, load_manual_entries_from_db, get_window_title, set_window_title, get_arrow_mode_setting, set_arrow_mode_setting
+from database import initialize_database, load_manual_entries_from_db, load_manual_entries_page, save_manual_entries_bulk, get_window_title, set_window_title, get_arrow_mode_setting, set_arrow_mode_setting, get_fill_backend_setting, set_fill_backend_setting, save_appointments, load_appointments, search_entries
 from pywinauto import Application, Desktop
 from manual_entry import ManualEntryDialog
+from db_executor import start_executor, stop_executor, run_read, run_write
+from retention import RetentionScheduler
+from backup import BackupScheduler
+from coordinate_profiles import get_screen_metrics, apply_profile_for_screen, save_current_as_profile
 import config
-from config import PATIENT_ROW, TIEP
 
 GITHUB_REPO = "TrH203/Clinic-Auto-Fill"
 
+# Manual entry history loaded at startup (days), and page size for older entries
+HISTORY_WINDOW_DAYS = 7
+HISTORY_PAGE_SIZE = 200
+
 class AutomationGUI:
     def __init__(self, root):
         self.root = root
@@ -39,9 +52,14 @@ class AutomationGUI:
         self.data_file_path = tk.StringVar()
         self.app = None
         self.dlg = None
+        self.reference_window_size = None  # Window size the coordinates are for
+        self.uia_driver = None  # UIAFieldDriver shared by every patient (fill backend "uia")
         self.all_data = []
         self.manual_data = []
         self.csv_data = []
+        self.manual_entries = []  # Saved manual entry history from the database
+        self.history_cursor = None  # Keyset cursor for the next older page
+        self.history_has_more = True
         self.current_index = 0
 
         # Queue for thread communication
@@ -54,11 +72,18 @@ class AutomationGUI:
         self.setup_hotkeys()
         self.check_queue()
         
+        # log_message is thread-safe; reloads usually run on the writer thread
+        config.subscribe(config.COORDINATES_CHANGED,
+                         lambda coords: self.log_message(f"✓ Reloaded {len(coords)} coordinates"))
+        config.subscribe(config.STAFF_CHANGED,
+                         lambda staff: self.log_message(f"✓ Reloaded {len(staff['map_ys_bs'])} staff"))
+        
         # Bind close event for auto-save
         self.root.protocol("WM_DELETE_WINDOW", self.on_app_close)
         
         # Auto-load data if available
         self.auto_load_data()
+        self.load_recent_history()
         
         
     def setup_ui(self):
@@ -103,6 +128,20 @@ class AutomationGUI:
         batch_btn = ttk.Button(file_frame, text="🧾 Batch IDs", command=self.open_batch_editor)
         batch_btn.grid(row=0, column=7, padx=(5, 0))
         
+        # Patient history search (manual entries in the database)
+        ttk.Label(file_frame, text="Tìm BN:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(file_frame, textvariable=self.search_var)
+        search_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(0, 5), pady=(5, 0))
+        search_entry.bind('<Return>', lambda e: self.search_history())
+        
+        search_btn = ttk.Button(file_frame, text="🔎 Tìm", command=self.search_history)
+        search_btn.grid(row=1, column=2, padx=(0, 5), pady=(5, 0))
+        
+        history_btn = ttk.Button(file_frame, text="🕘 Lịch Sử", command=self.open_history)
+        history_btn.grid(row=1, column=3, padx=(0, 5), pady=(5, 0))
+        
         # Data display table
         data_table_frame = ttk.LabelFrame(main_frame, text="Loaded Data", padding="10")
         data_table_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 10))
@@ -185,6 +224,11 @@ class AutomationGUI:
                                 command=self.connect_to_app)
         connect_btn.grid(row=0, column=2)
         
+        # Save current coordinates as the profile for this screen
+        profile_btn = ttk.Button(conn_frame, text="💾 Lưu Profile",
+                                command=self.save_coordinate_profile)
+        profile_btn.grid(row=0, column=4)
+        
         # Control section
         control_frame = ttk.LabelFrame(main_frame, text="Controls", padding="10")
         control_frame.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -207,6 +251,10 @@ class AutomationGUI:
                                        style="Emergency.TButton")
         self.emergency_btn.grid(row=0, column=3, padx=(10, 0))
         
+        # Export timings of the last run
+        trace_btn = ttk.Button(control_frame, text="📊 Xuất Trace", command=self.export_trace)
+        trace_btn.grid(row=0, column=4, padx=(10, 0))
+        
         # Configure emergency button style
         style = ttk.Style()
         style.configure("Emergency.TButton", foreground="red", font=('Arial', 9, 'bold'))
@@ -225,16 +273,22 @@ class AutomationGUI:
         ttk.Label(delay_frame, text="Step delay (seconds):").grid(row=0, column=2, sticky=tk.W, padx=(0, 5))
         
         self.step_delay_var = tk.DoubleVar(value=1.0)
-        step_delay_spinbox = ttk.Spinbox(delay_frame, from_=0.5, to=10.0, increment=0.5, 
+        step_delay_spinbox = ttk.Spinbox(delay_frame, from_=0.0, to=10.0, increment=0.5, 
                                         textvariable=self.step_delay_var, width=10)
         step_delay_spinbox.grid(row=0, column=3)
         
         # Arrow Date Checkbox
         self.arrow_date_var = tk.BooleanVar(value=get_arrow_mode_setting())
-        self.arrow_date_var.trace('w', lambda *args: set_arrow_mode_setting(self.arrow_date_var.get()))
+        self.arrow_date_var.trace('w', lambda *args: run_write(set_arrow_mode_setting, self.arrow_date_var.get()))
         arrow_date_check = ttk.Checkbutton(delay_frame, text="Ngày Mũi Tên", variable=self.arrow_date_var)
         arrow_date_check.grid(row=0, column=4, padx=(10, 0))
         
+        # UIA fill checkbox: set field values through UI Automation instead of clicks
+        self.uia_fill_var = tk.BooleanVar(value=get_fill_backend_setting() == "uia")
+        self.uia_fill_var.trace('w', lambda *args: run_write(set_fill_backend_setting, self.get_fill_backend()))
+        uia_fill_check = ttk.Checkbutton(delay_frame, text="Điền UIA", variable=self.uia_fill_var)
+        uia_fill_check.grid(row=0, column=5, padx=(10, 0))
+        
         # Progress section
         progress_frame = ttk.Frame(control_frame)
         progress_frame.grid(row=2, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0))
@@ -623,6 +677,12 @@ class AutomationGUI:
                         messagebox.showerror("Lỗi", f"Không thể lưu CSV:\n{str(e)}")
                         return
 
+                # Keep a typed copy of the generated schedule in the database
+                run_write(save_appointments, records, source="auto_schedule",
+                          replace_range=(start_date, end_date),
+                          callback=lambda ids: self.log_message(f"✓ Saved {len(ids)} appointments to database"),
+                          errback=lambda e: self.log_message(f"✗ Failed to save schedule to database: {str(e)}", "ERROR"))
+
                 self.csv_data = records
                 if output_path:
                     self.data_file_path.set(output_path)
@@ -632,6 +692,28 @@ class AutomationGUI:
                 self.log_message(f"✓ Generated {len(records)} records from batch IDs")
                 messagebox.showinfo("Thành Công", f"Đã tạo {len(records)} lịch hẹn.")
 
+            def load_saved():
+                """Load the schedule saved for the date range instead of generating a new one."""
+                start_date = start_date_var.get().strip()
+                end_date = end_date_var.get().strip()
+                if not start_date or not end_date:
+                    messagebox.showerror("Lỗi", "Vui lòng nhập ngày bắt đầu và ngày kết thúc.")
+                    return
+
+                def on_loaded(records):
+                    if not records:
+                        messagebox.showinfo("Thông báo", "Không có lịch đã lưu trong khoảng ngày này.")
+                        return
+                    self.csv_data = records
+                    self.merge_all_data()
+                    self.update_data_table()
+                    self.update_button_states()
+                    self.log_message(f"✓ Loaded {len(records)} saved records ({start_date} - {end_date})")
+                    messagebox.showinfo("Thành Công", f"Đã tải {len(records)} lịch hẹn đã lưu.")
+
+                run_read(load_appointments, start_date, end_date, callback=on_loaded,
+                         errback=lambda e: messagebox.showerror("Lỗi", f"Không thể tải lịch:\n{str(e)}"))
+
             load_default()
 
             actions_frame = ttk.Frame(main_frame)
@@ -649,14 +731,202 @@ class AutomationGUI:
             ttk.Button(actions_frame, text="Chạy batch", command=run_batch).grid(
                 row=0, column=3, padx=(0, 6)
             )
+            ttk.Button(actions_frame, text="Tải lịch đã lưu", command=load_saved).grid(
+                row=0, column=4, padx=(0, 6)
+            )
             ttk.Button(actions_frame, text="Đóng", command=dialog.destroy).grid(
-                row=0, column=4
+                row=0, column=5
             )
 
         except Exception as e:
             self.log_message(f"✗ Failed to open batch editor: {str(e)}", "ERROR")
             messagebox.showerror("Lỗi", f"Không thể mở batch editor:\n{str(e)}")
     
+    def search_history(self):
+        """Search saved manual entries by patient ID, procedures, staff or notes."""
+        query = self.search_var.get().strip()
+        if not query:
+            return
+        
+        run_read(search_entries, query, 200,
+                 callback=lambda results: self.show_search_results(query, results),
+                 errback=lambda e: self.log_message(f"✗ Search failed: {str(e)}", "ERROR"))
+    
+    def show_search_results(self, query, results):
+        """Show search results in a separate window."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Kết quả tìm kiếm: {query}")
+        dialog.geometry("760x400")
+        dialog.transient(self.root)
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill="both", expand=True)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+        
+        ttk.Label(frame, text=f"Tìm thấy {len(results)} bản ghi").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        
+        tree = self.create_entries_tree(frame)
+        self.insert_entry_rows(tree, results)
+        
+        ttk.Button(frame, text="Đóng", command=dialog.destroy).grid(row=2, column=0, sticky=tk.E, pady=(5, 0))
+    
+    def create_entries_tree(self, frame):
+        """Create a read-only Treeview for database manual entries in row 1 of frame."""
+        columns = ('ID', 'Date', 'Time', 'Procedures', 'Staff', 'Notes', 'Created')
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=15)
+        scroll_y = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll_y.set)
+        
+        headings = {
+            'ID': ('Patient ID', 85),
+            'Date': ('Ngày', 80),
+            'Time': ('Giờ', 50),
+            'Procedures': ('Thủ thuật', 130),
+            'Staff': ('Nhân viên', 150),
+            'Notes': ('Ghi chú', 100),
+            'Created': ('Tạo lúc', 130),
+        }
+        for col, (text, width) in headings.items():
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor='w')
+        
+        tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scroll_y.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        return tree
+    
+    def insert_entry_rows(self, tree, entries):
+        for entry in entries:
+            tree.insert('', 'end', values=(
+                entry['patient_id'],
+                entry['appointment_date'],
+                entry['appointment_time'],
+                entry['procedures'],
+                entry['staff'],
+                entry['notes'] or "",
+                entry['created_at'],
+            ))
+    
+    def load_recent_history(self, callback=None):
+        """Load manual entries saved in the last HISTORY_WINDOW_DAYS days."""
+        since = datetime.now() - timedelta(days=HISTORY_WINDOW_DAYS)
+        
+        def on_loaded(result):
+            entries, _ = result
+            self.manual_entries = entries
+            # Older pages continue after the oldest loaded entry. With an empty
+            # window every entry is older, so start from the newest
+            if entries:
+                last = entries[-1]
+                self.history_cursor = (last['created_at'], last['id'])
+            else:
+                self.history_cursor = None
+            self.history_has_more = True
+            if callback:
+                callback(entries)
+        
+        run_read(load_manual_entries_page, limit=HISTORY_PAGE_SIZE, since=since, callback=on_loaded,
+                 errback=lambda e: self.log_message(f"✗ History load failed: {str(e)}", "ERROR"))
+    
+    def load_older_history(self, callback=None):
+        """Fetch the next older page of manual entries and append it to the history."""
+        if not self.history_has_more:
+            return
+        
+        def on_loaded(result):
+            entries, next_cursor = result
+            self.manual_entries.extend(entries)
+            self.history_cursor = next_cursor
+            self.history_has_more = next_cursor is not None
+            if callback:
+                callback(entries)
+        
+        run_read(load_manual_entries_page, before=self.history_cursor, limit=HISTORY_PAGE_SIZE,
+                 callback=on_loaded,
+                 errback=lambda e: self.log_message(f"✗ History load failed: {str(e)}", "ERROR"))
+    
+    def open_history(self):
+        """Show saved manual entries, loading older pages on demand."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Lịch sử nhập liệu")
+        dialog.geometry("760x420")
+        dialog.transient(self.root)
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill="both", expand=True)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+        
+        count_label = ttk.Label(frame)
+        count_label.grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        
+        tree = self.create_entries_tree(frame)
+        self.insert_entry_rows(tree, self.manual_entries)
+        
+        btn_frame = ttk.Frame(frame)
+        btn_frame.grid(row=2, column=0, sticky=tk.E, pady=(5, 0))
+        
+        ttk.Button(btn_frame, text="Nhập CSV",
+                   command=lambda: self.import_history_csv(dialog, on_history_reloaded)).pack(side='left', padx=(0, 5))
+        older_btn = ttk.Button(btn_frame, text="Tải cũ hơn")
+        older_btn.pack(side='left', padx=(0, 5))
+        ttk.Button(btn_frame, text="Đóng", command=dialog.destroy).pack(side='left')
+        
+        def update_status():
+            count_label.config(text=f"Đã tải {len(self.manual_entries)} bản ghi")
+            older_btn.config(state='normal' if self.history_has_more else 'disabled')
+        
+        def on_older_loaded(entries):
+            if not dialog.winfo_exists():
+                return
+            self.insert_entry_rows(tree, entries)
+            update_status()
+        
+        def on_history_reloaded(entries):
+            if not dialog.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            self.insert_entry_rows(tree, entries)
+            update_status()
+        
+        def load_older():
+            older_btn.config(state='disabled')
+            self.load_older_history(callback=on_older_loaded)
+        
+        older_btn.config(command=load_older)
+        update_status()
+    
+    def import_history_csv(self, parent, callback=None):
+        """
+        Save the entries of a CSV exported by export_manual_entries.py to the
+        history, all in one transaction. callback gets the reloaded history.
+        """
+        filename = filedialog.askopenfilename(
+            parent=parent,
+            title="Chọn file CSV lịch sử",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+        )
+        if not filename:
+            return
+        
+        def on_saved(entry_ids):
+            self.log_message(f"✓ Imported {len(entry_ids)} manual entries from {os.path.basename(filename)}")
+            self.load_recent_history(callback=callback)
+        
+        def on_read(result):
+            entries, errors = result
+            if errors:
+                messagebox.showerror("Lỗi", "File CSV có lỗi, chưa nhập dòng nào:\n" + "\n".join(errors[:10]), parent=parent)
+                return
+            if not entries:
+                messagebox.showinfo("Thông báo", "File không có bản ghi nào", parent=parent)
+                return
+            run_write(save_manual_entries_bulk, entries, callback=on_saved,
+                      errback=lambda e: self.log_message(f"✗ History import failed: {str(e)}", "ERROR"))
+        
+        run_read(read_manual_entries_csv, filename, callback=on_read,
+                 errback=lambda e: messagebox.showerror("Lỗi", f"Không thể đọc file:\n{str(e)}", parent=parent))
+    
     def on_manual_entry_saved(self, data):
         """Callback when manual entry is saved."""
         self.manual_data.append(data)
@@ -1022,6 +1292,8 @@ class AutomationGUI:
             # Using backend="uia" as before
             self.app = Application(backend="uia").connect(title=target_title)
             self.dlg = self.app.window(title=target_title)
+            # Controls resolved in another window are no use here
+            self.uia_driver = None
             
             # Verify window exists
             if not self.dlg.exists():
@@ -1030,12 +1302,54 @@ class AutomationGUI:
             self.conn_status_label.config(text="Status: Connected ✓", foreground="green")
             self.log_message(f"✓ Connected to '{target_title}' successfully")
             self.update_button_states()
+            # Coordinates in use match the window as it is now; later resizes are scaled by Tool
+            self.reference_window_size = self.get_window_size()
+            self.apply_coordinate_profile()
         except Exception as e:
             self.conn_status_label.config(text="Status: Connection Failed ✗", foreground="red")
             self.log_message(f"✗ Connection failed to '{target_title}': {str(e)}", "ERROR")
             messagebox.showerror("Lỗi Kết Nối", 
                                 f"Không thể kết nối đến ứng dụng '{target_title}':\n{str(e)}\n\nVui lòng đảm bảo ứng dụng đang mở và đúng tên.")
             
+    def get_fill_backend(self):
+        return "uia" if self.uia_fill_var.get() else "pixel"
+    
+    def get_window_size(self):
+        """Size (width, height) of the connected window, or None."""
+        if self.dlg is None:
+            return None
+        try:
+            rect = self.dlg.rectangle()
+            return rect.width(), rect.height()
+        except Exception:
+            return None
+    
+    def apply_coordinate_profile(self):
+        """Switch to the coordinate profile saved for this screen, if any."""
+        screen = get_screen_metrics(self.root)
+        
+        def on_applied(profile):
+            if profile is None:
+                self.log_message(f"Không có profile tọa độ cho màn hình {screen[0]}x{screen[1]} @ {screen[2]} DPI, giữ tọa độ hiện tại")
+            else:
+                self.log_message(f"✓ Using coordinate profile '{profile['name']}' ({profile['mode']})")
+        
+        # Applying a profile replaces the coordinates in use: keep it on the writer thread
+        run_write(apply_profile_for_screen, screen, self.get_window_size(), callback=on_applied,
+                 errback=lambda e: self.log_message(f"✗ Coordinate profile failed: {str(e)}", "ERROR"))
+    
+    def save_coordinate_profile(self):
+        """Save the current coordinates as the profile for this screen.
+        
+        When connected and config.SCALE_COORDINATES is on, the profile is relative
+        to the window size so it can be scaled on other screens.
+        """
+        screen = get_screen_metrics(self.root)
+        window_size = self.get_window_size()
+        run_write(save_current_as_profile, screen, window_size,
+                  callback=lambda name: self.log_message(f"✓ Saved coordinate profile '{name}'"),
+                  errback=lambda e: self.log_message(f"✗ Saving coordinate profile failed: {str(e)}", "ERROR"))
+    
     def select_target_window(self):
         """Open dialog to select target window."""
         try:
@@ -1121,7 +1435,7 @@ class AutomationGUI:
                 selected_title = lb.get(selection[0])
                 
                 # Save to database
-                set_window_title(selected_title)
+                run_write(set_window_title, selected_title)
                 
                 # Update UI
                 short_title = selected_title if len(selected_title) < 40 else selected_title[:37] + "..."
@@ -1240,6 +1554,7 @@ class AutomationGUI:
             self.root.after(3000, lambda: self.log_message("🔄 Automation continuing..."))
         
     def run_automation(self):
+        waiter = None
         try:
             self.emergency_stop_flag = False
             
@@ -1254,6 +1569,31 @@ class AutomationGUI:
                 except Exception as e:
                     self.log_message(f"⚠ Could not focus window: {e}")
             
+            # Record what Tool will send for the whole batch and check it before anything is clicked
+            _, plan_summary = validate_batch(self.all_data, arrow_mode=self.arrow_date_var.get())
+            self.log_message(f"🧮 Checked {plan_summary['actions']} actions for {plan_summary['patients']} patients "
+                             f"in {plan_summary['check_ms']:.0f} ms (~{plan_summary['min_seconds']:.0f}-"
+                             f"{plan_summary['max_seconds']:.0f} s)")
+            if plan_summary["problems"]:
+                for patient_id, problems in plan_summary["problems"].items():
+                    for problem in problems[:3]:
+                        self.log_message(f"❌ ID {patient_id}: {problem}", "ERROR")
+                self.log_message("⏹️ Dữ liệu có lỗi, không chạy tự động")
+                return
+            
+            # Shared by every patient so wait timings adapt over the run
+            waiter = Waiter(self.dlg)
+            backend = self.get_fill_backend()
+            # One UIA driver for the GUI: its field controls are resolved once and
+            # only dropped when they fail (uia_driver.py)
+            if backend == "uia" and self.uia_driver is None:
+                from uia_driver import UIAFieldDriver
+                self.uia_driver = UIAFieldDriver(None)
+            tracer.clear()
+            
+            # Load the OCR model during the countdown instead of on the first row
+            threading.Thread(target=ocr_service.warm_up, daemon=True).start()
+            
             self.log_message("⏳ Starting in 2 seconds...")
             for k in range(2, 0, -1):
                 if not self.is_running or self.emergency_stop_flag:
@@ -1284,22 +1624,15 @@ class AutomationGUI:
                 
                 try:
                     # Create tool with custom delays
-                    tool = Tool(app=self.app, dlg=self.dlg)
+                    tool = Tool(app=self.app, dlg=self.dlg, reference_size=self.reference_window_size,
+                                backend=backend, waiter=waiter, uia=self.uia_driver,
+                                scale=config.SCALE_COORDINATES)
                     
                     # Execute automation steps with delays and emergency stop checks
-                    steps = [
-                        ("Setting 'Cho thuc hien' mode", lambda: tool.click_thuc_hien(mode=data["isFirst"])),
-                        (f"Setting start date: {data['ngay']}", lambda: tool.type_ngay_bat_dau(ngay=data["ngay"], arrow_mode=self.arrow_date_var.get())),
-                        (f"Setting end date: {data['ngay']}", lambda: tool.type_ngay_ket_thuc(ngay=data["ngay"], arrow_mode=self.arrow_date_var.get())),
-                        (f"Entering ID: {current_id}", lambda: tool.type_id(id=data["id"])),
-                        ("Clicking reload", lambda: tool.click_reload()),
-                        ("Selecting patient row", lambda: tool._double_click_position(coords=PATIENT_ROW)),
-                        ("Filling medical procedure data", lambda: tool.fill_thu_thuat_data(data["thu_thuats"], mode=data["isFirst"], arrow_mode=self.arrow_date_var.get())),
-                        ("Clicking next", lambda: tool._click_position(coords=TIEP)),
-                        ("Waiting for reload", lambda: time.sleep(1.0)),
-                    ]
+                    steps = patient_steps(tool, data, waiter, arrow_mode=self.arrow_date_var.get())
+                    tracer.set_patient(current_id)
                     
-                    for step_name, step_func in steps:
+                    for step_key, step_name, step_func in steps:
                         if self.emergency_stop_flag or not self.is_running:
                             break
                             
@@ -1313,12 +1646,14 @@ class AutomationGUI:
                         self.log_message(f"  → {step_name}")
                         
                         # Execute the step
-                        step_func()
+                        with tracer.span(f"step:{step_key}", step_name):
+                            step_func()
                         
                         # Add delay between steps
                         step_delay = self.step_delay_var.get()
                         if step_delay > 0:
-                            time.sleep(step_delay)
+                            with tracer.span("step_delay"):
+                                time.sleep(step_delay)
                     
                     if not self.emergency_stop_flag and self.is_running:
                         self.log_message(f"✅ Completed processing ID: {current_id}")
@@ -1334,6 +1669,12 @@ class AutomationGUI:
         except Exception as e:
             self.log_message(f"❌ Automation error: {str(e)}", "ERROR")
         finally:
+            if waiter is not None:
+                for line in waiter.summary():
+                    self.log_message(f"  ⏱ {line}")
+                for line in tracer.summary_lines():
+                    self.log_message(f"  📊 {line}")
+            save_cache()
             self.is_running = False
             self.paused = False
             self.emergency_stop_flag = False
@@ -1347,6 +1688,28 @@ class AutomationGUI:
             else:
                 self.log_message("⏹️ Automation stopped")
                 
+    def export_trace(self):
+        """Save the step timings of the last run as CSV or JSON."""
+        if not tracer.snapshot():
+            messagebox.showinfo("Thông báo", "Chưa có dữ liệu thời gian. Hãy chạy tự động trước.")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Xuất trace",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json")]
+        )
+        if not path:
+            return
+        try:
+            if path.lower().endswith(".json"):
+                tracer.export_json(path)
+                self.log_message(f"✓ Exported trace to {path}")
+            else:
+                summary_path = tracer.export_csv(path)
+                self.log_message(f"✓ Exported trace to {path} (summary: {summary_path})")
+        except Exception as e:
+            self.log_message(f"✗ Trace export failed: {str(e)}", "ERROR")
+    
     def check_queue(self):
         """Check for messages from worker thread"""
         try:
@@ -1391,18 +1754,29 @@ class AutomationGUI:
             self.log_message(f"✗ Auto-save failed: {str(e)}", "ERROR")
     
     def auto_load_data(self):
-        """Automatically load data from auto-save file if it exists."""
-        try:
-            if os.path.exists(self.auto_save_path):
-                self.data_file_path.set(self.auto_save_path)
-                self.csv_data = read_data(self.auto_save_path)
-                manual_entries = load_manual_entries_from_db()
-                self.manual_data = load_manual_data_from_json(manual_entries)
-                self.merge_all_data()
-                self.update_data_table()
-                self.log_message(f"✓ Auto-loaded {len(self.all_data)} records")
-        except Exception as e:
-            self.log_message(f"✗ Auto-load failed: {str(e)}", "ERROR")
+        """Automatically load data from auto-save file if it exists.
+        
+        File and database reads run on the background reader thread; the table
+        is filled in when they finish.
+        """
+        if not os.path.exists(self.auto_save_path):
+            return
+        
+        def load():
+            csv_data = read_data(self.auto_save_path)
+            manual_data = manual_data_from_entries(load_manual_entries_from_db())
+            return csv_data, manual_data
+        
+        def on_loaded(result):
+            self.csv_data, self.manual_data = result
+            self.data_file_path.set(self.auto_save_path)
+            self.merge_all_data()
+            self.update_data_table()
+            self.update_button_states()
+            self.log_message(f"✓ Auto-loaded {len(self.all_data)} records")
+        
+        run_read(load, callback=on_loaded,
+                 errback=lambda e: self.log_message(f"✗ Auto-load failed: {str(e)}", "ERROR"))
     
     def on_app_close(self):
         """Handle application closing - auto-save data."""
@@ -1440,8 +1814,17 @@ def main():
 
     initialize_database()
     root = tk.Tk()
+    start_executor(root)
     app = AutomationGUI(root)
     
+    # Prune old manual entries in the background
+    retention = RetentionScheduler(root, log=app.log_message)
+    retention.start()
+    
+    # Periodic online snapshots of app_data.db
+    backups = BackupScheduler(root, log=app.log_message)
+    backups.start()
+    
     def on_closing():
         if app.is_running:
             if messagebox.askokcancel("Quit", "Automation is running. Do you want to stop and quit?"):
@@ -1452,6 +1835,12 @@ def main():
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
     root.mainloop()
+    retention.stop()
+    backups.stop()
+    
+    # Let queued writes finish before exiting
+    stop_executor(wait=True)
+    ocr_service.shutdown()
 
 if __name__ == "__main__":
     main()
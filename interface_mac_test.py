@@ -17,7 +17,6 @@ from config_dialog import ConfigDialog
 from database import initialize_database, load_manual_entries_from_db, get_window_title, set_window_title, get_arrow_mode_setting, set_arrow_mode_setting
 from manual_entry import ManualEntryDialog
 import config
-from config import PATIENT_ROW, TIEP
 
 GITHUB_REPO = "TrH203/Clinic-Auto-Fill"
 
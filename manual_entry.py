@@ -8,9 +8,10 @@ from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
 
 import config
-from config import thu_thuat_dur_mapper, map_ys_bs, thu_thuat_ability_mapper
+from config import thu_thuat_dur_mapper, thu_thuat_ability_mapper
 from handle_data import create_data_from_manual_input, validate_all_data
-from database import save_manual_entry_to_db, get_disabled_staff, check_staff_available, delete_old_manual_entries, get_last_used_procedures, set_last_used_procedures
+from database import save_manual_entry_to_db, get_disabled_staff, check_staff_available, get_last_used_procedures, set_last_used_procedures
+from db_executor import run_read, run_write
 import unicodedata
 
 def remove_accents(input_str):
@@ -179,11 +180,6 @@ class ManualEntryDialog:
         # Get available procedures
         self.available_procedures = sorted(list(thu_thuat_dur_mapper.keys()))
         
-        # Get last used procedures if not editing existing entry
-        last_procedures = []
-        if not self.initial_data:
-            last_procedures = get_last_used_procedures()
-        
         # Create 4 procedure dropdowns
         self.procedure_vars = []
         self.procedure_combos = []  # Track combobox widgets
@@ -198,10 +194,6 @@ class ManualEntryDialog:
             dropdown.bind('<<ComboboxSelected>>', lambda e, idx=i: self.on_procedure_selected(e, idx))
             # Manual open with Down arrow key only (no auto-open)
             
-            # Set default value from last used procedures if available
-            if not self.initial_data and i < len(last_procedures) and last_procedures[i]:
-                var.set(last_procedures[i])
-            
             self.procedure_vars.append(var)
             self.procedure_combos.append(dropdown)
             self.all_comboboxes.append(dropdown)
@@ -215,18 +207,9 @@ class ManualEntryDialog:
         ttk.Label(staff_frame, text="💡 Gõ tên để tìm nhanh, chọn 1-3 người theo thứ tự:").grid(
             row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
         
-        # Get available staff (capitalize for display) and filter out disabled staff
-        disabled_staff = get_disabled_staff()
-        
-        # Helper to filter and format staff lists
-        def prepare_staff_list(staff_dict):
-            return sorted([k for k in staff_dict.keys() if k not in disabled_staff])
-
-        self.available_staff_g1 = prepare_staff_list(config.staff_p1_p3)
-        self.available_staff_g2 = prepare_staff_list(config.staff_p2)
-        
-        self.staff_display_g1 = [s.title() for s in self.available_staff_g1]
-        self.staff_display_g2 = [s.title() for s in self.available_staff_g2]
+        # Get available staff (capitalize for display); disabled staff are
+        # filtered out once the setting arrives from the database
+        self.set_available_staff([])
         
         # Create 3 staff comboboxes with autocomplete
         self.staff_vars = []
@@ -249,11 +232,13 @@ class ManualEntryDialog:
             combo.grid(row=i+1, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
             
             # Add autocomplete behavior
-            def make_autocomplete(combo_widget, var_widget, values_list):
+            def make_autocomplete(combo_widget, var_widget, position):
                 def on_keyrelease(event):
                     if event.keysym in ('Return', 'Up', 'Down', 'Next', 'Prior'):
                         return
                     
+                    # Look the list up on each key so it reflects disabled staff
+                    values_list = self.staff_display_g2 if position == 1 else self.staff_display_g1
                     value = var_widget.get()
                     if value == '':
                         combo_widget['values'] = values_list
@@ -278,7 +263,7 @@ class ManualEntryDialog:
 
                 return on_keyrelease
             
-            combo.bind('<KeyRelease>', make_autocomplete(combo, var, current_display_list))
+            combo.bind('<KeyRelease>', make_autocomplete(combo, var, i))
             # Handle Enter to select first option if available or move focus
             def on_enter(event, combo=combo, var=var):
                 values = combo['values']
@@ -345,6 +330,38 @@ class ManualEntryDialog:
         # Pre-fill data if editing (must be after all widgets are created)
         if self.initial_data:
             self.prefill_data()
+        else:
+            # Default procedures from the last saved entry
+            run_read(get_last_used_procedures, callback=self.apply_last_used_procedures)
+        
+        run_read(get_disabled_staff, callback=self.apply_disabled_staff)
+    
+    def set_available_staff(self, disabled_staff):
+        """Build the staff lists shown in the comboboxes, excluding disabled staff."""
+        # Helper to filter and format staff lists
+        def prepare_staff_list(staff_dict):
+            return sorted([k for k in staff_dict.keys() if k not in disabled_staff])
+
+        self.available_staff_g1 = prepare_staff_list(config.staff_p1_p3)
+        self.available_staff_g2 = prepare_staff_list(config.staff_p2)
+        
+        self.staff_display_g1 = [s.title() for s in self.available_staff_g1]
+        self.staff_display_g2 = [s.title() for s in self.available_staff_g2]
+    
+    def apply_disabled_staff(self, disabled_staff):
+        """Callback: drop disabled staff from the comboboxes."""
+        if not self.dialog.winfo_exists():
+            return
+        self.set_available_staff(disabled_staff)
+        self.update_staff_options()
+    
+    def apply_last_used_procedures(self, last_procedures):
+        """Callback: pre-select the last used procedures in empty dropdowns."""
+        if not self.dialog.winfo_exists():
+            return
+        for i, var in enumerate(self.procedure_vars):
+            if not var.get() and i < len(last_procedures) and last_procedures[i]:
+                var.set(last_procedures[i])
     
     def on_date_key_release(self, event):
         """Handle smart date formatting."""
@@ -459,7 +476,7 @@ class ManualEntryDialog:
                 
                 # Get short name
                 staff_short = None
-                for short, full in map_ys_bs.items():
+                for short, full in config.map_ys_bs.items():
                     if full == staff_full:
                         staff_short = short
                         break
@@ -540,8 +557,12 @@ class ManualEntryDialog:
             available = [s for s in source_list if s not in selected or s == current_value]
             combo['values'] = available
     
-    def validate_staff_leave(self):
-        """Validate if selected staff are on leave for the given date/time."""
+    def validate_staff_leave(self, wait=False):
+        """Validate if selected staff are on leave for the given date/time.
+        
+        The database lookup runs in the background unless wait is True
+        (used when saving, where the result is needed right away).
+        """
         try:
             # Get date
             date_str = self.date_entry.get().strip()
@@ -569,8 +590,8 @@ class ManualEntryDialog:
                 self.leave_error_label.config(text="")
                 return
             
-            # Check each selected staff
-            errors = []
+            # Collect selected staff
+            staff_shorts = []
             for var in self.staff_vars:
                 staff_display = var.get().strip()
                 if not staff_display:
@@ -581,25 +602,48 @@ class ManualEntryDialog:
                 staff_short = staff_display.lower()
                 
                 # Check if this is a valid staff key
-                if staff_short not in map_ys_bs:
+                if staff_short not in config.map_ys_bs:
                     continue
-                
-                # Check availability
-                is_available, reason = check_staff_available(staff_short, db_date, time_str)
-                
-                if not is_available:
-                    full_name = map_ys_bs.get(staff_short, staff_short)
-                    errors.append(f"{full_name} nghỉ {reason}")
+                staff_shorts.append(staff_short)
             
-            # Display errors
-            if errors:
-                self.leave_error_label.config(text="⚠️ " + "; ".join(errors))
-            else:
-                self.leave_error_label.config(text="")
+            if wait:
+                self.show_leave_errors(self.collect_leave_errors(db_date, time_str, staff_shorts))
+                return
+            
+            # Only the newest lookup may update the label
+            self._leave_check_token = getattr(self, '_leave_check_token', 0) + 1
+            token = self._leave_check_token
+            
+            def on_checked(errors):
+                if token == self._leave_check_token and self.dialog.winfo_exists():
+                    self.show_leave_errors(errors)
+            
+            run_read(self.collect_leave_errors, db_date, time_str, staff_shorts,
+                     callback=on_checked,
+                     errback=lambda e: on_checked([]))
                 
         except Exception as e:
             # Silently fail validation
             self.leave_error_label.config(text="")
+    
+    def collect_leave_errors(self, db_date, time_str, staff_shorts):
+        """Return a leave message for each staff member who is off at that time."""
+        errors = []
+        for staff_short in staff_shorts:
+            # Check availability
+            is_available, reason = check_staff_available(staff_short, db_date, time_str)
+            
+            if not is_available:
+                full_name = config.map_ys_bs.get(staff_short, staff_short)
+                errors.append(f"{full_name} nghỉ {reason}")
+        return errors
+    
+    def show_leave_errors(self, errors):
+        """Display leave errors below the staff section."""
+        if errors:
+            self.leave_error_label.config(text="⚠️ " + "; ".join(errors))
+        else:
+            self.leave_error_label.config(text="")
         
     def validate_input(self):
         """Validate user input."""
@@ -660,7 +704,7 @@ class ManualEntryDialog:
                  return False
         
         # Check for leave conflicts
-        self.validate_staff_leave() # Ensure label is updated
+        self.validate_staff_leave(wait=True) # Ensure label is updated
         if self.leave_error_label.cget("text"):
              messagebox.showerror("Định Dạng Sai", "Không thể lưu: Nhân viên đang nghỉ.\nVui lòng kiểm tra thông báo lỗi bên dưới mục chọn nhân viên.")
              return False
@@ -723,20 +767,15 @@ class ManualEntryDialog:
                 messagebox.showerror("Định Dạng Sai", error_msg)
                 return
             
-            # Auto-cleanup: Delete entries older than 7 days before saving new data
-            deleted_count = delete_old_manual_entries(days=30)
-            if deleted_count > 0:
-                print(f"Đã xóa {deleted_count} bản ghi cũ hơn 30 ngày")
-            
-            # Save to database
-            save_manual_entry_to_db(
-                patient_id=data['id'],
-                procedures="-".join(procedures),
-                staff="-".join(staff),
-                appointment_date=date_str,
-                appointment_time=time_str,
-                notes=""
-            )
+            # Save to database (old entries are pruned in the background, see retention.py)
+            run_write(save_manual_entry_to_db,
+                      patient_id=data['id'],
+                      procedures="-".join(procedures),
+                      staff="-".join(staff),
+                      appointment_date=date_str,
+                      appointment_time=time_str,
+                      notes="",
+                      errback=lambda e: messagebox.showerror("Lỗi", f"Không thể lưu dữ liệu:\n{str(e)}"))
             
             self.result = data
             
@@ -748,7 +787,7 @@ class ManualEntryDialog:
             ManualEntryDialog.last_used_date = date_str
             
             # Remember procedures for next entry
-            set_last_used_procedures(procedures)
+            run_write(set_last_used_procedures, procedures)
             
             # Continuous Entry: Clear form instead of closing
             # Keep ID and select all for easy overwrite
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Offline OCR benchmark over saved service-row images.
+
+The corpus uses the layout of ocr_samples/: one folder per procedure with the
+row images inside (config.OCR_SAVE_ROWS_DIR produces it; check the labels by
+hand first). Each image goes through a recognizer backend and then
+convert_info_from_text, exactly like a live run, and the result is compared
+with the folder name. No window automation is involved, so this runs headless.
+
+Backends:
+  tesseract      preprocessing + Tesseract (what a cache/template miss costs)
+  tesseract-raw  Tesseract on the unprocessed row
+  template       template matching only (a miss counts as wrong)
+  cache          OCR cache only, seeded from --seed-dir (a miss counts as wrong)
+  pipeline       the full chain used by Tool.recognize_row, with a fresh cache
+
+Example:
+  python ocr_benchmark.py saved_images --backends tesseract,pipeline --repeat 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+from handle_data import convert_info_from_text
+from ocr_cache import OCRCache, OCR_SAMPLES_DIR, read_image
+from ocr_templates import TemplateRecognizer, OCR_TEMPLATES_DIR
+import ocr_service
+import row_recognizer
+from tracing import percentile
+
+BACKENDS = ("tesseract", "tesseract-raw", "template", "cache", "pipeline")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def load_corpus(corpus_dir):
+    """List of (expected procedure, path, image) from '<corpus_dir>/<procedure>/*.png'."""
+    samples = []
+    for label in sorted(os.listdir(corpus_dir)):
+        label_dir = os.path.join(corpus_dir, label)
+        if not os.path.isdir(label_dir) or label == row_recognizer.UNKNOWN_LABEL:
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(label_dir, name)
+            img = read_image(path)
+            if img is None:
+                print(f"Bỏ qua ảnh không đọc được: {path}")
+                continue
+            samples.append((label.lower(), path, img))
+    return samples
+
+
+def make_recognizer(backend, templates_dir, seed_dir):
+    """Return a function img -> text (None for 'no answer') for the backend."""
+    if backend == "tesseract":
+        return lambda img: row_recognizer.ocr_row(img, preprocess=True).strip().lower()
+    if backend == "tesseract-raw":
+        return lambda img: row_recognizer.ocr_row(img, preprocess=False).strip().lower()
+    if backend == "template":
+        recognizer = TemplateRecognizer(templates_dir)
+        print(f"template: {recognizer.load()} mẫu từ {templates_dir}")
+        return lambda img: row_recognizer.match_row(img, recognizer)[0]
+    if backend == "cache":
+        cache = OCRCache(path=os.devnull)
+        print(f"cache: {cache.seed_from_dir(seed_dir)} mẫu từ {seed_dir}")
+        return cache.get
+    if backend == "pipeline":
+        recognizer = TemplateRecognizer(templates_dir)
+        recognizer.load()
+        # Fresh in-memory cache: it fills up while the corpus is processed
+        cache = OCRCache(path=os.devnull)
+        return lambda img: row_recognizer.recognize_row_with_source(img, cache, recognizer)[0]
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def run_backend(backend, samples, repeat, templates_dir, seed_dir):
+    """Recognize every sample repeat times. Returns the result dict for the backend."""
+    recognize = make_recognizer(backend, templates_dir, seed_dir)
+    latencies = []
+    per_label = defaultdict(lambda: {"total": 0, "correct": 0})
+    errors = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for expected, path, img in samples:
+            t0 = time.perf_counter()
+            text = recognize(img)
+            procedure = convert_info_from_text(text)[0] if text else None
+            latencies.append(time.perf_counter() - t0)
+
+            stats = per_label[expected]
+            stats["total"] += 1
+            if procedure == expected:
+                stats["correct"] += 1
+            elif len(errors) < 20:
+                errors.append({"path": path, "expected": expected, "text": text, "procedure": procedure})
+    elapsed = time.perf_counter() - started
+
+    total = sum(s["total"] for s in per_label.values())
+    correct = sum(s["correct"] for s in per_label.values())
+    return {
+        "backend": backend,
+        "images": total,
+        "accuracy": correct / total if total else 0.0,
+        "per_procedure": {label: dict(stats, accuracy=stats["correct"] / stats["total"])
+                          for label, stats in sorted(per_label.items())},
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "throughput": total / elapsed if elapsed > 0 else 0.0,
+        "errors": errors,
+    }
+
+
+def print_result(result):
+    print(f"\n== {result['backend']} ==")
+    print(f"  accuracy   {result['accuracy']:.1%} of {result['images']} rows")
+    print(f"  latency    p50 {result['p50_ms']:.2f} ms   p95 {result['p95_ms']:.2f} ms")
+    print(f"  throughput {result['throughput']:.1f} rows/s")
+    for label, stats in result["per_procedure"].items():
+        print(f"    {label:<12} {stats['correct']:>5}/{stats['total']:<5} {stats['accuracy']:.1%}")
+    for error in result["errors"][:5]:
+        print(f"    sai: {error['path']} -> {error['text']!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure OCR accuracy and latency on saved service-row images."
+    )
+    parser.add_argument("corpus", help="Folder with one sub-folder of row images per procedure")
+    parser.add_argument(
+        "--backends",
+        default=",".join(BACKENDS),
+        help=f"Comma-separated backends to run (default: all of {', '.join(BACKENDS)})",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus per backend")
+    parser.add_argument("--templates-dir", default=OCR_TEMPLATES_DIR)
+    parser.add_argument("--seed-dir", default=OCR_SAMPLES_DIR, help="Labelled samples for the cache backend")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    parser.add_argument(
+        "--min-accuracy",
+        type=float,
+        help="Exit with status 1 if a backend scores below this (0-1)",
+    )
+    parser.add_argument(
+        "--max-p95-ms",
+        type=float,
+        help="Exit with status 1 if a backend's p95 latency is above this",
+    )
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = [b for b in backends if b not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend(s): {', '.join(unknown)}")
+    if not os.path.isdir(args.corpus):
+        parser.error(f"corpus folder not found: {args.corpus}")
+
+    samples = load_corpus(args.corpus)
+    if not samples:
+        print(f"Không có ảnh nào trong {args.corpus}")
+        return 1
+    print(f"{len(samples)} ảnh, {len({s[0] for s in samples})} thủ thuật")
+
+    # Load the OCR engine before timing anything
+    ocr_service.warm_up()
+    results = []
+    try:
+        for backend in backends:
+            result = run_backend(backend, samples, max(1, args.repeat), args.templates_dir, args.seed_dir)
+            print_result(result)
+            results.append(result)
+    finally:
+        ocr_service.shutdown()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi kết quả: {args.json_path}")
+
+    failed = False
+    for result in results:
+        if args.min_accuracy is not None and result["accuracy"] < args.min_accuracy:
+            print(f"FAIL {result['backend']}: accuracy {result['accuracy']:.1%} < {args.min_accuracy:.1%}")
+            failed = True
+        if args.max_p95_ms is not None and result["p95_ms"] > args.max_p95_ms:
+            print(f"FAIL {result['backend']}: p95 {result['p95_ms']:.2f} ms > {args.max_p95_ms} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
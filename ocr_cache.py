@@ -0,0 +1,190 @@
+"""
+Cache of OCR results for captured service rows.
+
+The service list only ever shows a handful of procedure labels, so the same
+row bitmaps come back again and again. Each capture is looked up by an exact
+hash of its pixels and, failing that, by a perceptual difference hash (dHash)
+within a small Hamming distance. Only results that map to a known procedure
+are stored. The cache is LRU-bounded, saved to OCR_CACHE_FILE between runs,
+and can be seeded from labelled sample images.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from handle_data import convert_info_from_text
+
+# In the working directory next to app_data.db, like the database and backups;
+# next to __file__ would be the temporary unpack folder of the one-file build
+OCR_CACHE_FILE = 'ocr_cache.json'
+# Labelled samples: ocr_samples/<procedure>/<any name>.png
+OCR_SAMPLES_DIR = 'ocr_samples'
+CACHE_CAPACITY = 512
+# Rows are wide and short, so the hash grid is too
+HASH_WIDTH = 32
+HASH_HEIGHT = 8
+# Max differing bits (of 256) for two rows to count as the same label
+MAX_HASH_DISTANCE = 6
+
+
+def exact_hash(img):
+    """Hash of the raw pixels and shape."""
+    digest = hashlib.sha1(str(img.shape).encode())
+    digest.update(np.ascontiguousarray(img).tobytes())
+    return digest.hexdigest()
+
+
+def dhash(img, width=HASH_WIDTH, height=HASH_HEIGHT):
+    """Difference hash: horizontal brightness gradient of a (width+1) x height thumbnail."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (width + 1, height), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def read_image(path):
+    """cv2.imread that also works with non-ASCII paths on Windows."""
+    data = np.fromfile(path, dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+class OCRCache:
+    """LRU map from row bitmaps to recognized text."""
+
+    def __init__(self, path=OCR_CACHE_FILE, capacity=CACHE_CAPACITY, max_distance=MAX_HASH_DISTANCE):
+        self.path = path
+        self.capacity = capacity
+        self.max_distance = max_distance
+        # exact hash -> (dhash, text), most recently used last
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, img):
+        """Return cached text for the image, or None."""
+        key = exact_hash(img)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        phash = dhash(img)
+        with self._lock:
+            best_key, best_distance = None, self.max_distance + 1
+            texts_at_best = set()
+            for other_key, (other_hash, other_text) in self._entries.items():
+                distance = bin(phash ^ other_hash).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = other_key, distance
+                    texts_at_best = {other_text}
+                elif distance == best_distance:
+                    texts_at_best.add(other_text)
+            # No close match, or two labels equally close: let OCR decide
+            if best_key is None or len(texts_at_best) > 1:
+                self.misses += 1
+                return None
+            text = self._entries[best_key][1]
+            self._entries.move_to_end(best_key)
+            # Remember this exact bitmap too, so the next lookup is a dict hit
+            self._store(key, phash, text)
+            self.hits += 1
+            return text
+
+    def put(self, img, text):
+        """Cache text for the image if it names a known procedure."""
+        if not text or convert_info_from_text(text)[0] is None:
+            return False
+        with self._lock:
+            self._store(exact_hash(img), dhash(img), text)
+        return True
+
+    def _store(self, key, phash, text):
+        """Caller holds the lock."""
+        self._entries[key] = (phash, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def load(self):
+        """Load entries saved by a previous run. Missing or bad files are ignored."""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Không thể đọc cache OCR: {e}")
+            return 0
+        with self._lock:
+            for key, phash, text in data.get('entries', []):
+                self._entries[key] = (int(phash, 16), text)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._dirty = False
+            return len(self._entries)
+
+    def save(self):
+        """Write the cache to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            entries = [[key, f"{phash:x}", text] for key, (phash, text) in self._entries.items()]
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        return True
+
+    def seed_from_dir(self, samples_dir=OCR_SAMPLES_DIR):
+        """Add labelled samples: one sub-folder per procedure name, images inside."""
+        if not os.path.isdir(samples_dir):
+            return 0
+        count = 0
+        for label in os.listdir(samples_dir):
+            label_dir = os.path.join(samples_dir, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for name in os.listdir(label_dir):
+                img = read_image(os.path.join(label_dir, name))
+                if img is not None and self.put(img, label):
+                    count += 1
+        return count
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Shared cache, loaded from disk and seeded from samples on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache()
+            _cache.load()
+            _cache.seed_from_dir()
+        return _cache
+
+
+def save_cache():
+    """Persist the shared cache (no-op if it was never used)."""
+    if _cache is not None:
+        try:
+            _cache.save()
+        except OSError as e:
+            print(f"Không thể lưu cache OCR: {e}")
@@ -0,0 +1,77 @@
+"""
+Preprocessing of captured service rows before OCR.
+
+The raw row screenshot is mostly background. Tesseract is faster and misreads
+less when it gets only the text: grayscale, binarized (Otsu), cropped to the
+text bounding box and upscaled. Rows with (almost) no contrast are rejected as
+empty before any OCR is attempted.
+"""
+
+import cv2
+import numpy as np
+
+# Rows whose gray levels vary less than this are treated as empty
+EMPTY_ROW_STD = 6.0
+# Upscale factor for the cropped text (Tesseract likes ~30 px high glyphs)
+UPSCALE = 2
+# White border kept around the cropped text
+PADDING = 4
+# Rows/columns darker than this fraction are grid lines, not text
+LINE_FRACTION = 0.8
+
+
+def to_gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def is_empty_row(img, min_std=EMPTY_ROW_STD):
+    """True if the row has no visible text (flat background)."""
+    return float(np.std(to_gray(img))) < min_std
+
+
+def binarize(gray):
+    """Otsu threshold with dark text on a white background."""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Selected rows are drawn light-on-dark; make the text dark
+    if np.mean(binary) < 127:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def text_box(binary):
+    """Bounding box (x, y, w, h) of the dark pixels of a binarized image. None if there are none."""
+    ink = cv2.bitwise_not(binary)
+    # Ignore cell borders so they don't stretch the box to the whole row
+    ink[np.mean(ink, axis=1) > 255 * LINE_FRACTION, :] = 0
+    ink[:, np.mean(ink, axis=0) > 255 * LINE_FRACTION] = 0
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return None
+    return cv2.boundingRect(points)
+
+
+def crop_to_text(binary, padding=PADDING):
+    """Crop a binarized image to the bounding box of its dark pixels. None if there are none."""
+    box = text_box(binary)
+    if box is None:
+        return None
+    x, y, w, h = box
+    cropped = binary[y:y + h, x:x + w]
+    return cv2.copyMakeBorder(cropped, padding, padding, padding, padding,
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+def preprocess_for_ocr(img, scale=UPSCALE):
+    """
+    Turn a captured row into a small, clean image for Tesseract.
+    Returns None if the row is empty.
+    """
+    gray = to_gray(img)
+    if is_empty_row(gray):
+        return None
+    text = crop_to_text(binarize(gray))
+    if text is None:
+        return None
+    if scale != 1:
+        text = cv2.resize(text, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    return text
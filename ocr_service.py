@@ -0,0 +1,115 @@
+"""
+OCR with a long-lived Tesseract engine.
+
+pytesseract.image_to_string starts a new tesseract process and loads the 'vie'
+model on every call. When the optional tesserocr package is installed, this
+module keeps a small pool of initialized tesserocr APIs instead (the model is
+loaded once per API), so a recognition is just the OCR itself. Without
+tesserocr it falls back to pytesseract.
+"""
+
+import os
+import queue
+import threading
+
+import cv2
+import pytesseract
+
+try:
+    import tesserocr
+    from PIL import Image
+except ImportError:
+    tesserocr = None
+
+OCR_LANG = 'vie'
+# Page segmentation mode 7: the image is a single text line (one service row)
+OCR_PSM = 7
+# One API per OCR worker thread (a tesserocr API is not thread-safe)
+POOL_SIZE = 4
+
+
+class TesseractPool:
+    """A fixed set of tesserocr APIs, each used by one thread at a time."""
+
+    def __init__(self, lang=OCR_LANG, size=POOL_SIZE, path=None):
+        self.lang = lang
+        self.size = size
+        self.path = path or os.environ.get('TESSDATA_PREFIX')
+        self._apis = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_api(self):
+        if self.path:
+            return tesserocr.PyTessBaseAPI(path=self.path, lang=self.lang, psm=OCR_PSM)
+        return tesserocr.PyTessBaseAPI(lang=self.lang, psm=OCR_PSM)
+
+    def _acquire(self):
+        # Create APIs lazily, up to size; then wait for a free one
+        with self._lock:
+            if self._apis.empty() and self._created < self.size:
+                self._created += 1
+                return self._new_api()
+        return self._apis.get()
+
+    def image_to_string(self, img_bgr):
+        api = self._acquire()
+        try:
+            if img_bgr.ndim == 2:
+                image = Image.fromarray(img_bgr)
+            else:
+                image = Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            self._apis.put(api)
+
+    def close(self):
+        while not self._apis.empty():
+            self._apis.get().End()
+
+
+_pool = None
+_pool_failed = False
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Return the shared tesserocr pool, or None if tesserocr is unavailable."""
+    global _pool, _pool_failed
+    if tesserocr is None or _pool_failed:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            try:
+                pool = TesseractPool()
+                # Load one API now so a missing model fails here, not mid-run
+                pool._apis.put(pool._acquire())
+                _pool = pool
+            except Exception as e:
+                print(f"tesserocr không khả dụng, dùng pytesseract: {e}")
+                _pool_failed = True
+                return None
+        return _pool
+
+
+def warm_up():
+    """Load the OCR engine ahead of the first recognition (optional)."""
+    return _get_pool() is not None
+
+
+def image_to_string(img_bgr, lang=OCR_LANG):
+    """OCR a single-line BGR or grayscale image. Uses the persistent engine when available."""
+    pool = _get_pool() if lang == OCR_LANG else None
+    if pool is not None:
+        return pool.image_to_string(img_bgr)
+    return pytesseract.image_to_string(img_bgr, lang=lang, config=f'--psm {OCR_PSM}')
+
+
+def shutdown():
+    """Release the tesserocr APIs (call on exit)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
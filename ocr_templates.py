@@ -0,0 +1,185 @@
+"""
+Template-matching recognizer for procedure labels.
+
+The service rows only show the few procedures in config.thu_thuat_dur_mapper,
+so a captured row can be compared against a stored picture of each label with
+cv2.matchTemplate instead of running OCR. Templates live in OCR_TEMPLATES_DIR
+as '<procedure>.png' (more than one per procedure: '<procedure>_2.png', ...).
+If no template matches with at least MATCH_THRESHOLD, the caller falls back to
+Tesseract.
+
+No templates ship with the program; they are cut from labelled row images
+(the ocr_samples/ layout, e.g. a checked config.OCR_SAVE_ROWS_DIR folder):
+
+  python ocr_templates.py ocr_samples
+"""
+
+import argparse
+import os
+import sys
+import threading
+
+import cv2
+
+import config
+from ocr_cache import OCR_SAMPLES_DIR, read_image
+from ocr_preprocess import binarize, is_empty_row, text_box
+
+# In the working directory next to app_data.db, not in the one-file bundle
+OCR_TEMPLATES_DIR = 'ocr_templates'
+# Normalized correlation needed to trust a match (1.0 = identical)
+MATCH_THRESHOLD = 0.9
+# Templates kept per procedure by build_templates
+MAX_TEMPLATES_PER_LABEL = 4
+# Background kept around the text of a template
+TEMPLATE_PADDING = 2
+
+
+def _gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def label_from_filename(filename):
+    """'điện_2.png' -> 'điện'."""
+    stem = os.path.splitext(filename)[0]
+    return stem.split('_')[0].lower()
+
+
+class TemplateRecognizer:
+    """Matches a row image against label templates."""
+
+    def __init__(self, templates_dir=OCR_TEMPLATES_DIR, threshold=MATCH_THRESHOLD):
+        self.templates_dir = templates_dir
+        self.threshold = threshold
+        # list of (label, grayscale template)
+        self.templates = []
+
+    def load(self):
+        """Load templates of known procedures. Returns how many were loaded."""
+        self.templates = []
+        if not os.path.isdir(self.templates_dir):
+            return 0
+        for name in sorted(os.listdir(self.templates_dir)):
+            label = label_from_filename(name)
+            if label not in config.thu_thuat_dur_mapper:
+                print(f"Bỏ qua mẫu không rõ thủ thuật: {name}")
+                continue
+            img = read_image(os.path.join(self.templates_dir, name))
+            if img is not None:
+                self.templates.append((label, _gray(img)))
+        return len(self.templates)
+
+    def match(self, img):
+        """Return (label, score) of the best template, or (None, best score)."""
+        row = _gray(img)
+        best_label, best_score = None, 0.0
+        for label, template in self.templates:
+            if template.shape[0] > row.shape[0] or template.shape[1] > row.shape[1]:
+                continue
+            result = cv2.matchTemplate(row, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, _ = cv2.minMaxLoc(result)
+            if score > best_score:
+                best_label, best_score = label, score
+        if best_score < self.threshold:
+            return None, best_score
+        return best_label, best_score
+
+    def add_template(self, label, img):
+        """Save img as a new template for label and start using it."""
+        os.makedirs(self.templates_dir, exist_ok=True)
+        index = 1
+        path = os.path.join(self.templates_dir, f"{label}.png")
+        while os.path.exists(path):
+            index += 1
+            path = os.path.join(self.templates_dir, f"{label}_{index}.png")
+        ok, data = cv2.imencode(".png", img)
+        if ok:
+            data.tofile(path)
+            self.templates.append((label, _gray(img)))
+        return path
+
+
+def template_from_row(img, padding=TEMPLATE_PADDING):
+    """The text part of a row image, to use as a template. None if the row is empty."""
+    gray = _gray(img)
+    if is_empty_row(gray):
+        return None
+    box = text_box(binarize(gray))
+    if box is None:
+        return None
+    x, y, w, h = box
+    top, left = max(0, y - padding), max(0, x - padding)
+    return img[top:y + h + padding, left:x + w + padding].copy()
+
+
+def build_templates(samples_dir=OCR_SAMPLES_DIR, templates_dir=OCR_TEMPLATES_DIR,
+                    max_per_label=MAX_TEMPLATES_PER_LABEL):
+    """
+    Add templates from labelled rows ('<samples_dir>/<procedure>/*.png').
+    A row becomes a template only if no template of its procedure matches it
+    yet, so the few kept cover the looks that occur (selected, unselected, ...).
+    Rows that already match another procedure are reported and skipped.
+    Returns {procedure: templates added}.
+    """
+    recognizer = TemplateRecognizer(templates_dir)
+    recognizer.load()
+    added = {}
+    for label in sorted(os.listdir(samples_dir)):
+        label_dir = os.path.join(samples_dir, label)
+        if not os.path.isdir(label_dir) or label.lower() not in config.thu_thuat_dur_mapper:
+            continue
+        label = label.lower()
+        for name in sorted(os.listdir(label_dir)):
+            if sum(1 for l, _ in recognizer.templates if l == label) >= max_per_label:
+                break
+            img = read_image(os.path.join(label_dir, name))
+            if img is None:
+                continue
+            matched, _ = recognizer.match(img)
+            if matched == label:
+                continue
+            if matched is not None:
+                print(f"Bỏ qua {os.path.join(label_dir, name)}: giống mẫu '{matched}'")
+                continue
+            template = template_from_row(img)
+            if template is not None:
+                recognizer.add_template(label, template)
+                added[label] = added.get(label, 0) + 1
+    return added
+
+
+_recognizer = None
+_recognizer_lock = threading.Lock()
+
+
+def get_recognizer():
+    """Shared recognizer with templates loaded on first use."""
+    global _recognizer
+    with _recognizer_lock:
+        if _recognizer is None:
+            _recognizer = TemplateRecognizer()
+            _recognizer.load()
+        return _recognizer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cut label templates for the OCR template stage from labelled row images."
+    )
+    parser.add_argument("samples", nargs="?", default=OCR_SAMPLES_DIR,
+                        help="Folder with one sub-folder of row images per procedure")
+    parser.add_argument("--templates-dir", default=OCR_TEMPLATES_DIR)
+    parser.add_argument("--max-per-label", type=int, default=MAX_TEMPLATES_PER_LABEL)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.samples):
+        parser.error(f"samples folder not found: {args.samples}")
+    added = build_templates(args.samples, args.templates_dir, args.max_per_label)
+    for label, count in sorted(added.items()):
+        print(f"  {label:<12} +{count}")
+    print(f"Đã thêm {sum(added.values())} mẫu vào {args.templates_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
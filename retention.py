@@ -0,0 +1,50 @@
+"""
+Background retention for the manual_entries table.
+
+Old manual entries are pruned on a timer from the database writer thread
+instead of in the save path. Deletes run in small batches and the freed pages
+are returned with incremental vacuum so app_data.db does not keep growing.
+"""
+
+from database import delete_old_manual_entries, enable_incremental_vacuum, incremental_vacuum
+from db_executor import PeriodicJob, run_write
+
+# Keep manual entries for this many days
+RETENTION_DAYS = 30
+# Rows deleted per transaction
+RETENTION_BATCH_SIZE = 200
+# Free pages released per run
+VACUUM_PAGES = 200
+# First run shortly after startup, then every hour
+FIRST_RUN_DELAY_MS = 15 * 1000
+RUN_INTERVAL_MS = 60 * 60 * 1000
+
+
+def run_retention(days=RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE, vacuum_pages=VACUUM_PAGES):
+    """
+    Prune old manual entries and release free pages.
+    Returns (deleted_count, free_pages_left).
+    """
+    enable_incremental_vacuum()
+    deleted_count = delete_old_manual_entries(days=days, batch_size=batch_size)
+    free_pages = incremental_vacuum(vacuum_pages)
+    return deleted_count, free_pages
+
+
+class RetentionScheduler(PeriodicJob):
+    """Runs run_retention() periodically on the database writer thread."""
+
+    name = "Retention"
+
+    def __init__(self, root, days=RETENTION_DAYS, interval_ms=RUN_INTERVAL_MS,
+                 first_delay_ms=FIRST_RUN_DELAY_MS, log=print):
+        super().__init__(root, interval_ms, first_delay_ms, log)
+        self.days = days
+
+    def submit(self, callback, errback):
+        run_write(run_retention, self.days, callback=callback, errback=errback)
+
+    def report(self, result):
+        deleted_count, free_pages = result
+        if deleted_count > 0:
+            self.log(f"Đã xóa {deleted_count} bản ghi cũ hơn {self.days} ngày")
@@ -0,0 +1,113 @@
+"""
+Recognition of a captured service row, without any window automation.
+
+This is what Tool.extract_text does after the screenshot: empty-row check,
+cache lookup, template match, then Tesseract. It lives here so the same code
+can run headless (ocr_benchmark.py) on saved row images.
+
+When config.OCR_SAVE_ROWS_DIR is set, every recognized row is also written to
+'<dir>/<recognized label>/<time>.png'. After the labels are checked by hand the
+folder is a benchmark corpus (and can seed the OCR cache like ocr_samples/).
+"""
+
+import os
+import threading
+from datetime import datetime
+
+import cv2
+
+import config
+import ocr_service
+from handle_data import convert_info_from_text
+from ocr_cache import get_cache
+from ocr_templates import get_recognizer
+from ocr_preprocess import is_empty_row, preprocess_for_ocr
+from tracing import traced
+
+# How a row was recognized (second value of recognize_row_with_source)
+SOURCE_EMPTY = "empty"
+SOURCE_CACHE = "cache"
+SOURCE_TEMPLATE = "template"
+SOURCE_OCR = "ocr"
+SOURCE_FALLBACK = "fallback"
+
+# Folder for rows whose text is not a known procedure
+UNKNOWN_LABEL = "_unknown"
+
+_save_lock = threading.Lock()
+_save_count = 0
+
+
+@traced("template")
+def match_row(img, recognizer=None):
+    """(label, score) of the best template match, label None below the threshold."""
+    return (recognizer or get_recognizer()).match(img)
+
+
+@traced("ocr")
+def ocr_row(img, preprocess=True):
+    """Raw Tesseract text of a row ('' if nothing was read)."""
+    if preprocess:
+        img = preprocess_for_ocr(img)
+        if img is None:
+            return ""
+    return ocr_service.image_to_string(img)
+
+
+def recognize_row_with_source(img, cache=None, recognizer=None):
+    """
+    Recognize a row image. Returns (text, source); text is "" for an empty row.
+    cache / recognizer default to the shared ones.
+    """
+    if is_empty_row(img):
+        return "", SOURCE_EMPTY
+    cache = cache or get_cache()
+    text = cache.get(img)
+    if text is not None:
+        return text, SOURCE_CACHE
+    # A confident template match gives the procedure name directly
+    label, score = match_row(img, recognizer)
+    if label is not None:
+        return label, SOURCE_TEMPLATE
+    prepared = preprocess_for_ocr(img)
+    if prepared is None:
+        # Only the cell borders: no text once the grid lines are removed
+        return "", SOURCE_EMPTY
+    text = ocr_row(prepared, preprocess=False)
+    if text == "":
+        # Tesseract reads nothing on the 'cứu' row; don't cache the guess
+        return "cứu", SOURCE_FALLBACK
+    text = text.strip().lower()
+    cache.put(img, text)
+    return text, SOURCE_OCR
+
+
+def recognize_row(img):
+    """Recognized text of a row ("" if empty). Safe to call from worker threads."""
+    text, source = recognize_row_with_source(img)
+    save_dir = getattr(config, "OCR_SAVE_ROWS_DIR", None)
+    if save_dir and source != SOURCE_EMPTY:
+        save_row(img, text, save_dir)
+    return text
+
+
+def save_row(img, text, save_dir):
+    """Write img to '<save_dir>/<procedure>/<time>.png'. Returns the path or None."""
+    global _save_count
+    label = convert_info_from_text(text)[0] if text else None
+    label_dir = os.path.join(save_dir, label or UNKNOWN_LABEL)
+    with _save_lock:
+        _save_count += 1
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{_save_count}.png"
+    try:
+        os.makedirs(label_dir, exist_ok=True)
+        ok, data = cv2.imencode(".png", img)
+        if not ok:
+            return None
+        path = os.path.join(label_dir, name)
+        # tofile: cv2.imwrite can't handle the Vietnamese folder names on Windows
+        data.tofile(path)
+        return path
+    except OSError as e:
+        print(f"Không thể lưu ảnh dòng dịch vụ: {e}")
+        return None
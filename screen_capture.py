@@ -0,0 +1,52 @@
+"""
+Screen region capture.
+
+pyautogui.screenshot(region=...) grabs the whole screen and crops it. When the
+optional mss package is installed, only the requested region is copied, and
+the result comes back as a NumPy array without going through PIL. Both paths
+return BGR arrays, the format the OCR code works with.
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+# mss instances hold a device context and must not be shared between threads
+_local = threading.local()
+
+
+def _get_mss():
+    sct = getattr(_local, "sct", None)
+    if sct is None:
+        sct = mss.mss()
+        _local.sct = sct
+    return sct
+
+
+def grab_region(region):
+    """Capture region (left, top, width, height) of the screen as a BGR array."""
+    left, top, width, height = region
+    if mss is not None:
+        shot = _get_mss().grab({"left": left, "top": top, "width": width, "height": height})
+        # BGRA -> BGR as a view, no copy
+        return np.asarray(shot)[:, :, :3]
+    import pyautogui
+    screenshot = pyautogui.screenshot(region=region)
+    return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+
+
+
+def slice_region(image, image_origin, rect):
+    """
+    Return the part of image covering rect (left, top, right, bottom) in screen
+    coordinates, as a NumPy view. image_origin is the screen position of image[0, 0].
+    """
+    x0, y0 = image_origin
+    left, top, right, bottom = rect
+    return image[top - y0:bottom - y0, left - x0:right - x0]
@@ -0,0 +1,225 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import database
+from action_plan import optimize_actions
+from handle_data import create_data_from_manual_input, read_leave_roster, read_manual_entries_csv
+
+
+def manual_entry(patient_id, notes=""):
+    return {'patient_id': patient_id, 'procedures': "điện-cứu", 'staff': "hiền-hoà",
+            'appointment_date': "16-12-2025", 'appointment_time': "09:00", 'notes': notes}
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Every test gets its own empty database file."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved_file = database.DATABASE_FILE
+        database.DATABASE_FILE = os.path.join(self.directory, "app_data.db")
+
+    def tearDown(self):
+        database.DATABASE_FILE = self.saved_file
+        shutil.rmtree(self.directory)
+
+    def execute(self, sql, params=()):
+        conn = sqlite3.connect(database.DATABASE_FILE)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+
+class BulkInsertTest(DatabaseTestCase):
+
+    def test_manual_entries_ids_follow_input_order(self):
+        first = database.save_manual_entry_to_db("1", "điện", "hiền", "16-12-2025", "09:00")
+        ids = database.save_manual_entries_bulk([manual_entry(str(i)) for i in range(2, 7)])
+        self.assertEqual(ids, list(range(first + 1, first + 6)))
+        entries = {e['id']: e['patient_id'] for e in database.load_manual_entries_from_db()}
+        self.assertEqual([entries[i] for i in ids], ["2", "3", "4", "5", "6"])
+
+    def test_leave_ids(self):
+        leaves = [{'staff_short_name': "hiền", 'leave_date': f"2025-12-{day:02d}", 'session': "morning"}
+                  for day in range(1, 4)]
+        ids = database.add_doctor_leaves_bulk(leaves)
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(ids, list(range(ids[0], ids[0] + 3)))
+        weekly = database.add_weekly_leaves_bulk([
+            {'staff_short_name': "hiền", 'day_of_week': 0, 'session': "full_day", 'reason': "họp"}])
+        self.assertEqual(len(weekly), 1)
+        self.assertEqual(database.get_all_weekly_leaves()[0]['reason'], "họp")
+
+    def test_empty_and_failed_batches(self):
+        self.assertEqual(database.save_manual_entries_bulk([]), [])
+        with self.assertRaises(KeyError):
+            database.save_manual_entries_bulk([manual_entry("1"), {'patient_id': "2"}])
+        # Rows are built before the transaction, so nothing was written
+        self.assertEqual(database.load_manual_entries_from_db(), [])
+
+
+class ImportFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        path = os.path.join(self.directory, "import.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_manual_entries_csv(self):
+        path = self.write("123;điện-cứu;\n7:39;hiền-hoà;19-12-25\n13:05;hoà-hiền;20-12-2025\n\n456;xoa;\n8:00;hiền;21-12-25\n")
+        entries, errors = read_manual_entries_csv(path)
+        self.assertEqual(errors, [])
+        self.assertEqual([(e['patient_id'], e['appointment_date'], e['appointment_time']) for e in entries],
+                         [("123", "19-12-2025", "07:39"), ("123", "20-12-2025", "13:05"),
+                          ("456", "21-12-2025", "08:00")])
+        self.assertEqual(entries[2]['procedures'], "xoa")
+
+    def test_leave_roster(self):
+        short_name, full_name = next(iter(config.map_ys_bs.items()))
+        path = self.write(f"# nhân viên;ngày;buổi;lý do\n{short_name};24-12-2025;Sáng;phép\n"
+                          f"{full_name};Thứ 7;cả ngày\nai đó;24-12-2025;Sáng\n{short_name};32-12-2025;Chiều\n")
+        leaves, weekly, errors = read_leave_roster(path)
+        self.assertEqual(leaves, [{'staff_short_name': short_name, 'leave_date': "2025-12-24",
+                                   'session': "morning", 'reason': "phép"}])
+        self.assertEqual(weekly, [{'staff_short_name': short_name, 'day_of_week': 5,
+                                   'session': "full_day", 'reason': ""}])
+        self.assertEqual(len(errors), 2)
+
+
+class AppointmentsTest(DatabaseTestCase):
+
+    def records(self, day, patient_ids):
+        staff = list(config.map_ys_bs)[:3]
+        return [create_data_from_manual_input(pid, ["điện", "thủy"], staff, day, "09:00")
+                for pid in patient_ids]
+
+    def test_round_trip(self):
+        records = self.records("16-12-2025", ["1"]) + self.records("17-12-2025", ["2"])
+        ids = database.save_appointments(records)
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(database.load_appointments("16-12-2025", "17-12-2025"), records)
+        self.assertEqual(database.load_appointments("2025-12-17", "2025-12-17"), records[1:])
+        staff = records[0]['thu_thuats'][0]['Nguoi Thuc Hien']
+        self.assertEqual(database.load_appointments(staff=staff)[0]['id'], "1")
+
+    def test_replace_range(self):
+        database.save_appointments(self.records("16-12-2025", ["1", "2"]))
+        database.save_appointments(self.records("20-12-2025", ["9"]))
+        database.save_appointments(self.records("16-12-2025", ["3"]), source="csv")
+        database.save_appointments(self.records("16-12-2025", ["4"]),
+                                   replace_range=("15-12-2025", "17-12-2025"))
+        ids = [r['id'] for r in database.load_appointments()]
+        # Only auto_schedule rows inside the range were replaced
+        self.assertEqual(sorted(ids), ["3", "4", "9"])
+
+
+class HistoryTest(DatabaseTestCase):
+
+    def test_keyset_pages(self):
+        ids = database.save_manual_entries_bulk([manual_entry(str(i)) for i in range(7)])
+        # Same created_at for some rows: the id breaks the tie
+        self.execute("UPDATE manual_entries SET created_at = '2025-12-01 08:00:00' WHERE id <= ?", (ids[3],))
+        seen = []
+        cursor = None
+        while True:
+            entries, cursor = database.load_manual_entries_page(before=cursor, limit=3)
+            seen.extend(e['id'] for e in entries)
+            if cursor is None:
+                break
+            self.assertEqual(cursor, (entries[-1]['created_at'], entries[-1]['id']))
+        self.assertEqual(sorted(seen), ids)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(seen[-4:], list(reversed(ids[:4])))
+
+    def test_since(self):
+        ids = database.save_manual_entries_bulk([manual_entry("1"), manual_entry("2")])
+        self.execute("UPDATE manual_entries SET created_at = '2020-01-01 00:00:00' WHERE id = ?", (ids[0],))
+        entries, cursor = database.load_manual_entries_page(since="2024-01-01 00:00:00")
+        self.assertEqual([e['id'] for e in entries], [ids[1]])
+        self.assertIsNone(cursor)
+
+    def test_retention_batches(self):
+        ids = database.save_manual_entries_bulk([manual_entry(str(i)) for i in range(7)])
+        self.execute("UPDATE manual_entries SET created_at = '2020-01-01 00:00:00' WHERE id <= ?", (ids[4],))
+        self.assertEqual(database.delete_old_manual_entries(days=30, batch_size=2), 5)
+        self.assertEqual([e['id'] for e in database.load_manual_entries_from_db()], list(reversed(ids[5:])))
+
+
+class SearchTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.saved_fts = database._fts5_available
+        database.save_manual_entries_bulk([manual_entry("2505012345", notes="Tái khám"),
+                                           manual_entry("2505099999")])
+
+    def tearDown(self):
+        database._fts5_available = self.saved_fts
+        super().tearDown()
+
+    def test_fts(self):
+        if not database._fts5_available:
+            self.skipTest("SQLite built without FTS5")
+        self.assertEqual([e['patient_id'] for e in database.search_entries("25050123")], ["2505012345"])
+        # Accents are ignored and every word must match
+        self.assertEqual(len(database.search_entries("tai kham")), 1)
+        self.assertEqual(len(database.search_entries("hien")), 2)
+        self.assertEqual(database.search_entries("hien khong"), [])
+        self.assertEqual(database.search_entries("  "), [])
+
+    def test_like_fallback(self):
+        # As on a build without FTS5: no index, and it is not created again
+        database._fts5_available = False
+        conn = sqlite3.connect(database.DATABASE_FILE)
+        for trigger in ("ai", "ad", "au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS manual_entries_fts_{trigger}")
+        conn.execute("DROP TABLE IF EXISTS manual_entries_fts")
+        conn.commit()
+        conn.close()
+        self.assertEqual([e['patient_id'] for e in database.search_entries("5099")], ["2505099999"])
+        self.assertEqual(len(database.search_entries("Tái")), 1)
+
+
+class OptimizeActionsTest(unittest.TestCase):
+
+    def test_waits_are_merged(self):
+        actions = [
+            {"kind": "click", "coords": [1, 2]},
+            {"kind": "wait", "key": "click", "timeout": 0.1},
+            {"kind": "wait", "key": "type", "timeout": 0.3},
+            {"kind": "wait", "key": "arrow", "timeout": 0.2},
+            {"kind": "wait", "key": "none", "timeout": 0},
+            {"kind": "keys", "keys": "abc"},
+            {"kind": "wait", "key": "type", "timeout": 0},
+            {"kind": "wait_for", "key": "suggestions", "timeout": 0.1},
+        ]
+        self.assertEqual(optimize_actions(actions), [
+            {"kind": "click", "coords": [1, 2]},
+            {"kind": "wait", "key": "type", "timeout": 0.3},
+            {"kind": "keys", "keys": "abc"},
+            {"kind": "wait_for", "key": "suggestions", "timeout": 0.1},
+        ])
+
+    def test_service_rows_are_optimized(self):
+        rows = {"điện": [{"kind": "wait", "key": "a", "timeout": 0.1},
+                         {"kind": "wait", "key": "b", "timeout": 0.1}]}
+        result = optimize_actions([{"kind": "services", "rows": rows}])
+        self.assertEqual(result[0]["rows"]["điện"], [{"kind": "wait", "key": "b", "timeout": 0.1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import his_simulator
+import row_recognizer
+from ocr_cache import OCRCache, get_cache
+from input_backend import RecordingInput
+from ocr_preprocess import EMPTY_ROW_STD
+from tool import Tool
+from waits import Waiter
+
+
+def setUpModule():
+    # Never open or migrate the tracked app_data.db
+    his_simulator.use_temp_database()
+
+
+class SimulatedHISTest(unittest.TestCase):
+
+    def run_patients(self, count, **kwargs):
+        patients = his_simulator.make_patients(count, seed=1)
+        his = his_simulator.SimulatedHIS(patients)
+        his.seed_ocr_cache(get_cache())
+        with contextlib.redirect_stdout(io.StringIO()):
+            return his_simulator.run_benchmark(patients, his, **kwargs)
+
+    def test_all_procedures_saved(self):
+        result = self.run_patients(3)
+        self.assertEqual(result["errors"], [])
+        self.assertEqual(result["patients"], 3)
+
+    def test_arrow_mode(self):
+        result = self.run_patients(2, arrow_mode=True)
+        self.assertEqual(result["errors"], [])
+
+    def test_replayed_plans(self):
+        result = self.run_patients(3, use_plans=True)
+        self.assertEqual(result["errors"], [])
+
+    def test_input_while_busy_is_reported(self):
+        his = his_simulator.SimulatedHIS([], reload_latency=10)
+        his.busy_until = float("inf")
+        his.click(None, his._point('ID_BOX'))
+        his.send_keys("123")
+        self.assertEqual(his.focus, None)
+        self.assertEqual(len(his.problems), 2)
+
+    def test_empty_row_below_list_is_empty(self):
+        patients = his_simulator.make_patients(1, seed=1)
+        his = his_simulator.SimulatedHIS(patients)
+        his.grid = his.rows[next(iter(his.rows))][:1]
+        left, top, right, bottom = his.element_rect(*his._point_of_row(1))
+        self.assertEqual((right - left, bottom - top),
+                         (his_simulator.ROW_WIDTH, his_simulator.ROW_HEIGHT))
+        img = his.grab((left, top, right - left, bottom - top))
+        # The cell border is drawn, so the image is not blank
+        self.assertGreater(img.std(), EMPTY_ROW_STD)
+        text, source = row_recognizer.recognize_row_with_source(img, OCRCache(path=None))
+        self.assertEqual((text, source), ("", row_recognizer.SOURCE_EMPTY))
+
+    def test_capture_grid_takes_one_screenshot(self):
+        patients = his_simulator.make_patients(1, seed=1)
+        his = his_simulator.SimulatedHIS(patients)
+        his.grid = his.rows[next(iter(his.rows))][:2]
+        recorder = RecordingInput(his)
+        tool = Tool(app=None, dlg=his.window, waiter=Waiter(his.window), input=recorder)
+        with contextlib.redirect_stdout(io.StringIO()):
+            images = tool.capture_grid()
+        self.assertEqual(recorder.counts()["grab"], 1)
+        self.assertEqual(len(images), len(his_simulator.config.DICH_VU_THU_THUAT))
+        cache = OCRCache(path=None)
+        his.seed_ocr_cache(cache)
+        texts = [row_recognizer.recognize_row_with_source(img, cache)[0] for img in images]
+        self.assertEqual(texts[:2], his.grid)
+        self.assertEqual(texts[2:], [""] * (len(images) - 2))
+
+    def test_capture_grid_stops_at_missing_row(self):
+        his = his_simulator.SimulatedHIS([])
+        # A grid that shows no empty cells: below the list is the grid background
+        def element_rect(x, y):
+            row = his._row_at(x, y, rows=2)
+            return his._grid_rect() if row is None else his._row_rect(row)
+        his.element_rect = element_rect
+        tool = Tool(app=None, dlg=his.window, waiter=Waiter(his.window), input=his)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(len(tool.capture_grid()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handle_data import convert_info_from_text, match_procedure
+
+
+class ProcedureMatcherTest(unittest.TestCase):
+
+    def name(self, text):
+        return convert_info_from_text(text)[0]
+
+    def test_exact_and_folded(self):
+        self.assertEqual(match_procedure("điện"), ("điện", 1.0))
+        self.assertEqual(self.name("Điện châm"), "điện")
+        self.assertEqual(self.name("thuỷ châm"), "thủy")
+        self.assertEqual(self.name("Xoa bop bam huyet"), "xoa")
+
+    def test_leftmost_name_wins(self):
+        self.assertEqual(self.name("cứu ngải, sau đó điện châm"), "cứu")
+
+    def test_ocr_typos_in_label(self):
+        self.assertEqual(self.name("dlện châm"), "điện")
+        self.assertEqual(self.name("thủv châm"), "thủy")
+        self.assertEqual(self.name("1 Glác hơi"), "giác")
+        self.assertEqual(self.name("Dlen cham (30 phút)"), "điện")
+
+    def test_other_words_do_not_match(self):
+        for text in ("điều trị", "giảm đau", "cấu", "điều", "giảm", "kiểm tra", "dịch vụ khám", ""):
+            self.assertIsNone(self.name(text), text)
+
+    def test_too_many_typos(self):
+        self.assertIsNone(self.name("dlen chan"))
+        self.assertEqual(match_procedure("dlện chấn"), (None, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
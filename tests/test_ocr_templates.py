@@ -0,0 +1,56 @@
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import his_simulator
+from ocr_templates import TemplateRecognizer, build_templates
+
+
+class BuildTemplatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.samples_dir = os.path.join(self.root, "samples")
+        self.templates_dir = os.path.join(self.root, "templates")
+        self.his = his_simulator.SimulatedHIS([])
+        for name in config.thu_thuat_dur_mapper:
+            label_dir = os.path.join(self.samples_dir, name)
+            os.makedirs(label_dir)
+            for i, selected in enumerate((False, True, False)):
+                ok, data = cv2.imencode(".png", self.his._row_tile(name, selected))
+                data.tofile(os.path.join(label_dir, f"{i}.png"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_templates_recognize_rows(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            added = build_templates(self.samples_dir, self.templates_dir)
+        # The selected and repeated rows already match the first template
+        self.assertEqual(added, {name: 1 for name in config.thu_thuat_dur_mapper})
+
+        recognizer = TemplateRecognizer(self.templates_dir)
+        self.assertEqual(recognizer.load(), len(config.thu_thuat_dur_mapper))
+        for name in config.thu_thuat_dur_mapper:
+            for selected in (False, True):
+                label, score = recognizer.match(self.his._row_tile(name, selected))
+                self.assertEqual(label, name)
+        self.assertEqual(recognizer.match(self.his._row_tile(None, False))[0], None)
+
+    def test_rebuild_adds_nothing(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_templates(self.samples_dir, self.templates_dir)
+            self.assertEqual(build_templates(self.samples_dir, self.templates_dir), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
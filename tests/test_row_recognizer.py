@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import row_recognizer
+from ocr_cache import OCRCache
+from ocr_preprocess import EMPTY_ROW_STD
+
+
+class NoTemplates:
+    def match(self, img):
+        return None, 0.0
+
+
+def bordered_row(height=18, width=300):
+    """A white grid cell with a gray border, as the HIS draws an empty row."""
+    img = np.full((height, width, 3), 255, np.uint8)
+    cv2.rectangle(img, (0, 0), (width - 1, height - 1), (200, 200, 200), 1)
+    return img
+
+
+class RecognizeRowTest(unittest.TestCase):
+
+    def recognize(self, img, ocr_text=""):
+        cache = OCRCache(path=None)
+        with mock.patch.object(row_recognizer.ocr_service, "image_to_string",
+                               return_value=ocr_text) as ocr:
+            result = row_recognizer.recognize_row_with_source(img, cache, NoTemplates())
+        return result, ocr
+
+    def test_blank_row_is_empty(self):
+        img = np.full((18, 300, 3), 255, np.uint8)
+        (text, source), ocr = self.recognize(img)
+        self.assertEqual((text, source), ("", row_recognizer.SOURCE_EMPTY))
+        ocr.assert_not_called()
+
+    def test_bordered_blank_row_is_empty(self):
+        img = bordered_row()
+        self.assertGreater(img.std(), EMPTY_ROW_STD)
+        (text, source), ocr = self.recognize(img)
+        self.assertEqual((text, source), ("", row_recognizer.SOURCE_EMPTY))
+        ocr.assert_not_called()
+
+    def test_unread_text_falls_back(self):
+        img = bordered_row()
+        cv2.putText(img, "cuu", (10, 14), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 1)
+        (text, source), ocr = self.recognize(img)
+        self.assertEqual((text, source), ("cứu", row_recognizer.SOURCE_FALLBACK))
+        ocr.assert_called_once()
+
+    def test_read_text_is_cached(self):
+        img = bordered_row()
+        cv2.putText(img, "dien cham", (10, 14), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 1)
+        cache = OCRCache(path=None)
+        with mock.patch.object(row_recognizer.ocr_service, "image_to_string",
+                               return_value=" Điện Châm\n"):
+            first = row_recognizer.recognize_row_with_source(img, cache, NoTemplates())
+            second = row_recognizer.recognize_row_with_source(img, cache, NoTemplates())
+        self.assertEqual(first, ("điện châm", row_recognizer.SOURCE_OCR))
+        self.assertEqual(second, ("điện châm", row_recognizer.SOURCE_CACHE))
+
+
+if __name__ == "__main__":
+    unittest.main()
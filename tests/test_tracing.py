@@ -0,0 +1,28 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracing import percentile
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertEqual(percentile(list(range(1, 31)), 95), 29)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+
+    def test_unsorted_input(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+
+    def test_edges(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([1, 2, 3], 0), 1)
+        self.assertEqual(percentile([1, 2, 3], 100), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import waits
+
+
+class ReadyWindow:
+    def is_visible(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+
+class WaiterTest(unittest.TestCase):
+
+    def test_floor_keys_sleep_the_old_duration(self):
+        waiter = waits.Waiter(ReadyWindow())
+        for key in ("select_row", "tab", "lookup", "select_all"):
+            start = time.perf_counter()
+            waiter.settle(key, 0.1)
+            self.assertGreaterEqual(time.perf_counter() - start, 0.1, key)
+
+    def test_other_keys_return_when_ready(self):
+        waiter = waits.Waiter(ReadyWindow())
+        start = time.perf_counter()
+        waiter.settle("type", 0.5)
+        self.assertLess(time.perf_counter() - start, 0.2)
+
+    def test_condition_errors_are_logged_once(self):
+        def condition():
+            raise RuntimeError("window gone")
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            met = waits.wait_until(condition, 0.1)
+        self.assertFalse(met)
+        self.assertEqual(out.getvalue().count("window gone"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
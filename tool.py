@@ -1,111 +1,281 @@
-import time
-from pywinauto.keyboard import send_keys
+import re
+from concurrent.futures import ThreadPoolExecutor
 from handle_data import convert_info_from_text
 import config
-import pyautogui
-import pytesseract
-import cv2
-from pywinauto.uia_element_info import UIAElementInfo
-import numpy as np
-import pyperclip
+import ocr_service
+from row_recognizer import recognize_row
+from input_backend import DesktopInput
+from screen_capture import slice_region
+from waits import Waiter, region_changed
+from tracing import traced
+
+# Size of the screen area watched for the suggestion list to appear
+SUGGESTION_REGION = (120, 16)
+
+# Worker threads running Tesseract on captured service rows
+OCR_WORKERS = ocr_service.POOL_SIZE
+_ocr_pool = None
+
+
+def get_ocr_pool():
+    """Shared pool for OCR jobs, created on first use."""
+    global _ocr_pool
+    if _ocr_pool is None:
+        _ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+    return _ocr_pool
+
+def date_parts(ngay):
+    """'16-12-2025{SPACE}09:05' -> ['16', '12', '2025', '09', '05']."""
+    # Replace common separators with a standard one
+    clean_ngay = ngay.replace('{SPACE}', '-').replace(' ', '-').replace('/', '-').replace('.', '-').replace(':', '-')
+    # Filter empty parts just in case
+    return [p for p in clean_ngay.split('-') if p]
+
+
+def date_keys(ngay):
+    """Key sequence typing a date part by part: '16{RIGHT}12{RIGHT}2025{RIGHT}09{RIGHT}05'."""
+    return "{RIGHT}".join(date_parts(ngay))
+
+
+def date_text(ngay):
+    """The date as plain text for pasting: '16-12-2025 09:05'."""
+    return ngay.replace('{SPACE}', ' ')
+
+
+def digits(text):
+    return re.sub(r"\D", "", text or "")
+
 
 class Tool:
-    def __init__(self, app, dlg):
+    def __init__(self, app, dlg, reference_size=None, backend="pixel", waiter=None, input=None,
+                 scale=False, uia=None):
+        """
+        Coordinates are relative to the top-left corner of dlg and are only
+        translated by the window position. With scale=True they are also scaled
+        from reference_size, the (width, height) of the window they were captured
+        for, to the current size; HIS layouts do not always stretch with the
+        window, so this is opt-in (config.SCALE_COORDINATES).
+        
+        backend "uia" fills the detail fields through UIA controls (see
+        uia_driver.py) and falls back to clicks for fields it cannot handle.
+        
+        waiter replaces the fixed sleeps after each input (see waits.py); pass
+        the same Waiter for every patient so its timing stats carry over.
+        
+        input receives the clicks, keystrokes and screenshots (see
+        input_backend.py); the real desktop by default.
+        
+        uia is the UIAFieldDriver for backend "uia"; like the waiter, pass the
+        same one for every patient so its resolved controls are reused.
+        """
         self.app = app
         self.dlg = dlg
         self.box_valid = None
+        self.reference_size = reference_size
+        self.scale = scale
+        # Window rectangle, read once (one Tool is created per patient)
+        self.window_rect = None
+        self.backend = backend
+        self.waiter = waiter or Waiter(dlg)
+        self.input = input or DesktopInput()
+        self.uia = None
+        if backend == "uia":
+            if uia is None:
+                from uia_driver import UIAFieldDriver
+                uia = UIAFieldDriver(self._to_screen)
+            else:
+                # Controls not resolved yet are found through this window's rectangle
+                uia.to_screen = self._to_screen
+            self.uia = uia
+
+    def refresh_window_rect(self):
+        """Read the window rectangle again, e.g. after the window was moved."""
+        rect = self.dlg.rectangle()
+        self.window_rect = (rect.left, rect.top, rect.width(), rect.height())
+        return self.window_rect
 
+    def _to_screen(self, coords):
+        """Translate window-relative coords to screen coords using the cached rectangle."""
+        if self.window_rect is None:
+            self.refresh_window_rect()
+        left, top, width, height = self.window_rect
+        x, y = coords
+        if self.scale and self.reference_size and (width, height) != tuple(self.reference_size):
+            ref_width, ref_height = self.reference_size
+            x = x * width / ref_width
+            y = y * height / ref_height
+        return int(round(left + x)), int(round(top + y))
 
-    def _double_click_position(self, coords, wait=0.1):
-        print(f"Double clicking at: {coords}")
-        self.dlg.double_click_input(coords=coords)
-        time.sleep(wait)
+    @traced("double_click")
+    def _double_click_position(self, coords, wait=0.1, key="double_click"):
+        screen_coords = self._to_screen(coords)
+        print(f"Double clicking at: {coords} -> {screen_coords}")
+        self.input.click(self.dlg, screen_coords, double=True)
+        self.waiter.settle(key, wait)
 
-    def _click_position(self, coords, wait=0.1):
-        print(f"Clicking at: {coords}")
-        self.dlg.click_input(coords=coords)
-        time.sleep(wait)
+    @traced("click")
+    def _click_position(self, coords, wait=0.1, key="click"):
+        screen_coords = self._to_screen(coords)
+        print(f"Clicking at: {coords} -> {screen_coords}")
+        self.input.click(self.dlg, screen_coords)
+        self.waiter.settle(key, wait)
     
+    @traced("type")
     def _type_text(self, text:str, wait=0.1):
-        send_keys("^a")
-        time.sleep(wait)
+        self.input.send_keys("^a")
+        self.waiter.settle("select_all", wait)
 
-        send_keys(text)
-        time.sleep(wait)
+        self.input.send_keys(text)
+        self.waiter.settle("type", wait)
 
 
 
+    @traced("type")
     def _type_text_pure(self, text:str, wait=0.1):
-        send_keys(text)
-        time.sleep(wait)
+        self.input.send_keys(text)
+        self.waiter.settle("type", wait)
     
+    @traced("paste")
     def _type_text_no_telex(self, text:str, wait=0.1):
-        pyperclip.copy(text)
-        send_keys("^v")
-        time.sleep(wait)
+        self.input.paste(text)
+        self.waiter.settle("paste", wait)
 
-    def extract_text(self, x, y, save_dir="saved_images", index=0):
+    @traced("suggestion")
+    def _pick_first_suggestion(self, text, first_item, wait=0.1):
+        """Paste text into a lookup field and click the first suggestion once the list shows up."""
+        x, y = self._to_screen(first_item)
+        width, height = SUGGESTION_REGION
+        region = (x - width // 2, y - height // 2, width, height)
+        baseline = self.input.grab(region)
+        self.input.paste(text)
+        # The list is drawn over the region; fall back to the old fixed wait if it never changes
+        self.waiter.wait_for("suggestions", region_changed(region, baseline, self.input.grab), wait)
+        self._click_position(coords=first_item)
+
+    def extract_text(self, x, y):
+        img = self.capture_row(x, y)
+        if img is None:
+            return None
+        return self.recognize_row(img)
 
+    @traced("capture")
+    def capture_row(self, x, y):
+        """
+        Select the service row at (x, y) and grab it as a BGR image.
+        Returns None if the row box does not have the size of the first row
+        (there are no more rows).
+        """
         self._double_click_position(coords=(x, y))
 
-        element_info = UIAElementInfo.from_point(x, y)
-        rect = element_info.rectangle
-        region = (rect.left, rect.top, rect.right - rect.left, rect.bottom - rect.top)
+        left, top, right, bottom = self.input.element_rect(*self._to_screen((x, y)))
+        region = (left, top, right - left, bottom - top)
 
         # Take screenshot of the region
-        screenshot = pyautogui.screenshot(region=region)
-
-        np_arr = np.array(screenshot)
+        img = self.input.grab(region)
         
         if self.box_valid == None:
-            self.box_valid = np_arr.shape
-
-        img = cv2.cvtColor(np_arr, cv2.COLOR_RGB2BGR)
+            self.box_valid = img.shape
 
-        # Save image
-        # os.makedirs(save_dir, exist_ok=True)
-        # save_path = os.path.join(save_dir, f"rect_{index}.png")
-        # cv2.imwrite(save_path, img)
-
-        # OCR text
-        if np_arr.shape == self.box_valid:
-            text = pytesseract.image_to_string(img, lang='vie')
-            if text == "":
-                return "cứu"
-            return text.strip().lower()
+        if img.shape == self.box_valid:
+            return img
         else:
             return None
 
+    def _row_rect(self, x, y):
+        """Screen rectangle (left, top, right, bottom) of the element under row point (x, y)."""
+        return self.input.element_rect(*self._to_screen((x, y)))
+
+    @traced("capture")
+    def capture_grid(self):
+        """
+        Grab all service rows with one screenshot and return them as views into it.
+        Row 0 is selected first (like capture_row does) so the grid has focus; the
+        other rows are captured unselected. The cache and templates learn each
+        look separately. Every row's rectangle is looked up, and the list ends at
+        the first one that does not have the size of a row.
+        Returns [] if the grid was not found.
+        """
+        self._double_click_position(coords=config.DICH_VU_THU_THUAT[0])
+
+        rects = []
+        for x, y in config.DICH_VU_THU_THUAT:
+            left, top, right, bottom = self._row_rect(x, y)
+            shape = (bottom - top, right - left, 3)
+            if self.box_valid is None:
+                self.box_valid = shape
+            if shape != self.box_valid:
+                break
+            rects.append((left, top, right, bottom))
+        if not rects:
+            return []
+
+        left = min(r[0] for r in rects)
+        top = min(r[1] for r in rects)
+        right = max(r[2] for r in rects)
+        bottom = max(r[3] for r in rects)
+        grid = self.input.grab((left, top, right - left, bottom - top))
+        return [slice_region(grid, (left, top), rect) for rect in rects]
+
+    def recognize_row(self, img):
+        """
+        Recognize a captured service row, from the cache when possible.
+        Returns "" for an empty row. Safe to call from worker threads.
+        """
+        return recognize_row(img)
+
+    def _ocr_rows_ahead(self):
+        """
+        Capture every service row, then OCR them in the worker pool.
+        Returns {row index: Future of the text}; empty if the grid was not found.
+        """
+        pool = get_ocr_pool()
+        return {idx: pool.submit(self.recognize_row, img)
+                for idx, img in enumerate(self.capture_grid())}
+
     def click_reload(self):
         print(f"DEBUG: Reloading at {config.RELOAD}")
-        self._click_position(coords=config.RELOAD)
+        self._click_position(coords=config.RELOAD, key="reload")
 
     def click_thuc_hien(self, mode:bool = True):
         if mode == False: # Cho thuc hien
             print(f"DEBUG: Clicking CHO_THUC_HIEN at {config.CHO_THUC_HIEN}")
-            self._click_position(coords=config.CHO_THUC_HIEN)
+            self._click_position(coords=config.CHO_THUC_HIEN, key="tab")
         if mode == True: # Da Thuc Hien
             print(f"DEBUG: Clicking DA_THUC_HIEN at {config.DA_THUC_HIEN}")
-            self._click_position(coords=config.DA_THUC_HIEN)
+            self._click_position(coords=config.DA_THUC_HIEN, key="tab")
 
     
+    @traced("type_date")
     def _type_date_arrow(self, ngay: str):
         # User format example: 16-12-2025{SPACE}09:05
-        # Logic: 16 -> 12 -> 2025 -> 09 -> 05
-        send_keys("^a")
-        # Replace common separators with a standard one
-        clean_ngay = ngay.replace('{SPACE}', '-').replace(' ', '-').replace('/', '-').replace('.', '-').replace(':', '-')
-        parts = clean_ngay.split('-')
-        
-        # Filter empty parts just in case
-        parts = [p for p in parts if p]
-        
+        # Logic: 16 -> 12 -> 2025 -> 09 -> 05, entered in one go
+        if config.DATE_ENTRY == "paste":
+            self.input.send_keys("^a")
+            self.input.paste(date_text(ngay))
+        else:
+            self.input.send_keys("^a" + date_keys(ngay), pause=config.KEY_PAUSE)
+        self.waiter.settle("type_date", 0.1)
+
+        if config.DATE_READBACK:
+            self._read_back_date(ngay)
+
+    def _read_back_date(self, ngay: str):
+        """Copy the focused date field and retype ngay part by part if it differs."""
+        value = self.input.copy_selection()
+        if digits(value) != digits(ngay):
+            print(f"Date read back as {value!r}, expected {ngay!r}; typing it again part by part")
+            self._type_date_parts(ngay)
+
+    def _type_date_parts(self, ngay: str):
+        """Slow path: each part with its own key sequence and wait."""
+        self.input.send_keys("^a")
+        parts = date_parts(ngay)
         for i, part in enumerate(parts):
             self._type_text_pure(part)
             # Press right arrow if it's not the last part
             if i < len(parts) - 1:
-                send_keys("{RIGHT}")
-                time.sleep(0.1)
+                self.input.send_keys("{RIGHT}")
+                self.waiter.settle("arrow", 0.1)
     
     def type_ngay_bat_dau(self, ngay: str, arrow_mode: bool = False):
         # Nhap ngay bat dau
@@ -116,7 +286,7 @@ class Tool:
             self._type_text(ngay)
 
     def type_ngay_ket_thuc(self, ngay: str, arrow_mode: bool = False):
-        self.dlg.click_input(coords=config.NGAY_KET_THUC)
+        self._click_position(coords=config.NGAY_KET_THUC, wait=0)
         if arrow_mode:
             self._type_date_arrow(ngay)
         else:
@@ -126,26 +296,37 @@ class Tool:
         self._click_position(coords=config.ID_BOX)
         self._type_text(id)
 
-    def fill_thu_thuat_data(self, data: list, mode = True, arrow_mode: bool = False):
+    def service_rows(self, mode = True):
+        """
+        Yield (x, y, procedure) for each service row to fill, stopping at the
+        first empty or missing row. Rows with unknown text are skipped.
+        """
+        # In 'Da thuc hien' mode the rows stay in place, so all of them are
+        # captured up front and OCR'd in the background while rows are filled.
+        # In 'Cho thuc hien' mode a filled row leaves the list and the next one
+        # moves up to row 0, so it has to be read again every time.
+        ocr_results = self._ocr_rows_ahead() if mode == True else None
+        
         for idx in range(4):
             
             if mode == True:
                 x, y = config.DICH_VU_THU_THUAT[idx]
+                text = ocr_results[idx].result() if idx in ocr_results else None
             else:
                 x, y = config.DICH_VU_THU_THUAT[0]
-
-            text = self.extract_text(x=x,y=y, index=idx)
+                text = self.extract_text(x=x,y=y)
             
             print("Text Extracted: ", text)
-            # time.sleep(0.2)
-            # continue
             if text is None or text == "":
                 return
             thu_thuat, thuthuat_duration, thuthuat_ability = convert_info_from_text(text)
             
             if thu_thuat is None:
                 continue
-            
+            yield x, y, thu_thuat
+
+    def fill_thu_thuat_data(self, data: list, mode = True, arrow_mode: bool = False):
+        for x, y, thu_thuat in self.service_rows(mode):
             info = None
             for j in data:
                 if thu_thuat == j["Ten"]:
@@ -155,41 +336,74 @@ class Tool:
                 print("No info")
                 continue
             
-            self._click_position(coords=(x,y), wait=0.5) # Click Dich vu ky thuat
-            
-            if mode:
-                self._click_position(coords=config.SUA, wait=0.1) # Click sua
-            
-            # Click BS CD
-            self._click_position(coords=config.BSCD,  wait=0.2) # Click BS CD
-            self._type_text_no_telex(info["BS CD"])
-            self._click_position(coords=config.BSCD_NGUOI_DAU_TIEN) # Click nguoi dau tien trong danh sach
-            
-            # Click Ngay CD:
-            # print("Ngay CD", info["Ngay CD"])
-            self._click_position(coords=config.NGAY_CD, wait=0.1)
-            if arrow_mode:
-                self._type_date_arrow(info["Ngay CD"])
-            else:
-                self._type_text(info["Ngay CD"])
+            self.fill_row(x, y, info, mode, arrow_mode)
+
+    def fill_row(self, x, y, info, mode=True, arrow_mode=False):
+        """Fill and save the service row at (x, y) with one procedure's info."""
+        self._click_position(coords=(x,y), wait=0.5, key="select_row") # Click Dich vu ky thuat
+        
+        if mode:
+            self._click_position(coords=config.SUA, wait=0.1, key="edit") # Click sua
+        
+        if self.uia is not None:
+            self._fill_fields_uia(info, arrow_mode)
+        else:
+            self._fill_fields_pixel(info, arrow_mode)
+
+        self._click_position(coords=config.LUU, key="save") # Luu
+
+    def _type_date_field(self, name, ngay, arrow_mode, wait=0.1):
+        """Click a date field and type ngay into it."""
+        self._click_position(coords=getattr(config, name), wait=0.1)
+        if arrow_mode:
+            self._type_date_arrow(ngay)
+        else:
+            self._type_text(ngay, wait=wait)
+
+    def _fill_fields_pixel(self, info, arrow_mode):
+        """Fill the detail fields by clicking their positions and typing."""
+        # Click BS CD
+        self._click_position(coords=config.BSCD,  wait=0.2, key="lookup") # Click BS CD
+        self._pick_first_suggestion(info["BS CD"], config.BSCD_NGUOI_DAU_TIEN) # Click nguoi dau tien trong danh sach
+
+        self._type_date_field('NGAY_CD', info["Ngay CD"], arrow_mode)
+        self._type_date_field('NGAY_BDTH', info["Ngay BD TH"], arrow_mode)
+        self._type_date_field('NGAY_KQ', info["Ngay KQ"], arrow_mode)
+
+        # Click CCHN
+        self._click_position(coords=config.CCHN, wait=0.1, key="lookup")
+        self._pick_first_suggestion(info["Nguoi Thuc Hien"], config.CCHN_NGUOI_DAU_TIEN) # Click nguoi dau tien trong danh sach
+
+    def _fill_fields_uia(self, info, arrow_mode):
+        """Fill the detail fields through UIA controls, falling back to clicks per field."""
+        # BS CD: focus the control, paste the name, pick the first suggestion
+        if not self.uia.focus('BSCD'):
+            self._click_position(coords=config.BSCD, wait=0.2, key="lookup")
+        self._pick_first_suggestion(info["BS CD"], config.BSCD_NGUOI_DAU_TIEN)
+
+        for name, key in (('NGAY_CD', "Ngay CD"), ('NGAY_BDTH', "Ngay BD TH"), ('NGAY_KQ', "Ngay KQ")):
+            if not self.uia.set_date(name, info[key]):
+                self._type_date_field(name, info[key], arrow_mode)
+
+        # CCHN
+        if not self.uia.focus('CCHN'):
+            self._click_position(coords=config.CCHN, wait=0.1, key="lookup")
+        self._pick_first_suggestion(info["Nguoi Thuc Hien"], config.CCHN_NGUOI_DAU_TIEN)
 
-            # Click Ngay BDTH
-            self._click_position(coords=config.NGAY_BDTH, wait=0.1)
-            if arrow_mode:
-                self._type_date_arrow(info["Ngay BD TH"])
-            else:
-                self._type_text(info["Ngay BD TH"], wait=0.1)
-            
-            # Click Ngay KQ
-            self._click_position(coords=config.NGAY_KQ, wait=0.1)
-            if arrow_mode:
-                self._type_date_arrow(info["Ngay KQ"])
-            else:
-                self._type_text(info["Ngay KQ"])
-            
-            # # Click CCHN
-            self._click_position(coords=config.CCHN, wait=0.1)
-            self._type_text_no_telex(info["Nguoi Thuc Hien"])
-            self._click_position(coords=config.CCHN_NGUOI_DAU_TIEN) # Click nguoi dau tien trong danh sach
 
-            self._click_position(coords=config.LUU) # Luu
+def patient_steps(tool, data, waiter, arrow_mode=False):
+    """
+    The automation steps for one patient, as (key, log message, function).
+    Shared by the GUI run and the simulated benchmark (his_simulator.py).
+    """
+    return [
+        ("mode", "Setting 'Cho thuc hien' mode", lambda: tool.click_thuc_hien(mode=data["isFirst"])),
+        ("start_date", f"Setting start date: {data['ngay']}", lambda: tool.type_ngay_bat_dau(ngay=data["ngay"], arrow_mode=arrow_mode)),
+        ("end_date", f"Setting end date: {data['ngay']}", lambda: tool.type_ngay_ket_thuc(ngay=data["ngay"], arrow_mode=arrow_mode)),
+        ("id", f"Entering ID: {data.get('id', 'Unknown')}", lambda: tool.type_id(id=data["id"])),
+        ("reload", "Clicking reload", lambda: tool.click_reload()),
+        ("patient_row", "Selecting patient row", lambda: tool._double_click_position(coords=config.PATIENT_ROW, key="patient_row")),
+        ("fill", "Filling medical procedure data", lambda: tool.fill_thu_thuat_data(data["thu_thuats"], mode=data["isFirst"], arrow_mode=arrow_mode)),
+        ("next", "Clicking next", lambda: tool._click_position(coords=config.TIEP)),
+        ("wait_reload", "Waiting for reload", lambda: waiter.settle("reload", 1.0)),
+    ]
@@ -0,0 +1,171 @@
+"""
+Lightweight latency tracing for the automation run.
+
+Steps of run_automation and the Tool primitives (click, type, paste, OCR, ...)
+record monotonic start/end times into a fixed-size ring buffer. summary() gives
+p50/p95 per kind and the total time per patient; the raw spans and the summary
+can be exported to CSV or JSON to see where an 8-hour batch spends its time.
+"""
+
+import csv
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Spans kept in memory (oldest are dropped first)
+TRACE_CAPACITY = 50000
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (pct in 0-100) of a list of numbers, 0 if empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+class Tracer:
+    """Collects (kind, name, patient, start, end) spans in a ring buffer."""
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.spans = deque(maxlen=capacity)
+        self.patient = None
+        self.enabled = True
+        self._lock = threading.Lock()
+
+    def set_patient(self, patient_id):
+        """Spans recorded from now on are attributed to patient_id."""
+        self.patient = patient_id
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+        self.patient = None
+
+    def record(self, kind, start, end, name=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.spans.append((kind, name or kind, self.patient, start, end))
+
+    @contextmanager
+    def span(self, kind, name=None):
+        """Time the body of a with-block as one span."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, start, time.perf_counter(), name)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.spans)
+
+    def summary(self):
+        """
+        Returns (by_kind, by_patient):
+            by_kind: {kind: {'count', 'total', 'p50', 'p95', 'max'}} in seconds
+            by_patient: {patient_id: total seconds of 'step' spans}
+        """
+        durations = {}
+        by_patient = {}
+        for kind, name, patient, start, end in self.snapshot():
+            elapsed = end - start
+            durations.setdefault(kind, []).append(elapsed)
+            # Steps cover the whole patient; primitives are nested inside them
+            if kind.startswith("step:") and patient is not None:
+                by_patient[patient] = by_patient.get(patient, 0.0) + elapsed
+
+        by_kind = {}
+        for kind, values in durations.items():
+            values.sort()
+            by_kind[kind] = {
+                'count': len(values),
+                'total': sum(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'max': values[-1],
+            }
+        return by_kind, by_patient
+
+    def summary_lines(self):
+        """Human readable summary, slowest kinds first."""
+        by_kind, by_patient = self.summary()
+        lines = []
+        for kind, s in sorted(by_kind.items(), key=lambda item: item[1]['total'], reverse=True):
+            lines.append(f"{kind}: n={s['count']} total={s['total']:.1f}s "
+                         f"p50={s['p50'] * 1000:.0f}ms p95={s['p95'] * 1000:.0f}ms")
+        if by_patient:
+            totals = sorted(by_patient.values())
+            lines.append(f"per patient: n={len(totals)} p50={percentile(totals, 50):.1f}s "
+                         f"p95={percentile(totals, 95):.1f}s")
+        return lines
+
+    def export_csv(self, path):
+        """
+        Write every span as a CSV row (durations in milliseconds), and the
+        per-kind summary to '<name>_summary.csv' next to it.
+        Returns the path of the summary file.
+        """
+        spans = self.snapshot()
+        origin = min(span[3] for span in spans) if spans else 0.0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'name', 'patient', 'start_ms', 'duration_ms'])
+            for kind, name, patient, start, end in spans:
+                writer.writerow([kind, name, patient or "",
+                                 f"{(start - origin) * 1000:.1f}", f"{(end - start) * 1000:.1f}"])
+
+        by_kind, _ = self.summary()
+        root, ext = os.path.splitext(path)
+        summary_path = f"{root}_summary{ext or '.csv'}"
+        with open(summary_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'count', 'total_ms', 'p50_ms', 'p95_ms', 'max_ms'])
+            for kind, s in sorted(by_kind.items(), key=lambda item: item[1]['total'], reverse=True):
+                writer.writerow([kind, s['count']] + [f"{s[key] * 1000:.1f}"
+                                                      for key in ('total', 'p50', 'p95', 'max')])
+        return summary_path
+
+    def export_json(self, path):
+        """Write the summary and every span as JSON."""
+        spans = self.snapshot()
+        origin = min(span[3] for span in spans) if spans else 0.0
+        by_kind, by_patient = self.summary()
+        data = {
+            'summary': by_kind,
+            'per_patient': by_patient,
+            'spans': [
+                {
+                    'kind': kind,
+                    'name': name,
+                    'patient': patient,
+                    'start_ms': round((start - origin) * 1000, 1),
+                    'duration_ms': round((end - start) * 1000, 1),
+                }
+                for kind, name, patient, start, end in spans
+            ],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+# Shared tracer for the automation run
+tracer = Tracer()
+
+
+def traced(kind):
+    """Decorator: record each call of the function as a span of `kind`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
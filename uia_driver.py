@@ -0,0 +1,130 @@
+"""
+UI Automation driver for the procedure detail fields.
+
+Instead of clicking a pixel and typing into whatever has focus, the BSCD,
+NGAY_CD, NGAY_BDTH, NGAY_KQ and CCHN fields are resolved once as UIA control
+wrappers (found at their configured coordinates) and cached. Values are set
+through the ValuePattern (or set_edit_text) and read back, and the driver polls
+for the control to be ready instead of sleeping a fixed time.
+
+Any field that cannot be resolved or does not accept the value is reported
+back to the caller, which falls back to the pixel-click path for that field.
+"""
+
+import re
+import time
+
+import config
+from pywinauto.uia_element_info import UIAElementInfo
+from pywinauto.controls.uiawrapper import UIAWrapper
+
+# Fields handled by this driver
+UIA_FIELDS = ('BSCD', 'NGAY_CD', 'NGAY_BDTH', 'NGAY_KQ', 'CCHN')
+
+READY_TIMEOUT = 2.0
+POLL_INTERVAL = 0.02
+
+
+def _digits(text):
+    return re.sub(r"\D", "", text or "")
+
+
+class UIAFieldDriver:
+    """Caches UIA wrappers for the detail fields and sets their values directly."""
+
+    def __init__(self, to_screen):
+        """
+        Args:
+            to_screen: Function mapping window-relative (x, y) to screen (x, y),
+                       normally Tool._to_screen
+        """
+        self.to_screen = to_screen
+        self._controls = {}
+
+    def resolve(self, name):
+        """Return the wrapper for field `name`, finding it on first use."""
+        control = self._controls.get(name)
+        if control is not None:
+            return control
+        x, y = self.to_screen(getattr(config, name))
+        control = UIAWrapper(UIAElementInfo.from_point(x, y))
+        self._controls[name] = control
+        return control
+
+    def forget(self, name=None):
+        """Drop cached wrappers (one field, or all), e.g. after the form was rebuilt."""
+        if name is None:
+            self._controls.clear()
+        else:
+            self._controls.pop(name, None)
+
+    def wait_ready(self, control, timeout=READY_TIMEOUT):
+        """Poll until the control is visible and enabled. Returns False on timeout."""
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                if control.is_visible() and control.is_enabled():
+                    return True
+            except Exception:
+                return False
+            if time.perf_counter() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+
+    def get_value(self, control):
+        try:
+            return control.iface_value.CurrentValue
+        except Exception:
+            return control.window_text()
+
+    def _set(self, control, text):
+        try:
+            control.iface_value.SetValue(text)
+        except Exception:
+            control.set_edit_text(text)
+
+    def set_value(self, name, text, digits_only=False):
+        """
+        Set field `name` to text and verify it by reading it back.
+        digits_only compares only the digits (date fields reformat the text).
+        Returns True on success, False if the caller should fall back.
+        """
+        for attempt in range(2):
+            try:
+                control = self.resolve(name)
+                if not self.wait_ready(control):
+                    raise RuntimeError("control not ready")
+                self._set(control, text)
+                value = self.get_value(control)
+            except Exception as e:
+                # The cached wrapper may be stale; resolve again once
+                print(f"UIA: {name} failed ({e})")
+                self.forget(name)
+                continue
+
+            if digits_only:
+                ok = _digits(value) == _digits(text)
+            else:
+                ok = (value or "").strip().lower() == text.strip().lower()
+            if ok:
+                return True
+            print(f"UIA: {name} read back {value!r}, expected {text!r}")
+            return False
+        return False
+
+    def set_date(self, name, ngay):
+        """Set a date field from the 'DD-MM-YYYY{SPACE}HH:MM' format used in the data."""
+        return self.set_value(name, ngay.replace("{SPACE}", " "), digits_only=True)
+
+    def focus(self, name):
+        """Give keyboard focus to field `name` once it is ready. Returns False on failure."""
+        try:
+            control = self.resolve(name)
+            if not self.wait_ready(control):
+                return False
+            control.set_focus()
+            return True
+        except Exception as e:
+            print(f"UIA: cannot focus {name} ({e})")
+            self.forget(name)
+            return False
@@ -0,0 +1,173 @@
+"""
+Condition-based waits for the automation steps.
+
+Tool used to sleep a fixed 0.1-0.5 s after every click and keystroke. A Waiter
+instead polls a readiness condition (window enabled, a screen region changed,
+...) with exponential backoff, and gives up after a timeout. How long each kind
+of wait really takes is tracked per key, and the timeout for that key adapts
+to it, so a fast HIS server is not held back by worst-case sleeps.
+"""
+
+import time
+
+import numpy as np
+
+# Polling starts fast and backs off up to MAX_INTERVAL
+INITIAL_INTERVAL = 0.01
+MAX_INTERVAL = 0.2
+BACKOFF = 2.0
+# Always give the target app this long to pick up input
+MIN_WAIT = 0.02
+# Waits that always sleep their full time before polling. The HIS window stays
+# enabled while it reloads, saves, loads a row into the detail panel, switches
+# tabs or opens a lookup field, so window_ready() says nothing for these; the old
+# fixed sleep is the floor until they get a condition of their own.
+MIN_SLEEP_KEYS = {"reload", "patient_row", "save", "select_row", "edit", "tab", "lookup", "select_all"}
+# Adaptive timeout = ADAPTIVE_FACTOR x the slowest recent wait, within these limits
+ADAPTIVE_FACTOR = 3.0
+MIN_TIMEOUT = 0.1
+MIN_SAMPLES = 5
+# Weight of the newest sample in the moving average
+EWMA_ALPHA = 0.2
+
+
+def wait_until(condition, timeout, initial=INITIAL_INTERVAL, max_interval=MAX_INTERVAL, backoff=BACKOFF):
+    """
+    Poll condition() until it returns True or timeout seconds pass.
+    Returns True if the condition was met.
+    """
+    deadline = time.perf_counter() + timeout
+    interval = initial
+    logged = False
+    while True:
+        try:
+            if condition():
+                return True
+        except Exception as e:
+            # Keep polling (the window may be rebuilding), but say why once
+            if not logged:
+                print(f"Wait condition failed: {e}")
+                logged = True
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * backoff, max_interval)
+
+
+# ===== Conditions =====
+
+def window_ready(dlg):
+    """
+    Condition: the target window is visible and accepts input.
+    Weak signal: the HIS main window stays enabled while it works.
+    """
+    def check():
+        return dlg.is_visible() and dlg.is_enabled()
+    return check
+
+
+def control_enabled(control):
+    """Condition: a control wrapper is visible and enabled."""
+    def check():
+        return control.is_visible() and control.is_enabled()
+    return check
+
+
+def capture_region(region):
+    """Grab a screen region (left, top, width, height) as a NumPy array."""
+    from screen_capture import grab_region
+    return grab_region(region)
+
+
+def region_changed(region, baseline, grab=capture_region):
+    """Condition: the screen region no longer looks like baseline. grab captures the region."""
+    def check():
+        return not np.array_equal(grab(region), baseline)
+    return check
+
+
+class WaitStat:
+    """Running statistics for one kind of wait."""
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.average = 0.0
+        self.slowest = 0.0
+        self.recent = []
+
+    def add(self, elapsed, met):
+        self.count += 1
+        if not met:
+            self.timeouts += 1
+            return
+        self.average = elapsed if not self.recent else (1 - EWMA_ALPHA) * self.average + EWMA_ALPHA * elapsed
+        self.slowest = max(self.slowest, elapsed)
+        self.recent.append(elapsed)
+        del self.recent[:-20]
+
+
+class Waiter:
+    """Waits on conditions with per-key adaptive timeouts.
+
+    One Waiter should live for the whole run so the statistics carry over from
+    patient to patient. With enabled=False every wait is the old fixed sleep.
+    """
+
+    def __init__(self, dlg=None, enabled=True):
+        self.dlg = dlg
+        self.enabled = enabled
+        self.stats = {}
+        self._window = None
+
+    @property
+    def window(self):
+        """Wrapper of dlg, resolved once (WindowSpecification searches on every call)."""
+        if self._window is None and self.dlg is not None:
+            self._window = self.dlg.wrapper_object() if hasattr(self.dlg, 'wrapper_object') else self.dlg
+        return self._window
+
+    def timeout_for(self, key, default):
+        """Timeout for key: default until enough samples, then based on recent waits."""
+        stat = self.stats.get(key)
+        if stat is None or len(stat.recent) < MIN_SAMPLES:
+            return default
+        return min(default, max(MIN_TIMEOUT, ADAPTIVE_FACTOR * max(stat.recent)))
+
+    def wait_for(self, key, condition, timeout):
+        """
+        Wait until condition() is true. timeout is the upper bound; it shrinks as
+        the waits for key prove to be fast. Returns True if the condition was met.
+        """
+        if not self.enabled:
+            time.sleep(timeout)
+            return True
+        start = time.perf_counter()
+        time.sleep(MIN_WAIT)
+        met = wait_until(condition, self.timeout_for(key, timeout) - MIN_WAIT)
+        self.stats.setdefault(key, WaitStat()).add(time.perf_counter() - start, met)
+        return met
+
+    def settle(self, key, wait, condition=None):
+        """
+        Replacement for time.sleep(wait) after an input: wait until condition()
+        (by default, the window is ready). Keys in MIN_SLEEP_KEYS sleep the full
+        wait first and then wait for the condition as well.
+        """
+        if self.dlg is None or not self.enabled:
+            time.sleep(wait)
+            return True
+        if condition is None:
+            condition = window_ready(self.window)
+        if key in MIN_SLEEP_KEYS:
+            time.sleep(wait)
+        return self.wait_for(key, condition, wait)
+
+    def summary(self):
+        """One line per key: count, average and slowest wait, timeouts."""
+        lines = []
+        for key, stat in sorted(self.stats.items()):
+            lines.append(f"{key}: n={stat.count} avg={stat.average * 1000:.0f}ms "
+                         f"max={stat.slowest * 1000:.0f}ms timeouts={stat.timeouts}")
+        return lines